@@ -0,0 +1,82 @@
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Short-lived cache for serialized responses of read-mostly endpoints.
+# Backed by Redis when REDIS_URL is set (shared across workers), otherwise by
+# a per-process TTL cache. Failures are logged and treated as misses: the
+# cache must never take an endpoint down.
+_local_cache: TTLCache = TTLCache(maxsize=1024, ttl=300)
+_local_versions: Dict[str, int] = {}
+_redis = None
+
+if settings.REDIS_URL:
+    import redis.asyncio as aioredis
+
+    _redis = aioredis.from_url(settings.REDIS_URL)
+
+
+async def cache_get(key: str) -> Optional[bytes]:
+    """Return the cached bytes for key, or None on a miss."""
+    if _redis is None:
+        entry: Optional[Tuple[float, bytes]] = _local_cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+    try:
+        return await _redis.get(key)
+    except Exception as e:
+        logger.warning(f"Response cache read failed for {key}: {e}")
+        return None
+
+
+async def cache_set(key: str, value: bytes, ttl: int = 60) -> None:
+    """Store value under key for ttl seconds."""
+    if _redis is None:
+        _local_cache[key] = (time.monotonic() + ttl, value)
+        return
+    try:
+        await _redis.set(key, value, ex=ttl)
+    except Exception as e:
+        logger.warning(f"Response cache write failed for {key}: {e}")
+
+
+async def cache_delete(key: str) -> None:
+    """Drop the entry stored under key."""
+    if _redis is None:
+        _local_cache.pop(key, None)
+        return
+    try:
+        await _redis.delete(key)
+    except Exception as e:
+        logger.warning(f"Response cache delete failed for {key}: {e}")
+
+
+# Namespaced entries are invalidated by bumping the namespace's version,
+# which callers fold into their keys; stale entries just age out.
+async def cache_version(namespace: str) -> int:
+    """Return the current version of a cache namespace."""
+    if _redis is None:
+        return _local_versions.get(namespace, 0)
+    try:
+        return int(await _redis.get(f"{namespace}:version") or 0)
+    except Exception as e:
+        logger.warning(f"Response cache version read failed for {namespace}: {e}")
+        return 0
+
+
+async def cache_invalidate(namespace: str) -> None:
+    """Invalidate every entry keyed on the namespace's current version."""
+    if _redis is None:
+        _local_versions[namespace] = _local_versions.get(namespace, 0) + 1
+        return
+    try:
+        await _redis.incr(f"{namespace}:version")
+    except Exception as e:
+        logger.warning(f"Response cache invalidation failed for {namespace}: {e}")
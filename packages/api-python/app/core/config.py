@@ -1,6 +1,6 @@
-from pydantic_settings import BaseSettings
-from functools import lru_cache
-from typing import List
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from functools import lru_cache, cached_property
+from typing import FrozenSet, Tuple
 
 
 class Settings(BaseSettings):
@@ -25,6 +25,7 @@ class Settings(BaseSettings):
     API_SECRET: str = "change-me-in-production"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    BCRYPT_ROUNDS: int = 12
 
     # CORS
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:3001,http://localhost:3002"
@@ -32,6 +33,9 @@ class Settings(BaseSettings):
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 100
 
+    # Redis (optional; shared rate-limit state and response cache across workers)
+    REDIS_URL: str = ""
+
     # Stripe (optional)
     STRIPE_SECRET_KEY: str = ""
     STRIPE_WEBHOOK_SECRET: str = ""
@@ -49,17 +53,19 @@ class Settings(BaseSettings):
     CJDQUICK_WEBHOOK_SECRET: str = ""
     CJDQUICK_LOCATION_ID: str = ""
 
-    @property
-    def cors_origins_list(self) -> List[str]:
-        return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
+    @cached_property
+    def cors_origins_list(self) -> Tuple[str, ...]:
+        return tuple(origin.strip() for origin in self.CORS_ORIGINS.split(","))
+
+    @cached_property
+    def cors_origins(self) -> FrozenSet[str]:
+        return frozenset(self.cors_origins_list)
 
-    @property
+    @cached_property
     def is_production(self) -> bool:
         return self.NODE_ENV == "production"
 
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
 
 
 @lru_cache()
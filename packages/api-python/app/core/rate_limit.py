@@ -0,0 +1,43 @@
+from fastapi import Request
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from app.core.config import settings
+
+
+def client_ip(request: Request) -> str:
+    """Rate-limit key: the client address as seen by Render's proxy.
+
+    The proxy appends the address it received the connection from to
+    X-Forwarded-For, so the rightmost entry is the one a client can't
+    forge; anything to its left is whatever the client sent. Without the
+    header (local runs) the socket peer is used.
+    """
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if forwarded_for:
+        return forwarded_for.rsplit(",", 1)[-1].strip()
+    return get_remote_address(request)
+
+
+def user_or_ip(request: Request) -> str:
+    """Rate-limit key: the authenticated user's id, or the client IP.
+
+    get_current_user records the user it resolved on request.state, so
+    endpoints limited with this key must depend on it (directly or through
+    require_role); dependencies run before the limit is checked.
+    """
+    user_id = getattr(request.state, "user_id", None)
+    if user_id:
+        return f"user:{user_id}"
+    return client_ip(request)
+
+
+# Rate limiter (Redis-backed when configured so all workers share counters).
+# There is no global default: only endpoints decorated with limiter.limit()
+# are throttled, so health checks and ordinary reads never hit a bucket.
+limiter = Limiter(
+    key_func=client_ip,
+    storage_uri=settings.REDIS_URL or "memory://",
+    strategy="moving-window",
+    in_memory_fallback_enabled=bool(settings.REDIS_URL),
+)
@@ -0,0 +1,51 @@
+from typing import Any, Iterable, Iterator, Type
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson.
+
+    Unlike fastapi.responses.ORJSONResponse this falls back to ``str`` for
+    values orjson can't encode natively, so raw Supabase rows can be returned
+    without running them through jsonable_encoder first.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=str,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z,
+        )
+
+
+def model_json_response(
+    model: Type[BaseModel],
+    data: Any,
+    status_code: int = 200,
+) -> Response:
+    """Validate ``data`` as ``model`` and serialize it with pydantic's encoder.
+
+    Returning the Response directly skips FastAPI's response_model pass, so
+    keep response_model on the route only for the OpenAPI schema. The route's
+    status_code is not applied to a returned Response; pass it here.
+    """
+    return Response(
+        model.model_validate(data).model_dump_json(),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
+
+def iter_json_array(items: Iterable[Any]) -> Iterator[bytes]:
+    """Encode items as a JSON array one element at a time, for StreamingResponse."""
+    yield b"["
+    for i, item in enumerate(items):
+        if i:
+            yield b","
+        yield orjson.dumps(item, default=str)
+    yield b"]"
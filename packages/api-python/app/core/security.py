@@ -1,45 +1,80 @@
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import HTTPException, status, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional, Dict, Any, FrozenSet, Iterable
+from cachetools import TTLCache
+import anyio
+import bcrypt
+import hashlib
+import hmac
+import jwt
+from fastapi import HTTPException, status, Depends, Header, Request
 
 from app.core.config import settings
 from app.core.supabase import get_supabase
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = HTTPBearer()
+_JWT_SECRET = settings.API_SECRET.encode()
+_JWT_ALGORITHM = settings.JWT_ALGORITHM
+_JWT_ALGORITHMS = (settings.JWT_ALGORITHM,)
+_JWT_EXPIRE = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+_UTC = timezone.utc
 
+# Role sets shared by routers, for use with require_role()
+ADMIN_ROLES = frozenset({"admin", "super_admin"})
+DRIVER_ROLES = frozenset({"driver"})
+HUB_ADMIN_ROLES = frozenset({"admin", "super_admin", "hub_manager"})
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+# Recent bcrypt results (both True and False), keyed by an HMAC of the
+# credential pair so plaintext passwords are never held in memory.
+_password_cache: TTLCache = TTLCache(maxsize=4096, ttl=60)
+
+# Resolved user profiles, keyed by a digest of the bearer token, so bursts
+# of requests from the same client skip the users table round-trip.
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+
+# users.id -> drivers.id; a driver profile never moves between users, so
+# this only needs expiring to pick up deleted profiles eventually.
+_driver_id_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+
+# hub manager users.id -> hubs.id ("" when they manage none). Kept short
+# so a manager reassigned through the hubs API sees the change quickly.
+_manager_hub_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash without blocking the event loop."""
+    plain = plain_password.encode()
+    hashed = hashed_password.encode()
+    key = hmac.new(settings.API_SECRET.encode(), plain + b"|" + hashed, hashlib.sha256).digest()
+
+    cached = _password_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = await anyio.to_thread.run_sync(bcrypt.checkpw, plain, hashed)
+    _password_cache[key] = result
+    return result
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password."""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode()
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(_UTC) + (expires_delta or _JWT_EXPIRE)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.API_SECRET, algorithm=settings.JWT_ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _JWT_SECRET, algorithm=_JWT_ALGORITHM)
     return encoded_jwt
 
 
 def decode_token(token: str) -> Dict[str, Any]:
     """Decode and verify a JWT token."""
     try:
-        payload = jwt.decode(token, settings.API_SECRET, algorithms=[settings.JWT_ALGORITHM])
+        payload = jwt.decode(token, _JWT_SECRET, algorithms=_JWT_ALGORITHMS)
         return payload
-    except JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -47,33 +82,68 @@ def decode_token(token: str) -> Dict[str, Any]:
         )
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
-    """Get the current authenticated user from the token."""
-    token = credentials.credentials
+async def get_current_user(
+    request: Request,
+    authorization: Optional[str] = Header(default=None),
+) -> Dict[str, Any]:
+    """Get the current authenticated user from the token.
+
+    The resolved user's id is also recorded on request.state.user_id, which
+    per-user rate limits key on (see app.core.rate_limit.user_or_ip).
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    cached_user = _user_cache.get(cache_key)
+    if cached_user is not None:
+        request.state.user_id = cached_user["id"]
+        return cached_user
+
     supabase = get_supabase()
 
     # Extract user info from the Supabase JWT without calling supabase.auth.get_user(),
     # which mutates the singleton client's auth headers and breaks subsequent
-    # service-role queries (known supabase-py issue).
+    # service-role queries (known supabase-py issue). This also keeps the auth
+    # path to a single PostgREST round-trip: the users row lookup below.
     try:
-        claims = jwt.get_unverified_claims(token)
+        claims = jwt.decode(token, options={"verify_signature": False})
         user_id = claims.get("sub")
         user_email = claims.get("email")
 
         if user_id:
-            user_data = supabase.table("users").select("*").eq("id", user_id).single().execute()
+            # supabase-py is blocking; keep the lookup off the event loop.
+            # The managed hub rides along so hub routers needn't look it up.
+            user_data = await anyio.to_thread.run_sync(
+                supabase.table("users").select(
+                    "*, managed_hubs:hubs!manager_id(id)"
+                ).eq("id", user_id).single().execute
+            )
             user_dict = user_data.data if user_data.data else {}
-            return {
+            managed_hubs = user_dict.pop("managed_hubs", None) or []
+            user = {
                 "id": user_id,
                 "email": user_email,
                 "role": user_dict.get("role", "customer"),
                 **user_dict
             }
+            if user["role"] == "hub_manager":
+                user["hub_id"] = managed_hubs[0]["id"] if managed_hubs else None
+            _user_cache[cache_key] = user
+            request.state.user_id = user_id
+            return user
     except Exception:
         pass
 
     # Fallback to custom JWT (signed with API_SECRET)
     payload = decode_token(token)
+    request.state.user_id = payload.get("id")
     return payload
 
 
@@ -84,8 +154,18 @@ async def get_current_active_user(current_user: Dict = Depends(get_current_user)
     return current_user
 
 
-def require_role(allowed_roles: list):
-    """Decorator to require specific roles."""
+def require_role(allowed_roles: Iterable[str]):
+    """Decorator to require specific roles.
+
+    Role lists are normalised to a frozenset, so every route asking for the
+    same roles shares one dependency callable (and FastAPI's per-request
+    dependency cache).
+    """
+    return _role_checker(frozenset(allowed_roles))
+
+
+@lru_cache(maxsize=None)
+def _role_checker(allowed_roles: FrozenSet[str]):
     async def role_checker(current_user: Dict = Depends(get_current_user)) -> Dict[str, Any]:
         user_role = current_user.get("role", "customer")
         if user_role not in allowed_roles:
@@ -95,3 +175,42 @@ def require_role(allowed_roles: list):
             )
         return current_user
     return role_checker
+
+
+async def get_driver_id(current_user: Dict = Depends(require_role(DRIVER_ROLES))) -> str:
+    """Resolve the current driver's drivers.id, cached per user."""
+    user_id = current_user["id"]
+    driver_id = _driver_id_cache.get(user_id)
+    if driver_id is not None:
+        return driver_id
+
+    supabase = get_supabase()
+    result = await anyio.to_thread.run_sync(
+        supabase.table("drivers").select("id").eq("user_id", user_id).limit(1).execute
+    )
+    if not result.data:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver profile not found")
+
+    driver_id = _driver_id_cache[user_id] = result.data[0]["id"]
+    return driver_id
+
+
+def get_user_hub_id(current_user: Dict) -> Optional[str]:
+    """Get the hub_id the user has access to (None for admins or no hub)."""
+    role = current_user.get("role")
+    if role in ("admin", "super_admin"):
+        return None  # Admin can access all hubs
+    if role != "hub_manager":
+        return None
+
+    # Resolved at authentication for Supabase-token users
+    if "hub_id" in current_user:
+        return current_user["hub_id"]
+
+    user_id = current_user["id"]
+    hub_id = _manager_hub_cache.get(user_id)
+    if hub_id is None:
+        supabase = get_supabase()
+        hub = supabase.table("hubs").select("id").eq("manager_id", user_id).limit(1).execute()
+        hub_id = _manager_hub_cache[user_id] = hub.data[0]["id"] if hub.data else ""
+    return hub_id or None
@@ -0,0 +1,49 @@
+import hashlib
+import hmac
+import json
+import time
+from typing import Any, Dict
+
+from fastapi import HTTPException, status
+
+# Stripe's default window for replayed deliveries
+STRIPE_SIGNATURE_TOLERANCE = 300
+
+
+def verify_stripe_signature(
+    payload: bytes,
+    sig_header: str,
+    secret: bytes,
+    tolerance: int = STRIPE_SIGNATURE_TOLERANCE,
+) -> Dict[str, Any]:
+    """Verify a Stripe-Signature header and return the decoded event.
+
+    The header carries a timestamp (t=) and one or more v1= HMAC-SHA256
+    signatures of "{t}.{payload}"; several v1 values are sent while a
+    webhook secret is being rolled. Signatures are compared in constant
+    time, and deliveries older than tolerance seconds are rejected.
+    """
+    timestamp = None
+    signatures = []
+    for item in sig_header.split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid signature")
+
+    expected = hmac.new(secret, timestamp.encode() + b"." + payload, hashlib.sha256).hexdigest()
+    # Check every candidate so the comparison time doesn't depend on which matched
+    matched = False
+    for signature in signatures:
+        matched |= hmac.compare_digest(expected, signature)
+    if not matched or abs(time.time() - int(timestamp)) > tolerance:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid signature")
+
+    try:
+        return json.loads(payload)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid payload")
@@ -1,31 +1,51 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
+from contextlib import asynccontextmanager
+import anyio
+import orjson
+import os
 import time
 
 from app.core.config import settings
-from app.routers import (
-    health_router,
-    auth_router,
-    merchants_router,
-    orders_router,
-    deliveries_router,
-    payments_router,
-    hubs_router,
-    hub_orders_router,
-    hub_routes_router,
-    fleet_router,
-    hub_delivery_router,
-    hub_analytics_router,
-    integrations_router,
-    reverse_pickups_router,
-)
+from app.core.rate_limit import limiter
+from app.core.responses import ORJSONResponse
+from app.core.supabase import close_supabase
+from app.routers import register_routers
+
+# Startup banner, formatted once at import
+STARTUP_BANNER = f"""
+╔════════════════════════════════════════════════════════╗
+║                                                        ║
+║   🚀 Delivery Hub Operations API (FastAPI)              ║
+║                                                        ║
+║   Environment: {settings.NODE_ENV.ljust(39)}║
+║   Port: {str(settings.PORT).ljust(45)}║
+║   URL: http://localhost:{settings.PORT}{' ' * 28}║
+║                                                        ║
+║   Health: http://localhost:{settings.PORT}/health{' ' * 18}║
+║   API: http://localhost:{settings.PORT}/api/v1{' ' * 18}║
+║   Docs: http://localhost:{settings.PORT}/docs{' ' * 19}║
+║                                                        ║
+╚════════════════════════════════════════════════════════╝
+    """
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Widen the AnyIO threadpool so concurrent bcrypt checks run in parallel
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 100
+
+    print(STARTUP_BANNER)
+
+    yield
+
+    print("\nShutting down gracefully...")
+    close_supabase()
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
 
 # Create FastAPI app
 app = FastAPI(
@@ -35,6 +55,8 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # Add rate limiter
@@ -44,79 +66,65 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.cors_origins_list,
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Compress larger JSON payloads (order/route lists)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
-# Request timing middleware
-@app.middleware("http")
+
+# Request timing middleware (debug only, so production skips the extra frame)
 async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
+    # Elapsed milliseconds, 3 decimal places
+    response.headers["X-Process-Time"] = f"{(time.perf_counter_ns() - start_ns) / 1e6:.3f}"
     return response
 
 
+if settings.DEBUG:
+    app.middleware("http")(add_process_time_header)
+
+
 # Global exception handler
-@app.exception_handler(Exception)
-async def global_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+INTERNAL_ERROR_BODY = orjson.dumps({
+    "success": False,
+    "error": {
+        "code": "INTERNAL_SERVER_ERROR",
+        "message": "An unexpected error occurred",
+    }
+})
+
+
+async def production_exception_handler(request: Request, exc: Exception):
+    return Response(INTERNAL_ERROR_BODY, status_code=500, media_type="application/json")
+
+
+async def debug_exception_handler(request: Request, exc: Exception):
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
             "error": {
                 "code": "INTERNAL_SERVER_ERROR",
-                "message": "An unexpected error occurred" if settings.is_production else str(exc),
+                "message": str(exc),
             }
         }
     )
 
 
-# Include routers
-app.include_router(health_router)
-app.include_router(auth_router, prefix="/api/v1")
-app.include_router(merchants_router, prefix="/api/v1")
-app.include_router(orders_router, prefix="/api/v1")
-app.include_router(deliveries_router, prefix="/api/v1")
-app.include_router(payments_router, prefix="/api/v1")
-app.include_router(hubs_router, prefix="/api/v1")
-app.include_router(hub_orders_router, prefix="/api/v1")
-app.include_router(hub_routes_router, prefix="/api/v1")
-app.include_router(fleet_router, prefix="/api/v1")
-app.include_router(hub_delivery_router, prefix="/api/v1")
-app.include_router(hub_analytics_router, prefix="/api/v1")
-app.include_router(integrations_router, prefix="/api/v1")
-app.include_router(reverse_pickups_router, prefix="/api/v1")
-
-
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    print(f"""
-╔════════════════════════════════════════════════════════╗
-║                                                        ║
-║   🚀 Delivery Hub Operations API (FastAPI)              ║
-║                                                        ║
-║   Environment: {settings.NODE_ENV.ljust(39)}║
-║   Port: {str(settings.PORT).ljust(45)}║
-║   URL: http://localhost:{settings.PORT}{' ' * 28}║
-║                                                        ║
-║   Health: http://localhost:{settings.PORT}/health{' ' * 18}║
-║   API: http://localhost:{settings.PORT}/api/v1{' ' * 18}║
-║   Docs: http://localhost:{settings.PORT}/docs{' ' * 19}║
-║                                                        ║
-╚════════════════════════════════════════════════════════╝
-    """)
+app.add_exception_handler(
+    Exception,
+    production_exception_handler if settings.is_production else debug_exception_handler,
+)
 
 
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    print("\nShutting down gracefully...")
+# Include routers
+register_routers(app)
 
 
 if __name__ == "__main__":
@@ -125,5 +133,8 @@ if __name__ == "__main__":
         "app.main:app",
         host=settings.HOST,
         port=settings.PORT,
+        loop="uvloop",
+        http="httptools",
+        workers=max(1, (os.cpu_count() or 1) * 2 + 1) if settings.is_production else 1,
         reload=not settings.is_production,
     )
@@ -0,0 +1,11 @@
+from pydantic import BaseModel, ConfigDict
+
+
+class APIModel(BaseModel):
+    """Base for response models built from database rows.
+
+    Response models are never mutated after construction, so they are frozen;
+    sharing one config keeps that consistent across modules.
+    """
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
@@ -1,8 +1,10 @@
-from pydantic import BaseModel
-from typing import Optional, List, Any
+from pydantic import BaseModel, create_model, field_validator
+from typing import Optional, List, Any, Literal
 from datetime import datetime, date
 from enum import Enum
 
+from app.models._base import APIModel
+
 
 # =====================================================
 # DELIVERY ORDER MODELS
@@ -33,7 +35,7 @@ class OrderSource(str, Enum):
 
 class DeliveryOrderCreate(BaseModel):
     hub_id: str
-    source: str = "manual"
+    source: OrderSource = OrderSource.MANUAL
 
     # External integration
     external_order_id: Optional[str] = None
@@ -72,7 +74,7 @@ class DeliveryOrderCreate(BaseModel):
     declared_value: Optional[float] = None
 
     # Scheduling
-    priority: str = "normal"
+    priority: OrderPriority = OrderPriority.NORMAL
     scheduled_date: Optional[date] = None
     delivery_slot: Optional[str] = None
 
@@ -97,13 +99,13 @@ class DeliveryOrderUpdate(BaseModel):
     is_cod: Optional[bool] = None
     cod_amount: Optional[float] = None
     declared_value: Optional[float] = None
-    priority: Optional[str] = None
+    priority: Optional[OrderPriority] = None
     scheduled_date: Optional[date] = None
     delivery_slot: Optional[str] = None
-    status: Optional[str] = None
+    status: Optional[OrderStatus] = None
 
 
-class DeliveryOrderResponse(BaseModel):
+class DeliveryOrderResponse(APIModel):
     id: str
     hub_id: str
     order_number: str
@@ -157,21 +159,12 @@ class DeliveryOrderResponse(BaseModel):
     returned_at: Optional[datetime] = None
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
-
-
-class DeliveryOrderDetailResponse(DeliveryOrderResponse):
-    attempts: List["DeliveryAttemptResponse"] = []
-    route_name: Optional[str] = None
-    driver_name: Optional[str] = None
-
 
 # =====================================================
 # ORDER IMPORT MODELS
 # =====================================================
 
-class OrderImportResponse(BaseModel):
+class OrderImportResponse(APIModel):
     id: str
     hub_id: str
     uploaded_by: str
@@ -186,8 +179,39 @@ class OrderImportResponse(BaseModel):
     created_at: datetime
     completed_at: Optional[datetime] = None
 
-    class Config:
-        from_attributes = True
+
+class OrderCsvRow(BaseModel):
+    """One CSV import row, keyed by field name with blank cells left out."""
+    customer_name: str
+    customer_phone: str
+    delivery_address: str
+    product_description: str
+
+    customer_email: Optional[str] = None
+    customer_alt_phone: Optional[str] = None
+    delivery_city: Optional[str] = None
+    delivery_state: Optional[str] = None
+    delivery_postal_code: Optional[str] = None
+    seller_name: Optional[str] = None
+    seller_order_ref: Optional[str] = None
+    marketplace: Optional[str] = None
+    product_sku: Optional[str] = None
+    product_category: Optional[str] = None
+    package_count: Optional[int] = None
+    total_weight_kg: Optional[float] = None
+    total_volume_cft: Optional[float] = None
+    is_cod: Optional[bool] = None
+    cod_amount: Optional[float] = None
+    declared_value: Optional[float] = None
+    priority: Optional[str] = None
+    scheduled_date: Optional[str] = None
+    delivery_slot: Optional[str] = None
+
+    @field_validator("is_cod", mode="before")
+    @classmethod
+    def parse_cod(cls, v):
+        # Payment mode columns say "COD"/"prepaid" as often as true/false
+        return str(v).lower() in ("true", "yes", "1", "cod")
 
 
 # =====================================================
@@ -205,7 +229,7 @@ class FailureReason(str, Enum):
 class DeliveryAttemptCreate(BaseModel):
     order_id: str
     route_stop_id: Optional[str] = None
-    status: str  # 'delivered' or 'failed'
+    status: Literal["delivered", "failed"]
     failure_reason: Optional[str] = None
     failure_notes: Optional[str] = None
     photo_urls: Optional[List[str]] = None
@@ -217,7 +241,7 @@ class DeliveryAttemptCreate(BaseModel):
     longitude: Optional[float] = None
 
 
-class DeliveryAttemptResponse(BaseModel):
+class DeliveryAttemptResponse(APIModel):
     id: str
     order_id: str
     route_stop_id: Optional[str] = None
@@ -240,8 +264,18 @@ class DeliveryAttemptResponse(BaseModel):
     longitude: Optional[float] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+
+# Flat copy of DeliveryOrderResponse plus the detail fields, built from the
+# parent's fields so they stay in sync without a subclass.
+DeliveryOrderDetailResponse = create_model(
+    "DeliveryOrderDetailResponse",
+    __base__=APIModel,
+    __module__=__name__,
+    **{name: (field.annotation, field) for name, field in DeliveryOrderResponse.model_fields.items()},
+    attempts=(List[DeliveryAttemptResponse], []),
+    route_name=(Optional[str], None),
+    driver_name=(Optional[str], None),
+)
 
 
 # =====================================================
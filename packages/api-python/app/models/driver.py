@@ -3,6 +3,8 @@ from typing import Optional
 from datetime import datetime, date
 from enum import Enum
 
+from app.models._base import APIModel
+
 
 class VehicleType(str, Enum):
     BICYCLE = "bicycle"
@@ -40,7 +42,7 @@ class DriverUpdate(BaseModel):
     status: Optional[DriverStatus] = None
 
 
-class DriverResponse(DriverBase):
+class DriverResponse(DriverBase, APIModel):
     id: str
     user_id: str
     status: DriverStatus = DriverStatus.OFFLINE
@@ -56,16 +58,13 @@ class DriverResponse(DriverBase):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class DriverLocationUpdate(BaseModel):
     latitude: float
     longitude: float
 
 
-class DriverEarningsResponse(BaseModel):
+class DriverEarningsResponse(APIModel):
     id: str
     driver_id: str
     order_id: str
@@ -78,11 +77,8 @@ class DriverEarningsResponse(BaseModel):
     is_paid: bool
     created_at: datetime
 
-    class Config:
-        from_attributes = True
 
-
-class DriverPayoutResponse(BaseModel):
+class DriverPayoutResponse(APIModel):
     id: str
     driver_id: str
     amount: float
@@ -90,6 +86,3 @@ class DriverPayoutResponse(BaseModel):
     transaction_id: Optional[str] = None
     processed_at: Optional[datetime] = None
     created_at: datetime
-
-    class Config:
-        from_attributes = True
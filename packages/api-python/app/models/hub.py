@@ -1,8 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, create_model
 from typing import Optional, List
 from datetime import datetime, date
 from enum import Enum
 
+from app.models._base import APIModel
+
 
 # =====================================================
 # HUB MODELS
@@ -39,16 +41,13 @@ class HubUpdate(BaseModel):
     is_active: Optional[bool] = None
 
 
-class HubResponse(HubBase):
+class HubResponse(HubBase, APIModel):
     id: str
     manager_id: Optional[str] = None
     is_active: bool = True
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class HubStats(BaseModel):
     total_orders_today: int = 0
@@ -103,7 +102,7 @@ class VehicleUpdate(BaseModel):
     is_active: Optional[bool] = None
 
 
-class VehicleResponse(VehicleBase):
+class VehicleResponse(VehicleBase, APIModel):
     id: str
     hub_id: str
     status: str = "available"
@@ -111,9 +110,6 @@ class VehicleResponse(VehicleBase):
     is_active: bool = True
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 # =====================================================
 # DELIVERY ROUTE MODELS
@@ -149,7 +145,7 @@ class RouteAssign(BaseModel):
     vehicle_id: str
 
 
-class RouteResponse(BaseModel):
+class RouteResponse(APIModel):
     id: str
     hub_id: str
     route_name: Optional[str] = None
@@ -168,21 +164,12 @@ class RouteResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
-
-
-class RouteDetailResponse(RouteResponse):
-    stops: List["RouteStopResponse"] = []
-    vehicle: Optional[VehicleResponse] = None
-    driver_name: Optional[str] = None
-
 
 # =====================================================
 # ROUTE STOP MODELS
 # =====================================================
 
-class RouteStopResponse(BaseModel):
+class RouteStopResponse(APIModel):
     id: str
     route_id: str
     order_id: str
@@ -197,11 +184,8 @@ class RouteStopResponse(BaseModel):
     created_at: datetime
     order: Optional["DeliveryOrderBrief"] = None
 
-    class Config:
-        from_attributes = True
 
-
-class DeliveryOrderBrief(BaseModel):
+class DeliveryOrderBrief(APIModel):
     id: str
     order_number: str
     customer_name: str
@@ -212,8 +196,18 @@ class DeliveryOrderBrief(BaseModel):
     is_cod: bool = False
     cod_amount: Optional[float] = 0
 
-    class Config:
-        from_attributes = True
+
+# Flat copy of RouteResponse plus the detail fields (see
+# DeliveryOrderDetailResponse in app.models.delivery_order).
+RouteDetailResponse = create_model(
+    "RouteDetailResponse",
+    __base__=APIModel,
+    __module__=__name__,
+    **{name: (field.annotation, field) for name, field in RouteResponse.model_fields.items()},
+    stops=(List[RouteStopResponse], []),
+    vehicle=(Optional[VehicleResponse], None),
+    driver_name=(Optional[str], None),
+)
 
 
 # =====================================================
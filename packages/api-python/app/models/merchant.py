@@ -3,6 +3,8 @@ from typing import Optional, List
 from datetime import datetime, time
 from enum import Enum
 
+from app.models._base import APIModel
+
 
 class MerchantStatus(str, Enum):
     PENDING = "pending"
@@ -60,7 +62,7 @@ class MerchantUpdate(BaseModel):
     delivery_radius_km: Optional[float] = None
 
 
-class MerchantResponse(MerchantBase):
+class MerchantResponse(MerchantBase, APIModel):
     id: str
     user_id: str
     slug: str
@@ -76,9 +78,6 @@ class MerchantResponse(MerchantBase):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class MerchantHoursBase(BaseModel):
     day_of_week: DayOfWeek
@@ -87,13 +86,10 @@ class MerchantHoursBase(BaseModel):
     is_closed: bool = False
 
 
-class MerchantHoursResponse(MerchantHoursBase):
+class MerchantHoursResponse(MerchantHoursBase, APIModel):
     id: str
     merchant_id: str
 
-    class Config:
-        from_attributes = True
-
 
 class ProductCategoryBase(BaseModel):
     name: str
@@ -101,15 +97,12 @@ class ProductCategoryBase(BaseModel):
     display_order: int = 0
 
 
-class ProductCategoryResponse(ProductCategoryBase):
+class ProductCategoryResponse(ProductCategoryBase, APIModel):
     id: str
     merchant_id: str
     is_active: bool = True
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class ProductBase(BaseModel):
     name: str
@@ -136,7 +129,7 @@ class ProductUpdate(BaseModel):
     is_featured: Optional[bool] = None
 
 
-class ProductResponse(ProductBase):
+class ProductResponse(ProductBase, APIModel):
     id: str
     merchant_id: str
     image_url: Optional[str] = None
@@ -145,6 +138,3 @@ class ProductResponse(ProductBase):
     display_order: int = 0
     created_at: datetime
     updated_at: datetime
-
-    class Config:
-        from_attributes = True
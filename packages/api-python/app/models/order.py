@@ -3,6 +3,8 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
 
+from app.models._base import APIModel
+
 
 class OrderStatus(str, Enum):
     PENDING = "pending"
@@ -53,7 +55,7 @@ class OrderCreate(BaseModel):
     tip_amount: float = 0
 
 
-class OrderItemResponse(BaseModel):
+class OrderItemResponse(APIModel):
     id: str
     product_id: str
     product_name: str
@@ -63,11 +65,8 @@ class OrderItemResponse(BaseModel):
     total_price: float
     special_instructions: Optional[str] = None
 
-    class Config:
-        from_attributes = True
-
 
-class OrderResponse(BaseModel):
+class OrderResponse(APIModel):
     id: str
     order_number: str
     customer_id: str
@@ -99,9 +98,6 @@ class OrderResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class OrderStatusUpdate(BaseModel):
     status: OrderStatus
@@ -119,7 +115,7 @@ class PaymentCreate(BaseModel):
     currency: str = "INR"
 
 
-class PaymentResponse(BaseModel):
+class PaymentResponse(APIModel):
     id: str
     order_id: str
     user_id: str
@@ -131,9 +127,6 @@ class PaymentResponse(BaseModel):
     paid_at: Optional[datetime] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 # --- Stripe Payment Models ---
 
@@ -3,6 +3,8 @@ from typing import Optional, List
 from datetime import datetime, date
 from enum import Enum
 
+from app.models._base import APIModel
+
 
 # =====================================================
 # REVERSE PICKUP MODELS
@@ -100,7 +102,7 @@ class ReversePickupUpdate(BaseModel):
     status: Optional[str] = None
 
 
-class ReversePickupResponse(BaseModel):
+class ReversePickupResponse(APIModel):
     id: str
     hub_id: str
     pickup_number: str
@@ -136,9 +138,6 @@ class ReversePickupResponse(BaseModel):
     received_at_hub_at: Optional[datetime] = None
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 # =====================================================
 # PICKUP ATTEMPT MODELS
@@ -168,7 +167,7 @@ class PickupAttemptCreate(BaseModel):
     longitude: Optional[float] = None
 
 
-class PickupAttemptResponse(BaseModel):
+class PickupAttemptResponse(APIModel):
     id: str
     pickup_id: str
     driver_id: Optional[str] = None
@@ -188,9 +187,6 @@ class PickupAttemptResponse(BaseModel):
     longitude: Optional[float] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class ReversePickupDetailResponse(ReversePickupResponse):
     attempts: List[PickupAttemptResponse] = []
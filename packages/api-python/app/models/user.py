@@ -1,8 +1,15 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, StringConstraints
+from typing import Annotated, Optional
 from datetime import datetime
 from enum import Enum
 
+from app.models._base import APIModel
+
+# Cheap shape check for emails that are not being registered: login (where the
+# credential check is the real validation) and rows read back from our own DB.
+# Registration keeps EmailStr.
+Email = Annotated[str, StringConstraints(pattern=r"^[^@\s]+@[^@\s]+\.[^@\s]+$", max_length=254)]
+
 
 class UserRole(str, Enum):
     CUSTOMER = "customer"
@@ -26,7 +33,7 @@ class UserCreate(UserBase):
 
 
 class UserLogin(BaseModel):
-    email: EmailStr
+    email: Email
     password: str
 
 
@@ -37,7 +44,8 @@ class UserUpdate(BaseModel):
     avatar_url: Optional[str] = None
 
 
-class UserResponse(UserBase):
+class UserResponse(UserBase, APIModel):
+    email: Email
     id: str
     role: UserRole
     avatar_url: Optional[str] = None
@@ -47,9 +55,6 @@ class UserResponse(UserBase):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class TokenResponse(BaseModel):
     access_token: str
@@ -75,10 +80,7 @@ class AddressCreate(AddressBase):
     pass
 
 
-class AddressResponse(AddressBase):
+class AddressResponse(AddressBase, APIModel):
     id: str
     user_id: str
     created_at: datetime
-
-    class Config:
-        from_attributes = True
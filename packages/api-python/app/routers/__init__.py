@@ -1,31 +1,53 @@
-from app.routers.health import router as health_router
-from app.routers.auth import router as auth_router
-from app.routers.merchants import router as merchants_router
-from app.routers.orders import router as orders_router
-from app.routers.deliveries import router as deliveries_router
-from app.routers.payments import router as payments_router
-from app.routers.hubs import router as hubs_router
-from app.routers.hub_orders import router as hub_orders_router
-from app.routers.hub_routes import router as hub_routes_router
-from app.routers.fleet import router as fleet_router
-from app.routers.hub_delivery import router as hub_delivery_router
-from app.routers.hub_analytics import router as hub_analytics_router
-from app.routers.integrations import router as integrations_router
-from app.routers.reverse_pickups import router as reverse_pickups_router
-
-__all__ = [
-    "health_router",
-    "auth_router",
-    "merchants_router",
-    "orders_router",
-    "deliveries_router",
-    "payments_router",
-    "hubs_router",
-    "hub_orders_router",
-    "hub_routes_router",
-    "fleet_router",
-    "hub_delivery_router",
-    "hub_analytics_router",
-    "integrations_router",
-    "reverse_pickups_router",
-]
+import importlib
+import logging
+
+from fastapi import FastAPI
+
+logger = logging.getLogger(__name__)
+
+# (module name, URL prefix) in registration order
+ROUTER_MODULES = (
+    ("health", ""),
+    ("auth", "/api/v1"),
+    ("merchants", "/api/v1"),
+    ("orders", "/api/v1"),
+    ("deliveries", "/api/v1"),
+    ("payments", "/api/v1"),
+    ("hubs", "/api/v1"),
+    ("hub_orders", "/api/v1"),
+    ("hub_routes", "/api/v1"),
+    ("fleet", "/api/v1"),
+    ("hub_delivery", "/api/v1"),
+    ("hub_analytics", "/api/v1"),
+    ("integrations", "/api/v1"),
+    ("reverse_pickups", "/api/v1"),
+)
+
+_ROUTER_NAMES = frozenset(name for name, _ in ROUTER_MODULES)
+
+# Routers backed by optional third-party SDKs; skipped if the SDK is missing
+OPTIONAL_ROUTERS = frozenset({"payments"})
+
+
+def register_routers(app: FastAPI) -> None:
+    """Import each router module on demand and mount it on the app."""
+    for name, prefix in ROUTER_MODULES:
+        try:
+            module = importlib.import_module(f"{__name__}.{name}")
+        except ImportError as e:
+            if name not in OPTIONAL_ROUTERS:
+                raise
+            logger.warning(f"Skipping {name} router: {e}")
+            continue
+        app.include_router(module.router, prefix=prefix)
+
+
+def __getattr__(attr: str):
+    """Lazily resolve `<name>_router` exports to the module's router."""
+    name = attr.removesuffix("_router")
+    if attr.endswith("_router") and name in _ROUTER_NAMES:
+        return importlib.import_module(f"{__name__}.{name}").router
+    raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
+
+
+__all__ = ["register_routers", *(f"{name}_router" for name, _ in ROUTER_MODULES)]
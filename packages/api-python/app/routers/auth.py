@@ -1,6 +1,9 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 from typing import Dict, Any
 
+from app.core.rate_limit import limiter
+from app.core.responses import model_json_response
+from app.core.config import settings
 from app.core.supabase import get_supabase
 from app.core.security import get_current_user, create_access_token
 from app.models.user import (
@@ -12,9 +15,13 @@ from app.models.user import (
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+# Per-client limit on the unauthenticated credential endpoints
+AUTH_RATE_LIMIT = f"{settings.RATE_LIMIT_PER_MINUTE}/minute"
+
 
 @router.post("/register", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate):
+@limiter.limit(AUTH_RATE_LIMIT)
+def register(request: Request, user_data: UserCreate):
     """Register a new user."""
     supabase = get_supabase()
 
@@ -44,15 +51,15 @@ async def register(user_data: UserCreate):
             "first_name": user_data.first_name,
             "last_name": user_data.last_name,
             "phone": user_data.phone,
-            "role": user_data.role.value,
+            "role": user_data.role,
         }).execute()
 
         user = user_profile.data[0] if user_profile.data else None
 
-        return TokenResponse(
-            access_token=auth_response.session.access_token if auth_response.session else "",
-            user=UserResponse(**user) if user else None
-        )
+        return {
+            "access_token": auth_response.session.access_token if auth_response.session else "",
+            "user": user,
+        }
 
     except Exception as e:
         raise HTTPException(
@@ -62,7 +69,8 @@ async def register(user_data: UserCreate):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(credentials: UserLogin):
+@limiter.limit(AUTH_RATE_LIMIT)
+def login(request: Request, credentials: UserLogin):
     """Login with email and password."""
     supabase = get_supabase()
 
@@ -88,10 +96,10 @@ async def login(credentials: UserLogin):
             "last_login_at": "now()"
         }).eq("id", auth_response.user.id).execute()
 
-        return TokenResponse(
-            access_token=auth_response.session.access_token if auth_response.session else "",
-            user=UserResponse(**user_profile.data) if user_profile.data else None
-        )
+        return {
+            "access_token": auth_response.session.access_token if auth_response.session else "",
+            "user": user_profile.data,
+        }
 
     except Exception as e:
         raise HTTPException(
@@ -101,7 +109,7 @@ async def login(credentials: UserLogin):
 
 
 @router.post("/logout")
-async def logout(current_user: Dict = Depends(get_current_user)):
+def logout(current_user: Dict = Depends(get_current_user)):
     """Logout the current user."""
     supabase = get_supabase()
 
@@ -113,7 +121,7 @@ async def logout(current_user: Dict = Depends(get_current_user)):
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_profile(current_user: Dict = Depends(get_current_user)):
+def get_current_user_profile(current_user: Dict = Depends(get_current_user)):
     """Get the current user's profile."""
     supabase = get_supabase()
 
@@ -127,11 +135,11 @@ async def get_current_user_profile(current_user: Dict = Depends(get_current_user
             detail="User not found"
         )
 
-    return UserResponse(**user_profile.data)
+    return model_json_response(UserResponse, user_profile.data)
 
 
 @router.post("/refresh")
-async def refresh_token(current_user: Dict = Depends(get_current_user)):
+def refresh_token(current_user: Dict = Depends(get_current_user)):
     """Refresh the access token."""
     supabase = get_supabase()
 
@@ -149,7 +157,8 @@ async def refresh_token(current_user: Dict = Depends(get_current_user)):
 
 
 @router.post("/forgot-password")
-async def forgot_password(email: str):
+@limiter.limit(AUTH_RATE_LIMIT)
+def forgot_password(request: Request, email: str):
     """Send password reset email."""
     supabase = get_supabase()
 
@@ -162,7 +171,8 @@ async def forgot_password(email: str):
 
 
 @router.post("/reset-password")
-async def reset_password(token: str, new_password: str):
+@limiter.limit(AUTH_RATE_LIMIT)
+def reset_password(request: Request, token: str, new_password: str):
     """Reset password with token."""
     supabase = get_supabase()
 
@@ -177,7 +187,7 @@ async def reset_password(token: str, new_password: str):
 
 
 @router.post("/register-device")
-async def register_device(
+def register_device(
     device_data: dict,
     current_user: Dict = Depends(get_current_user),
 ):
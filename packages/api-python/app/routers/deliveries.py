@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Query
-from typing import List, Optional, Dict
-from datetime import datetime
+from fastapi.responses import Response
+from postgrest.exceptions import APIError
+from pydantic import TypeAdapter
+from typing import List, Literal, Optional, Dict
 
+from app.core.responses import model_json_response
 from app.core.supabase import get_supabase
-from app.core.security import get_current_user, require_role
+from app.core.security import get_current_user, require_role, get_driver_id, DRIVER_ROLES
 from app.models.driver import (
     DriverCreate,
     DriverUpdate,
@@ -15,9 +18,22 @@ from app.models.order import OrderResponse
 
 router = APIRouter(prefix="/deliveries", tags=["Deliveries"])
 
+# List endpoints validate and serialize in one pass and return the bytes
+# directly, skipping FastAPI's per-item jsonable_encoder/response_model work.
+# response_model is kept on the routes for the OpenAPI schema. Null fields
+# (unset timestamps, optional notes, ...) are left out of list payloads.
+_order_list = TypeAdapter(List[OrderResponse])
+
+
+def _order_list_response(rows: List[Dict]) -> Response:
+    return Response(
+        _order_list.dump_json(_order_list.validate_python(rows), exclude_none=True),
+        media_type="application/json",
+    )
+
 
 @router.get("/drivers/me", response_model=DriverResponse)
-async def get_my_driver_profile(current_user: Dict = Depends(require_role(["driver"]))):
+def get_my_driver_profile(current_user: Dict = Depends(require_role(DRIVER_ROLES))):
     """Get the current driver's profile."""
     supabase = get_supabase()
 
@@ -26,11 +42,11 @@ async def get_my_driver_profile(current_user: Dict = Depends(require_role(["driv
     if not result.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver profile not found")
 
-    return DriverResponse(**result.data)
+    return model_json_response(DriverResponse, result.data)
 
 
 @router.post("/drivers", response_model=DriverResponse, status_code=status.HTTP_201_CREATED)
-async def create_driver_profile(
+def create_driver_profile(
     driver_data: DriverCreate,
     current_user: Dict = Depends(get_current_user)
 ):
@@ -38,8 +54,8 @@ async def create_driver_profile(
     supabase = get_supabase()
 
     # Check if driver profile already exists
-    existing = supabase.table("drivers").select("id").eq("user_id", current_user["id"]).execute()
-    if existing.data:
+    existing = supabase.table("drivers").select("id", count="exact", head=True).eq("user_id", current_user["id"]).execute()
+    if existing.count:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Driver profile already exists")
 
     driver = {
@@ -53,13 +69,13 @@ async def create_driver_profile(
     # Update user role
     supabase.table("users").update({"role": "driver"}).eq("id", current_user["id"]).execute()
 
-    return DriverResponse(**result.data[0])
+    return model_json_response(DriverResponse, result.data[0], status.HTTP_201_CREATED)
 
 
 @router.patch("/drivers/me", response_model=DriverResponse)
-async def update_driver_profile(
+def update_driver_profile(
     driver_data: DriverUpdate,
-    current_user: Dict = Depends(require_role(["driver"]))
+    current_user: Dict = Depends(require_role(DRIVER_ROLES))
 ):
     """Update the current driver's profile."""
     supabase = get_supabase()
@@ -71,21 +87,24 @@ async def update_driver_profile(
     if not result.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver profile not found")
 
-    return DriverResponse(**result.data[0])
+    return model_json_response(DriverResponse, result.data[0])
 
 
 @router.post("/drivers/me/location")
-async def update_driver_location(
+def update_driver_location(
     location: DriverLocationUpdate,
-    current_user: Dict = Depends(require_role(["driver"]))
+    current_user: Dict = Depends(require_role(DRIVER_ROLES))
 ):
     """Update driver's current location."""
     supabase = get_supabase()
 
+    # current_location is the GIST-indexed PostGIS point used for proximity
+    # lookups; the float columns are kept for existing readers.
     result = supabase.table("drivers").update({
         "current_latitude": location.latitude,
         "current_longitude": location.longitude,
-        "last_location_update": datetime.utcnow().isoformat(),
+        "current_location": f"SRID=4326;POINT({location.longitude} {location.latitude})",
+        "last_location_update": "now()",
     }).eq("user_id", current_user["id"]).execute()
 
     if not result.data:
@@ -95,116 +114,88 @@ async def update_driver_location(
 
 
 @router.post("/drivers/me/status")
-async def update_driver_status(
+def update_driver_status(
     new_status: DriverStatus,
-    current_user: Dict = Depends(require_role(["driver"]))
+    current_user: Dict = Depends(require_role(DRIVER_ROLES))
 ):
     """Update driver's availability status."""
     supabase = get_supabase()
 
     result = supabase.table("drivers").update({
-        "status": new_status.value,
+        "status": new_status,
     }).eq("user_id", current_user["id"]).execute()
 
     if not result.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver profile not found")
 
-    return {"message": "Status updated", "status": new_status.value}
+    return {"message": "Status updated", "status": new_status}
 
 
 @router.get("/available", response_model=List[OrderResponse])
-async def get_available_deliveries(
+def get_available_deliveries(
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     radius_km: float = 10,
-    current_user: Dict = Depends(require_role(["driver"]))
+    current_user: Dict = Depends(require_role(DRIVER_ROLES))
 ):
     """Get available orders for delivery."""
     supabase = get_supabase()
 
     # Get orders that are ready for pickup and don't have a driver assigned
-    query = supabase.table("orders").select("*").eq("status", "ready_for_pickup").is_("driver_id", "null")
-
-    result = query.order("created_at").limit(20).execute()
+    if latitude is not None and longitude is not None:
+        # Nearest first within the radius, via the pickup_location GIST index
+        # (see migrations/013_available_orders_near.sql)
+        orders = supabase.rpc("available_orders_near", {
+            "p_latitude": latitude,
+            "p_longitude": longitude,
+            "p_radius_m": radius_km * 1000,
+        }).execute().data or []
+    else:
+        query = supabase.table("orders").select("*, order_items(*)").eq("status", "ready_for_pickup").is_("driver_id", "null")
+        orders = query.order("created_at").limit(20).execute().data
 
-    orders = []
-    for order_data in result.data:
-        items = supabase.table("order_items").select("*").eq("order_id", order_data["id"]).execute()
-        order_data["items"] = items.data or []
-        orders.append(OrderResponse(**order_data))
+    for order_data in orders:
+        order_data["items"] = order_data.pop("order_items", None) or []
 
-    return orders
+    return _order_list_response(orders)
 
 
 @router.post("/accept/{order_id}", response_model=OrderResponse)
-async def accept_delivery(
+def accept_delivery(
     order_id: str,
-    current_user: Dict = Depends(require_role(["driver"]))
+    current_user: Dict = Depends(require_role(DRIVER_ROLES))
 ):
     """Accept a delivery order."""
     supabase = get_supabase()
 
-    # Get driver ID
-    driver = supabase.table("drivers").select("id, status").eq("user_id", current_user["id"]).single().execute()
-
-    if not driver.data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver profile not found")
-
-    if driver.data["status"] != "online":
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Driver must be online to accept deliveries")
-
-    # Check if order is available
-    order = supabase.table("orders").select("*").eq("id", order_id).single().execute()
-
-    if not order.data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-
-    if order.data["status"] != "ready_for_pickup":
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order is not available for pickup")
-
-    if order.data.get("driver_id"):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order already assigned to another driver")
-
-    # Assign driver to order
-    result = supabase.table("orders").update({
-        "driver_id": driver.data["id"],
-        "status": "driver_assigned",
-    }).eq("id", order_id).execute()
-
-    # Update driver status
-    supabase.table("drivers").update({"status": "on_delivery"}).eq("id", driver.data["id"]).execute()
-
-    # Log status change
-    supabase.table("order_status_history").insert({
-        "order_id": order_id,
-        "status": "driver_assigned",
-        "changed_by": current_user["id"],
-        "notes": f"Driver {current_user.get('first_name', '')} assigned",
-    }).execute()
-
-    # Get updated order
-    updated_order = supabase.table("orders").select("*").eq("id", order_id).single().execute()
-    items = supabase.table("order_items").select("*").eq("order_id", order_id).execute()
-    updated_order.data["items"] = items.data or []
-
-    return OrderResponse(**updated_order.data)
+    # Claim the order, update the driver and log history in one transaction
+    # (see migrations/011_accept_delivery_rpc.sql).
+    try:
+        result = supabase.rpc("accept_delivery", {
+            "p_order_id": order_id,
+            "p_user_id": current_user["id"],
+        }).execute()
+    except APIError as e:
+        if e.code == "P0002":
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.message)
+        if e.code == "P0001":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.message)
+        if e.code == "PT409":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.message)
+        raise
+
+    return model_json_response(OrderResponse, result.data)
 
 
 @router.get("/my-deliveries", response_model=List[OrderResponse])
-async def get_my_deliveries(
+def get_my_deliveries(
     status_filter: Optional[str] = None,
-    current_user: Dict = Depends(require_role(["driver"]))
+    driver_id: str = Depends(get_driver_id)
 ):
     """Get current driver's assigned deliveries."""
     supabase = get_supabase()
 
-    # Get driver ID
-    driver = supabase.table("drivers").select("id").eq("user_id", current_user["id"]).single().execute()
-
-    if not driver.data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver profile not found")
-
-    query = supabase.table("orders").select("*").eq("driver_id", driver.data["id"])
+    query = supabase.table("orders").select("*, order_items(*)").eq("driver_id", driver_id)
 
     if status_filter:
         query = query.eq("status", status_filter)
@@ -214,19 +205,16 @@ async def get_my_deliveries(
 
     result = query.order("created_at", desc=True).execute()
 
-    orders = []
     for order_data in result.data:
-        items = supabase.table("order_items").select("*").eq("order_id", order_data["id"]).execute()
-        order_data["items"] = items.data or []
-        orders.append(OrderResponse(**order_data))
+        order_data["items"] = order_data.pop("order_items", None) or []
 
-    return orders
+    return _order_list_response(result.data)
 
 
 @router.get("/earnings")
-async def get_driver_earnings(
-    period: str = "today",  # today, week, month, all
-    current_user: Dict = Depends(require_role(["driver"]))
+def get_driver_earnings(
+    period: Literal["today", "week", "month", "all"] = "today",
+    current_user: Dict = Depends(require_role(DRIVER_ROLES))
 ):
     """Get driver's earnings summary."""
     supabase = get_supabase()
@@ -237,17 +225,17 @@ async def get_driver_earnings(
     if not driver.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver profile not found")
 
-    # Get earnings
-    earnings = supabase.table("driver_earnings").select("*").eq("driver_id", driver.data["id"]).execute()
-
-    total_earnings = sum(e["total_earnings"] for e in earnings.data) if earnings.data else 0
-    total_deliveries = len(earnings.data) if earnings.data else 0
-    total_tips = sum(e["tip_amount"] for e in earnings.data) if earnings.data else 0
+    # Totals and the latest rows are aggregated in Postgres
+    # (see migrations/012_driver_earnings_summary.sql)
+    summary = supabase.rpc("driver_earnings_summary", {
+        "p_driver_id": driver.data["id"],
+        "p_period": period,
+    }).execute().data
 
     return {
         "wallet_balance": driver.data["wallet_balance"],
-        "total_earnings": total_earnings,
-        "total_deliveries": total_deliveries,
-        "total_tips": total_tips,
-        "recent_earnings": earnings.data[:10] if earnings.data else [],
+        "total_earnings": summary["total_earnings"],
+        "total_deliveries": summary["total_deliveries"],
+        "total_tips": summary["total_tips"],
+        "recent_earnings": summary["recent_earnings"],
     }
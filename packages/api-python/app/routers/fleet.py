@@ -1,8 +1,11 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import Response
+from pydantic import TypeAdapter
 from typing import List, Optional, Dict
 
+from app.core.responses import ORJSONResponse, model_json_response
 from app.core.supabase import get_supabase
-from app.core.security import get_current_user, require_role
+from app.core.security import get_current_user, require_role, HUB_ADMIN_ROLES
 from app.models.hub import (
     VehicleCreate,
     VehicleUpdate,
@@ -11,15 +14,17 @@ from app.models.hub import (
 
 router = APIRouter(prefix="/fleet", tags=["Fleet"])
 
+_vehicle_list = TypeAdapter(List[VehicleResponse])
+
 
 # =====================================================
 # VEHICLES
 # =====================================================
 
 @router.post("/vehicles", response_model=VehicleResponse, status_code=status.HTTP_201_CREATED)
-async def create_vehicle(
+def create_vehicle(
     vehicle_data: VehicleCreate,
-    current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
+    current_user: Dict = Depends(require_role(HUB_ADMIN_ROLES))
 ):
     """Add a vehicle to a hub."""
     supabase = get_supabase()
@@ -29,15 +34,15 @@ async def create_vehicle(
     if not result.data:
         raise HTTPException(status_code=500, detail="Failed to create vehicle")
 
-    return VehicleResponse(**result.data[0])
+    return model_json_response(VehicleResponse, result.data[0], status.HTTP_201_CREATED)
 
 
 @router.get("/vehicles", response_model=List[VehicleResponse])
-async def list_vehicles(
+def list_vehicles(
     hub_id: Optional[str] = None,
     vehicle_type: Optional[str] = None,
     status_filter: Optional[str] = Query(None, alias="status"),
-    current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
+    current_user: Dict = Depends(require_role(HUB_ADMIN_ROLES))
 ):
     """List vehicles with filters."""
     supabase = get_supabase()
@@ -54,14 +59,17 @@ async def list_vehicles(
     query = query.eq("is_active", True)
     result = query.order("created_at", desc=True).execute()
 
-    return [VehicleResponse(**v) for v in result.data]
+    return Response(
+        _vehicle_list.dump_json(_vehicle_list.validate_python(result.data)),
+        media_type="application/json",
+    )
 
 
 @router.patch("/vehicles/{vehicle_id}", response_model=VehicleResponse)
-async def update_vehicle(
+def update_vehicle(
     vehicle_id: str,
     vehicle_data: VehicleUpdate,
-    current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
+    current_user: Dict = Depends(require_role(HUB_ADMIN_ROLES))
 ):
     """Update a vehicle."""
     supabase = get_supabase()
@@ -75,13 +83,13 @@ async def update_vehicle(
     if not result.data:
         raise HTTPException(status_code=404, detail="Vehicle not found")
 
-    return VehicleResponse(**result.data[0])
+    return model_json_response(VehicleResponse, result.data[0])
 
 
 @router.delete("/vehicles/{vehicle_id}")
-async def delete_vehicle(
+def delete_vehicle(
     vehicle_id: str,
-    current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
+    current_user: Dict = Depends(require_role(HUB_ADMIN_ROLES))
 ):
     """Soft-delete a vehicle."""
     supabase = get_supabase()
@@ -102,15 +110,16 @@ async def delete_vehicle(
 # =====================================================
 
 @router.get("/drivers")
-async def list_drivers(
+def list_drivers(
     hub_id: Optional[str] = None,
     status_filter: Optional[str] = Query(None, alias="status"),
-    current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
+    current_user: Dict = Depends(require_role(HUB_ADMIN_ROLES))
 ):
     """List drivers at a hub."""
     supabase = get_supabase()
 
-    query = supabase.table("drivers").select("*, users(first_name, last_name, email, phone)")
+    # Flat driver + user columns (see migrations/014_drivers_with_user_view.sql)
+    query = supabase.table("drivers_with_user").select("*")
 
     if hub_id:
         query = query.eq("hub_id", hub_id)
@@ -120,25 +129,14 @@ async def list_drivers(
     query = query.eq("is_active", True)
     result = query.execute()
 
-    drivers = []
-    for d in (result.data or []):
-        user_info = d.pop("users", {}) or {}
-        drivers.append({
-            **d,
-            "first_name": user_info.get("first_name", ""),
-            "last_name": user_info.get("last_name", ""),
-            "email": user_info.get("email", ""),
-            "user_phone": user_info.get("phone", ""),
-        })
-
-    return drivers
+    return ORJSONResponse(result.data or [])
 
 
 @router.post("/drivers/{driver_id}/assign-hub")
-async def assign_driver_to_hub(
+def assign_driver_to_hub(
     driver_id: str,
     hub_id: str = Query(...),
-    current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
+    current_user: Dict = Depends(require_role(HUB_ADMIN_ROLES))
 ):
     """Assign a driver to a hub."""
     supabase = get_supabase()
@@ -1,11 +1,35 @@
 from fastapi import APIRouter
 from datetime import datetime
+from typing import Dict
+from cachetools import TTLCache
 
 from app.core.config import settings
 from app.core.supabase import get_supabase
 
 router = APIRouter(tags=["Health"])
 
+# Load balancers poll /health/detailed every second or so; a few seconds of
+# staleness is fine and keeps the probe from becoming a constant query stream.
+_db_probe_cache: TTLCache = TTLCache(maxsize=1, ttl=3)
+
+
+def _probe_db() -> Dict[str, str]:
+    """Check the Supabase connection, reusing the result for a few seconds."""
+    cached = _db_probe_cache.get("database")
+    if cached is not None:
+        return cached
+
+    try:
+        supabase = get_supabase()
+        # Simple query to test connection
+        supabase.table("users").select("id").limit(1).execute()
+        result = {"status": "healthy"}
+    except Exception as e:
+        result = {"status": "unhealthy", "error": str(e)}
+
+    _db_probe_cache["database"] = result
+    return result
+
 
 @router.get("/health")
 async def health_check():
@@ -19,7 +43,7 @@ async def health_check():
 
 
 @router.get("/health/detailed")
-async def detailed_health_check():
+def detailed_health_check():
     """Detailed health check with dependency status."""
     checks = {
         "api": {"status": "healthy"},
@@ -27,13 +51,7 @@ async def detailed_health_check():
     }
 
     # Check Supabase connection
-    try:
-        supabase = get_supabase()
-        # Simple query to test connection
-        supabase.table("users").select("id").limit(1).execute()
-        checks["database"] = {"status": "healthy"}
-    except Exception as e:
-        checks["database"] = {"status": "unhealthy", "error": str(e)}
+    checks["database"] = _probe_db()
 
     overall_status = "healthy" if all(
         check["status"] == "healthy" for check in checks.values()
@@ -1,12 +1,26 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import Dict, Optional, List
+from fastapi.responses import Response, StreamingResponse
+from typing import Dict, Iterator, Optional, List
 from datetime import datetime, date, timedelta
+from collections import Counter
+import asyncio
+import orjson
 
-from app.core.supabase import get_supabase
+from app.core.cache import cache_get, cache_set
+from app.core.responses import iter_json_array
+from app.core.supabase import get_supabase, run_query
 from app.core.security import require_role
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
+# Dashboard payloads are hub-scoped (not per-user) and polled by every open
+# dashboard, so they are cached briefly. Access is still checked per request.
+DASHBOARD_CACHE_TTL = 60
+
+
+def _json_response(body: bytes) -> Response:
+    return Response(body, media_type="application/json")
+
 
 @router.get("/hub/{hub_id}/dashboard")
 async def hub_dashboard(
@@ -14,44 +28,52 @@ async def hub_dashboard(
     current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
 ):
     """Today's KPIs for a hub."""
-    supabase = get_supabase()
     today = date.today().isoformat()
+    cache_key = f"analytics:dashboard:{hub_id}:{today}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return _json_response(cached)
+
+    supabase = get_supabase()
 
-    # Orders
-    orders = supabase.table("delivery_orders").select("status, is_cod, cod_amount, created_at").eq(
-        "hub_id", hub_id
-    ).gte("created_at", today + "T00:00:00").execute()
+    # Orders (per-status counts from the minutely refreshed hub_today_kpis
+    # view, see migrations/021_hub_today_kpis.sql), routes and drivers are
+    # independent, so fetch them concurrently.
+    orders, routes, drivers = await asyncio.gather(
+        run_query(supabase.table("hub_today_kpis").select("status, cnt, cod_sum").eq(
+            "hub_id", hub_id
+        ).eq("day", today)),
+        run_query(supabase.table("delivery_routes").select("status").eq(
+            "hub_id", hub_id
+        ).eq("route_date", today)),
+        run_query(supabase.table("drivers").select("status").eq("hub_id", hub_id).eq("is_active", True)),
+    )
+    buckets = orders.data or []
 
-    all_orders = orders.data or []
-    total = len(all_orders)
-    delivered = sum(1 for o in all_orders if o["status"] == "delivered")
-    failed = sum(1 for o in all_orders if o["status"] == "failed")
-    pending = sum(1 for o in all_orders if o["status"] == "pending")
-    out_for_delivery = sum(1 for o in all_orders if o["status"] == "out_for_delivery")
-    assigned = sum(1 for o in all_orders if o["status"] == "assigned")
-    returned = sum(1 for o in all_orders if o["status"] == "returned_to_hub")
+    by_status = {b["status"]: b["cnt"] for b in buckets}
+    total = sum(by_status.values())
+    delivered = by_status.get("delivered", 0)
+    failed = by_status.get("failed", 0)
+    pending = by_status.get("pending", 0)
+    out_for_delivery = by_status.get("out_for_delivery", 0)
+    assigned = by_status.get("assigned", 0)
+    returned = by_status.get("returned_to_hub", 0)
 
     success_rate = (delivered / (delivered + failed) * 100) if (delivered + failed) > 0 else 0
-    cod_collected = sum(
-        float(o.get("cod_amount") or 0)
-        for o in all_orders
-        if o["status"] == "delivered" and o.get("is_cod")
-    )
+    cod_collected = sum(float(b["cod_sum"] or 0) for b in buckets)
 
     # Routes
-    routes = supabase.table("delivery_routes").select("status").eq(
-        "hub_id", hub_id
-    ).eq("route_date", today).execute()
-    total_routes = len(routes.data or [])
-    active_routes = sum(1 for r in (routes.data or []) if r["status"] == "in_progress")
-    completed_routes = sum(1 for r in (routes.data or []) if r["status"] == "completed")
+    route_counts = Counter(r["status"] for r in (routes.data or []))
+    total_routes = sum(route_counts.values())
+    active_routes = route_counts["in_progress"]
+    completed_routes = route_counts["completed"]
 
     # Drivers
-    drivers = supabase.table("drivers").select("status").eq("hub_id", hub_id).eq("is_active", True).execute()
-    total_drivers = len(drivers.data or [])
-    online_drivers = sum(1 for d in (drivers.data or []) if d["status"] in ("online", "on_delivery"))
+    driver_counts = Counter(d["status"] for d in (drivers.data or []))
+    total_drivers = sum(driver_counts.values())
+    online_drivers = driver_counts["online"] + driver_counts["on_delivery"]
 
-    return {
+    payload = {
         "date": today,
         "orders": {
             "total": total,
@@ -75,6 +97,34 @@ async def hub_dashboard(
         },
     }
 
+    body = orjson.dumps(payload)
+    await cache_set(cache_key, body, DASHBOARD_CACHE_TTL)
+    return _json_response(body)
+
+
+def _daily_rows(buckets: List[Dict]) -> Iterator[Dict]:
+    """Fold day-ordered (day, status) buckets into one report row per day."""
+    day = None
+    for b in buckets:
+        if day is None or day["date"] != b["day"]:
+            if day is not None:
+                yield _with_success_rate(day)
+            day = {"date": b["day"], "total": 0, "delivered": 0, "failed": 0, "cod_collected": 0}
+        day["total"] += b["cnt"]
+        if b["status"] == "delivered":
+            day["delivered"] += b["cnt"]
+            day["cod_collected"] += float(b["cod_sum"] or 0)
+        elif b["status"] == "failed":
+            day["failed"] += b["cnt"]
+    if day is not None:
+        yield _with_success_rate(day)
+
+
+def _with_success_rate(day: Dict) -> Dict:
+    attempted = day["delivered"] + day["failed"]
+    day["success_rate"] = round((day["delivered"] / attempted * 100) if attempted > 0 else 0, 1)
+    return day
+
 
 @router.get("/hub/{hub_id}/daily")
 async def hub_daily_report(
@@ -86,32 +136,16 @@ async def hub_daily_report(
     """Daily report for a date range."""
     supabase = get_supabase()
 
-    orders = supabase.table("delivery_orders").select(
-        "status, is_cod, cod_amount, created_at, delivered_at"
-    ).eq("hub_id", hub_id).gte(
-        "created_at", start_date + "T00:00:00"
-    ).lte("created_at", end_date + "T23:59:59").execute()
-
-    # Group by date
-    daily = {}
-    for o in (orders.data or []):
-        d = o["created_at"][:10]
-        if d not in daily:
-            daily[d] = {"date": d, "total": 0, "delivered": 0, "failed": 0, "cod_collected": 0}
-        daily[d]["total"] += 1
-        if o["status"] == "delivered":
-            daily[d]["delivered"] += 1
-            if o.get("is_cod"):
-                daily[d]["cod_collected"] += float(o.get("cod_amount") or 0)
-        elif o["status"] == "failed":
-            daily[d]["failed"] += 1
-
-    # Calculate success rates
-    for d in daily.values():
-        attempted = d["delivered"] + d["failed"]
-        d["success_rate"] = round((d["delivered"] / attempted * 100) if attempted > 0 else 0, 1)
-
-    return sorted(daily.values(), key=lambda x: x["date"])
+    # Pre-grouped (day, status) buckets, ordered by day so each day can be
+    # emitted as soon as its buckets are done
+    # (see migrations/016_hub_dashboard_stats.sql)
+    buckets = (await run_query(supabase.rpc("hub_daily_stats", {
+        "p_hub_id": hub_id,
+        "p_start": start_date,
+        "p_end": end_date,
+    }).order("day"))).data or []
+
+    return StreamingResponse(iter_json_array(_daily_rows(buckets)), media_type="application/json")
 
 
 @router.get("/overview")
@@ -119,39 +153,35 @@ async def overview(
     current_user: Dict = Depends(require_role(["admin", "super_admin"]))
 ):
     """All-hubs overview for admin."""
-    supabase = get_supabase()
     today = date.today().isoformat()
+    cache_key = f"analytics:overview:{today}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return _json_response(cached)
 
-    hubs = supabase.table("hubs").select("id, name, code").eq("is_active", True).execute()
+    supabase = get_supabase()
+
+    # One grouped query for every active hub (see migrations/015_hub_overview_rpc.sql)
+    rows = (await run_query(supabase.rpc("hub_overview", {"p_since": today + "T00:00:00"}))).data or []
 
     hub_stats = []
-    for hub in (hubs.data or []):
-        orders = supabase.table("delivery_orders").select("status").eq(
-            "hub_id", hub["id"]
-        ).gte("created_at", today + "T00:00:00").execute()
-
-        total = len(orders.data or [])
-        delivered = sum(1 for o in (orders.data or []) if o["status"] == "delivered")
-        failed = sum(1 for o in (orders.data or []) if o["status"] == "failed")
+    for row in rows:
+        delivered = row["delivered"]
+        failed = row["failed"]
         success_rate = (delivered / (delivered + failed) * 100) if (delivered + failed) > 0 else 0
 
-        drivers = supabase.table("drivers").select("status").eq(
-            "hub_id", hub["id"]
-        ).eq("is_active", True).execute()
-        online = sum(1 for d in (drivers.data or []) if d["status"] in ("online", "on_delivery"))
-
         hub_stats.append({
-            "hub_id": hub["id"],
-            "hub_name": hub["name"],
-            "hub_code": hub["code"],
-            "total_orders": total,
+            "hub_id": row["hub_id"],
+            "hub_name": row["hub_name"],
+            "hub_code": row["hub_code"],
+            "total_orders": row["total_orders"],
             "delivered": delivered,
             "failed": failed,
             "success_rate": round(success_rate, 1),
-            "drivers_online": online,
+            "drivers_online": row["drivers_online"],
         })
 
-    return {
+    payload = {
         "date": today,
         "total_hubs": len(hub_stats),
         "hubs": hub_stats,
@@ -159,3 +189,7 @@ async def overview(
         "total_delivered": sum(h["delivered"] for h in hub_stats),
         "total_failed": sum(h["failed"] for h in hub_stats),
     }
+
+    body = orjson.dumps(payload)
+    await cache_set(cache_key, body, DASHBOARD_CACHE_TTL)
+    return _json_response(body)
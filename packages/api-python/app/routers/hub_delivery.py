@@ -1,11 +1,11 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from typing import Dict, Optional
-from datetime import datetime, timedelta
-import random
-import string
+from datetime import datetime, timedelta, timezone
+import secrets
+from postgrest.exceptions import APIError
 
-from app.core.supabase import get_supabase
-from app.core.security import get_current_user, require_role
+from app.core.supabase import get_supabase, run_query
+from app.core.security import get_current_user, require_role, get_driver_id
 from app.core.config import settings
 from app.models.delivery_order import (
     OtpSendRequest,
@@ -28,7 +28,7 @@ router = APIRouter(prefix="/delivery", tags=["Delivery"])
 
 
 def generate_otp(length: int = 6) -> str:
-    return "".join(random.choices(string.digits, k=length))
+    return f"{secrets.randbelow(10 ** length):0{length}d}"
 
 
 # =====================================================
@@ -43,29 +43,24 @@ async def send_otp(
     """Generate and send OTP to customer for delivery verification."""
     supabase = get_supabase()
 
-    order = supabase.table("delivery_orders").select("customer_phone, customer_name").eq(
-        "id", otp_data.order_id
-    ).single().execute()
-
-    if not order.data:
-        raise HTTPException(status_code=404, detail="Order not found")
-
     otp_code = generate_otp()
-    expires_at = datetime.utcnow() + timedelta(minutes=10)
-
-    # Invalidate previous OTPs for this order/type
-    supabase.table("otp_tokens").update({
-        "is_verified": True,
-    }).eq("order_id", otp_data.order_id).eq("otp_type", otp_data.otp_type).eq("is_verified", False).execute()
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
 
-    # Create new OTP
-    supabase.table("otp_tokens").insert({
-        "order_id": otp_data.order_id,
-        "otp_code": otp_code,
-        "otp_type": otp_data.otp_type,
-        "sent_to": order.data["customer_phone"],
-        "expires_at": expires_at.isoformat(),
-    }).execute()
+    # Look up the phone, invalidate pending OTPs for this order/type and
+    # store the new one in one transaction (see migrations/020_issue_otp_rpc.sql)
+    try:
+        result = await run_query(supabase.rpc("issue_otp", {
+            "p_order_id": otp_data.order_id,
+            "p_otp_type": otp_data.otp_type,
+            "p_otp_code": otp_code,
+            "p_expires_at": expires_at.isoformat(),
+        }))
+    except APIError as e:
+        if e.code == "P0002":
+            raise HTTPException(status_code=404, detail=e.message)
+        raise
+
+    customer_phone = result.data
 
     # Send SMS via Twilio (if configured)
     if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN and settings.TWILIO_FROM_NUMBER:
@@ -75,7 +70,7 @@ async def send_otp(
             client.messages.create(
                 body=f"Your LMA delivery OTP is: {otp_code}. Valid for 10 minutes.",
                 from_=settings.TWILIO_FROM_NUMBER,
-                to=order.data["customer_phone"],
+                to=customer_phone,
             )
         except Exception as e:
             import logging
@@ -86,7 +81,7 @@ async def send_otp(
 
     return OtpResponse(
         success=True,
-        message=f"OTP sent to {order.data['customer_phone'][-4:].rjust(len(order.data['customer_phone']), '*')}",
+        message=f"OTP sent to {customer_phone[-4:].rjust(len(customer_phone), '*')}",
         expires_at=expires_at,
     )
 
@@ -99,11 +94,11 @@ async def verify_otp(
     """Verify OTP entered by driver."""
     supabase = get_supabase()
 
-    result = supabase.table("otp_tokens").select("*").eq(
+    result = await run_query(supabase.table("otp_tokens").select("id, otp_code, expires_at").eq(
         "order_id", otp_data.order_id
     ).eq("otp_type", otp_data.otp_type).eq("is_verified", False).order(
         "created_at", desc=True
-    ).limit(1).execute()
+    ).limit(1))
 
     if not result.data:
         raise HTTPException(status_code=400, detail="No active OTP found")
@@ -114,14 +109,13 @@ async def verify_otp(
         return OtpResponse(success=False, message="Invalid OTP")
 
     expires_at = datetime.fromisoformat(token["expires_at"].replace("Z", "+00:00"))
-    now = datetime.utcnow().replace(tzinfo=expires_at.tzinfo)
-    if expires_at < now:
+    if expires_at < datetime.now(timezone.utc):
         return OtpResponse(success=False, message="OTP has expired")
 
     # Mark verified
-    supabase.table("otp_tokens").update({
+    await run_query(supabase.table("otp_tokens").update({
         "is_verified": True,
-    }).eq("id", token["id"]).execute()
+    }).eq("id", token["id"]))
 
     return OtpResponse(success=True, message="OTP verified successfully")
 
@@ -158,75 +152,31 @@ async def record_attempt(
     """Record a delivery attempt (success or failure)."""
     supabase = get_supabase()
 
-    # Get driver id
-    driver = supabase.table("drivers").select("id").eq("user_id", current_user["id"]).single().execute()
-    if not driver.data:
-        raise HTTPException(status_code=404, detail="Driver profile not found")
-
-    driver_id = driver.data["id"]
-
-    # Get attempt number
-    prev_attempts = supabase.table("delivery_attempts").select("attempt_number").eq(
-        "order_id", attempt_data.order_id
-    ).order("attempt_number", desc=True).limit(1).execute()
-
-    attempt_number = 1
-    if prev_attempts.data:
-        attempt_number = prev_attempts.data[0]["attempt_number"] + 1
-
-    attempt_dict = {
-        "order_id": attempt_data.order_id,
-        "route_stop_id": attempt_data.route_stop_id,
-        "driver_id": driver_id,
-        "attempt_number": attempt_number,
-        "status": attempt_data.status,
-        "failure_reason": attempt_data.failure_reason,
-        "failure_notes": attempt_data.failure_notes,
-        "photo_urls": attempt_data.photo_urls,
-        "signature_url": attempt_data.signature_url,
-        "recipient_name": attempt_data.recipient_name,
-        "cod_collected": attempt_data.cod_collected,
-        "cod_amount": attempt_data.cod_amount,
-        "latitude": attempt_data.latitude,
-        "longitude": attempt_data.longitude,
-    }
-
-    result = supabase.table("delivery_attempts").insert(attempt_dict).execute()
+    # Numbering, insert, and the order/route-stop status updates happen in one
+    # transaction (see migrations/017_record_delivery_attempt_rpc.sql)
+    try:
+        result = await run_query(supabase.rpc("record_delivery_attempt", {
+            "p_user_id": current_user["id"],
+            "p_payload": attempt_data.model_dump(),
+        }))
+    except APIError as e:
+        if e.code == "P0002":
+            raise HTTPException(status_code=404, detail=e.message)
+        raise
 
-    # Update order status
-    now = datetime.utcnow().isoformat()
-    if attempt_data.status == "delivered":
-        supabase.table("delivery_orders").update({
-            "status": "delivered",
-            "delivered_at": now,
-        }).eq("id", attempt_data.order_id).execute()
-    elif attempt_data.status == "failed":
-        supabase.table("delivery_orders").update({
-            "status": "failed",
-            "failed_at": now,
-        }).eq("id", attempt_data.order_id).execute()
-
-    # Update route stop status
-    if attempt_data.route_stop_id:
-        supabase.table("route_stops").update({
-            "status": attempt_data.status,
-            "actual_departure": now,
-        }).eq("id", attempt_data.route_stop_id).execute()
+    recorded = result.data
 
     # Sync status to CJDQuick OMS
     try:
-        order_row = supabase.table("delivery_orders").select(
-            "external_order_id, external_source"
-        ).eq("id", attempt_data.order_id).single().execute()
-        if order_row.data and order_row.data.get("external_source") == "cjdquick":
-            ext_id = order_row.data["external_order_id"]
+        if recorded.get("external_source") == "cjdquick":
+            ext_id = recorded["external_order_id"]
             cjd_status = cjdquick_svc.get_cjdquick_status(attempt_data.status)
             if cjd_status:
                 await cjdquick_svc.update_order_status(ext_id, cjd_status)
     except Exception:
         pass  # Don't fail delivery recording if sync fails
 
-    return DeliveryAttemptResponse(**result.data[0])
+    return DeliveryAttemptResponse(**recorded["attempt"])
 
 
 @router.post("/return-to-hub")
@@ -237,10 +187,12 @@ async def return_to_hub(
     """Mark failed order as returned to hub."""
     supabase = get_supabase()
 
-    result = supabase.table("delivery_orders").update({
+    result = await run_query(supabase.table("delivery_orders").update({
         "status": "returned_to_hub",
-        "returned_at": datetime.utcnow().isoformat(),
-    }).eq("id", order_id).execute()
+        "returned_at": datetime.now(timezone.utc).isoformat(),
+    }).eq("id", order_id).select(
+        "id, external_source, external_order_id, product_sku"
+    ))
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -271,50 +223,19 @@ async def get_my_route(
     """Get driver's current route with all stops."""
     supabase = get_supabase()
 
-    driver = supabase.table("drivers").select("id").eq("user_id", current_user["id"]).single().execute()
-    if not driver.data:
-        raise HTTPException(status_code=404, detail="Driver profile not found")
-
-    driver_id = driver.data["id"]
-    today = datetime.utcnow().date().isoformat()
-
-    # Get today's route
-    route = supabase.table("delivery_routes").select("*").eq(
-        "driver_id", driver_id
-    ).eq("route_date", today).in_(
-        "status", ["assigned", "in_progress"]
-    ).order("created_at", desc=True).limit(1).execute()
+    # Driver, route, stops with their orders, and vehicle in one query
+    # (see migrations/018_driver_current_route_rpc.sql)
+    try:
+        route = await run_query(supabase.rpc("driver_current_route", {"p_user_id": current_user["id"]}))
+    except APIError as e:
+        if e.code == "P0002":
+            raise HTTPException(status_code=404, detail=e.message)
+        raise
 
     if not route.data:
         return {"route": None, "message": "No route assigned for today"}
 
-    route_data = route.data[0]
-
-    # Get stops
-    stops_result = supabase.table("route_stops").select("*").eq(
-        "route_id", route_data["id"]
-    ).order("sequence").execute()
-
-    stops = []
-    for stop in (stops_result.data or []):
-        order = supabase.table("delivery_orders").select(
-            "id, order_number, customer_name, customer_phone, delivery_address, product_description, status, is_cod, cod_amount"
-        ).eq("id", stop["order_id"]).single().execute()
-
-        stops.append({
-            **stop,
-            "order": order.data if order.data else None,
-        })
-
-    # Get vehicle
-    vehicle = None
-    if route_data.get("vehicle_id"):
-        v = supabase.table("hub_vehicles").select("*").eq("id", route_data["vehicle_id"]).single().execute()
-        vehicle = v.data
-
-    return {
-        "route": {**route_data, "stops": stops, "vehicle": vehicle},
-    }
+    return {"route": route.data}
 
 
 @router.post("/stop/{stop_id}/arrive")
@@ -325,10 +246,10 @@ async def arrive_at_stop(
     """Mark arrival at a stop."""
     supabase = get_supabase()
 
-    result = supabase.table("route_stops").update({
+    result = await run_query(supabase.table("route_stops").update({
         "status": "arrived",
-        "actual_arrival": datetime.utcnow().isoformat(),
-    }).eq("id", stop_id).execute()
+        "actual_arrival": datetime.now(timezone.utc).isoformat(),
+    }).eq("id", stop_id))
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Stop not found")
@@ -345,10 +266,10 @@ async def complete_stop(
     """Complete a stop (delivered or failed)."""
     supabase = get_supabase()
 
-    result = supabase.table("route_stops").update({
+    result = await run_query(supabase.table("route_stops").update({
         "status": status_value,
-        "actual_departure": datetime.utcnow().isoformat(),
-    }).eq("id", stop_id).execute()
+        "actual_departure": datetime.now(timezone.utc).isoformat(),
+    }).eq("id", stop_id))
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Stop not found")
@@ -363,23 +284,16 @@ async def complete_stop(
 
 @router.get("/my-pickups", response_model=list[ReversePickupResponse])
 async def get_my_pickups(
-    current_user: Dict = Depends(require_role(["driver"]))
+    driver_id: str = Depends(get_driver_id)
 ):
     """Get driver's assigned pickups for today."""
     supabase = get_supabase()
 
-    driver = supabase.table("drivers").select("id").eq("user_id", current_user["id"]).single().execute()
-    if not driver.data:
-        raise HTTPException(status_code=404, detail="Driver profile not found")
-
-    driver_id = driver.data["id"]
-    today = datetime.utcnow().date().isoformat()
-
-    result = supabase.table("reverse_pickups").select("*").eq(
+    result = await run_query(supabase.table("reverse_pickups").select("*").eq(
         "driver_id", driver_id
     ).in_(
         "status", ["assigned", "out_for_pickup"]
-    ).execute()
+    ))
 
     return [ReversePickupResponse(**p) for p in (result.data or [])]
 
@@ -392,12 +306,12 @@ async def arrive_at_pickup(
     """Mark arrival at pickup location."""
     supabase = get_supabase()
 
-    now = datetime.utcnow().isoformat()
-    result = supabase.table("reverse_pickups").update({
+    now = datetime.now(timezone.utc).isoformat()
+    result = await run_query(supabase.table("reverse_pickups").update({
         "status": "out_for_pickup",
         "out_for_pickup_at": now,
         "updated_at": now,
-    }).eq("id", pickup_id).execute()
+    }).eq("id", pickup_id))
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Pickup not found")
@@ -413,29 +327,29 @@ async def send_pickup_otp(
     """Send OTP to customer for pickup verification."""
     supabase = get_supabase()
 
-    pickup = supabase.table("reverse_pickups").select("customer_phone, customer_name").eq(
+    pickup = await run_query(supabase.table("reverse_pickups").select("customer_phone, customer_name").eq(
         "id", otp_data.pickup_id
-    ).single().execute()
+    ).single())
 
     if not pickup.data:
         raise HTTPException(status_code=404, detail="Pickup not found")
 
     otp_code = generate_otp()
-    expires_at = datetime.utcnow() + timedelta(minutes=10)
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
 
     # Invalidate previous OTPs for this pickup
-    supabase.table("otp_tokens").update({
+    await run_query(supabase.table("otp_tokens").update({
         "is_verified": True,
-    }).eq("order_id", otp_data.pickup_id).eq("otp_type", "pickup").eq("is_verified", False).execute()
+    }).eq("order_id", otp_data.pickup_id).eq("otp_type", "pickup").eq("is_verified", False))
 
     # Create new OTP (reuse order_id column for pickup_id)
-    supabase.table("otp_tokens").insert({
+    await run_query(supabase.table("otp_tokens").insert({
         "order_id": otp_data.pickup_id,
         "otp_code": otp_code,
         "otp_type": "pickup",
         "sent_to": pickup.data["customer_phone"],
         "expires_at": expires_at.isoformat(),
-    }).execute()
+    }))
 
     # Send SMS via Twilio (if configured)
     if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN and settings.TWILIO_FROM_NUMBER:
@@ -469,11 +383,11 @@ async def verify_pickup_otp(
     """Verify OTP for pickup."""
     supabase = get_supabase()
 
-    result = supabase.table("otp_tokens").select("*").eq(
+    result = await run_query(supabase.table("otp_tokens").select("id, otp_code, expires_at").eq(
         "order_id", otp_data.pickup_id
     ).eq("otp_type", "pickup").eq("is_verified", False).order(
         "created_at", desc=True
-    ).limit(1).execute()
+    ).limit(1))
 
     if not result.data:
         raise HTTPException(status_code=400, detail="No active OTP found")
@@ -484,14 +398,13 @@ async def verify_pickup_otp(
         return OtpResponse(success=False, message="Invalid OTP")
 
     expires_at = datetime.fromisoformat(token["expires_at"].replace("Z", "+00:00"))
-    now = datetime.utcnow().replace(tzinfo=expires_at.tzinfo)
-    if expires_at < now:
+    if expires_at < datetime.now(timezone.utc):
         return OtpResponse(success=False, message="OTP has expired")
 
     # Mark verified
-    supabase.table("otp_tokens").update({
+    await run_query(supabase.table("otp_tokens").update({
         "is_verified": True,
-    }).eq("id", token["id"]).execute()
+    }).eq("id", token["id"]))
 
     return OtpResponse(success=True, message="OTP verified successfully")
 
@@ -499,18 +412,11 @@ async def verify_pickup_otp(
 @router.post("/pickup/attempt", response_model=PickupAttemptResponse)
 async def record_pickup_attempt(
     attempt_data: PickupAttemptCreate,
-    current_user: Dict = Depends(require_role(["driver"]))
+    driver_id: str = Depends(get_driver_id)
 ):
     """Record a pickup attempt (success or failure) with item condition."""
     supabase = get_supabase()
 
-    # Get driver id
-    driver = supabase.table("drivers").select("id").eq("user_id", current_user["id"]).single().execute()
-    if not driver.data:
-        raise HTTPException(status_code=404, detail="Driver profile not found")
-
-    driver_id = driver.data["id"]
-
     # Validate condition photos for successful pickups
     if attempt_data.status == "picked_up":
         if not attempt_data.condition_photo_urls or len(attempt_data.condition_photo_urls) < 2:
@@ -524,10 +430,12 @@ async def record_pickup_attempt(
                 detail="Item condition is required for successful pickups"
             )
 
+    now = datetime.now(timezone.utc).isoformat()
+
     # Get attempt number
-    prev_attempts = supabase.table("pickup_attempts").select("attempt_number").eq(
+    prev_attempts = await run_query(supabase.table("pickup_attempts").select("attempt_number").eq(
         "pickup_id", attempt_data.pickup_id
-    ).order("attempt_number", desc=True).limit(1).execute()
+    ).order("attempt_number", desc=True).limit(1))
 
     attempt_number = 1
     if prev_attempts.data:
@@ -539,7 +447,7 @@ async def record_pickup_attempt(
         "attempt_number": attempt_number,
         "status": attempt_data.status,
         "otp_verified": attempt_data.otp_verified,
-        "otp_verified_at": datetime.utcnow().isoformat() if attempt_data.otp_verified else None,
+        "otp_verified_at": now if attempt_data.otp_verified else None,
         "failure_reason": attempt_data.failure_reason,
         "failure_notes": attempt_data.failure_notes,
         "item_condition": attempt_data.item_condition,
@@ -552,22 +460,21 @@ async def record_pickup_attempt(
         "longitude": attempt_data.longitude,
     }
 
-    result = supabase.table("pickup_attempts").insert(attempt_dict).execute()
+    result = await run_query(supabase.table("pickup_attempts").insert(attempt_dict))
 
     # Update pickup status
-    now = datetime.utcnow().isoformat()
     if attempt_data.status == "picked_up":
-        supabase.table("reverse_pickups").update({
+        await run_query(supabase.table("reverse_pickups").update({
             "status": "picked_up",
             "picked_up_at": now,
             "updated_at": now,
-        }).eq("id", attempt_data.pickup_id).execute()
+        }).eq("id", attempt_data.pickup_id))
 
         # Notify CJDQuick if applicable
         try:
-            pickup_row = supabase.table("reverse_pickups").select(
+            pickup_row = await run_query(supabase.table("reverse_pickups").select(
                 "external_order_id, external_source, external_return_id"
-            ).eq("id", attempt_data.pickup_id).single().execute()
+            ).eq("id", attempt_data.pickup_id).single())
             if pickup_row.data and pickup_row.data.get("external_source") == "cjdquick":
                 ext_id = pickup_row.data["external_order_id"]
                 return_id = pickup_row.data.get("external_return_id")
@@ -576,9 +483,9 @@ async def record_pickup_attempt(
             pass  # Don't fail pickup recording if sync fails
 
     elif attempt_data.status == "failed":
-        supabase.table("reverse_pickups").update({
+        await run_query(supabase.table("reverse_pickups").update({
             "updated_at": now,
-        }).eq("id", attempt_data.pickup_id).execute()
+        }).eq("id", attempt_data.pickup_id))
 
     return PickupAttemptResponse(**result.data[0])
 
@@ -593,9 +500,9 @@ async def get_my_documents(
 ):
     """Get driver's uploaded documents."""
     supabase = get_supabase()
-    driver = supabase.table("drivers").select("id, documents").eq(
+    driver = await run_query(supabase.table("drivers").select("id, documents").eq(
         "user_id", current_user["id"]
-    ).single().execute()
+    ).single())
 
     if not driver.data:
         raise HTTPException(status_code=404, detail="Driver profile not found")
@@ -610,9 +517,9 @@ async def upload_document(
 ):
     """Save document metadata after upload to storage."""
     supabase = get_supabase()
-    driver = supabase.table("drivers").select("id, documents").eq(
+    driver = await run_query(supabase.table("drivers").select("id, documents").eq(
         "user_id", current_user["id"]
-    ).single().execute()
+    ).single())
 
     if not driver.data:
         raise HTTPException(status_code=404, detail="Driver profile not found")
@@ -621,12 +528,12 @@ async def upload_document(
     documents[doc_data["doc_type"]] = {
         "url": doc_data["url"],
         "status": "uploaded",
-        "uploaded_at": datetime.utcnow().isoformat(),
+        "uploaded_at": datetime.now(timezone.utc).isoformat(),
     }
 
-    supabase.table("drivers").update({
+    await run_query(supabase.table("drivers").update({
         "documents": documents,
-    }).eq("id", driver.data["id"]).execute()
+    }).eq("id", driver.data["id"]))
 
     return {"message": "Document saved", "doc_type": doc_data["doc_type"]}
 
@@ -641,9 +548,9 @@ async def get_payment_info(
 ):
     """Get driver's payment information."""
     supabase = get_supabase()
-    driver = supabase.table("drivers").select("id, payment_info").eq(
+    driver = await run_query(supabase.table("drivers").select("id, payment_info").eq(
         "user_id", current_user["id"]
-    ).single().execute()
+    ).single())
 
     if not driver.data:
         raise HTTPException(status_code=404, detail="Driver profile not found")
@@ -654,18 +561,12 @@ async def get_payment_info(
 @router.put("/payment-info")
 async def update_payment_info(
     payment_data: dict,
-    current_user: Dict = Depends(require_role(["driver"]))
+    driver_id: str = Depends(get_driver_id)
 ):
     """Update driver's payment information."""
     supabase = get_supabase()
-    driver = supabase.table("drivers").select("id").eq(
-        "user_id", current_user["id"]
-    ).single().execute()
-
-    if not driver.data:
-        raise HTTPException(status_code=404, detail="Driver profile not found")
 
-    supabase.table("drivers").update({
+    await run_query(supabase.table("drivers").update({
         "payment_info": {
             "bank_name": payment_data.get("bank_name", ""),
             "account_number": payment_data.get("account_number", ""),
@@ -673,6 +574,6 @@ async def update_payment_info(
             "account_holder_name": payment_data.get("account_holder_name", ""),
             "upi_id": payment_data.get("upi_id"),
         },
-    }).eq("id", driver.data["id"]).execute()
+    }).eq("id", driver_id))
 
     return {"message": "Payment info updated"}
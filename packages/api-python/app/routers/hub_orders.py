@@ -1,35 +1,53 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File
-from typing import List, Optional, Dict
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Query, UploadFile, File
+from fastapi.responses import JSONResponse, Response
+from typing import IO, Iterator, List, Optional, Dict, Tuple
 from datetime import datetime, date
 import csv
 import io
+import logging
+import os
+import shutil
+import tempfile
 import uuid
-
-from app.core.supabase import get_supabase
-from app.core.security import get_current_user, require_role
+from uuid import UUID
+from urllib.parse import urlencode
+import anyio
+from pydantic import TypeAdapter, ValidationError
+
+from app.core.cache import cache_get, cache_set, cache_version, cache_invalidate
+from app.core.supabase import get_supabase, run_query
+from app.core.security import get_current_user, require_role, get_user_hub_id
 from app.models.delivery_order import (
     DeliveryOrderCreate,
     DeliveryOrderUpdate,
     DeliveryOrderResponse,
+    OrderCsvRow,
     DeliveryOrderDetailResponse,
     DeliveryAttemptResponse,
     OrderImportResponse,
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/hub-orders", tags=["Hub Orders"])
 
+# Rows per bulk insert request for CSV imports
+CSV_INSERT_BATCH_SIZE = 500
 
-def get_user_hub_id(current_user: Dict) -> Optional[str]:
-    """Get the hub_id the user has access to."""
-    role = current_user.get("role")
-    if role in ("admin", "super_admin"):
-        return None  # Admin can access all hubs
-    if role == "hub_manager":
-        supabase = get_supabase()
-        hub = supabase.table("hubs").select("id").eq("manager_id", current_user["id"]).limit(1).execute()
-        if hub.data:
-            return hub.data[0]["id"]
-    return None
+# Background imports copy the upload; keep up to this much in memory
+CSV_SPOOL_MAX_SIZE = 1024 * 1024
+
+# Columns for list endpoints: just what the response models expose. The
+# import list leaves out error_log; the import detail endpoint returns it.
+ORDER_LIST_COLUMNS = ", ".join(DeliveryOrderResponse.model_fields)
+IMPORT_LIST_COLUMNS = ", ".join(f for f in OrderImportResponse.model_fields if f != "error_log")
+
+# Import lists are cached briefly and invalidated by upload_csv. The key is
+# the effective hub filter (a hub manager's own hub), never the raw query.
+IMPORTS_CACHE = "imports"
+IMPORT_LIST_CACHE_TTL = 30
+
+_import_list = TypeAdapter(List[OrderImportResponse])
 
 
 @router.post("", response_model=DeliveryOrderResponse, status_code=status.HTTP_201_CREATED)
@@ -57,6 +75,7 @@ async def create_order(
 
 @router.get("", response_model=List[DeliveryOrderResponse])
 async def list_orders(
+    response: Response,
     hub_id: Optional[str] = None,
     status_filter: Optional[str] = Query(None, alias="status"),
     source: Optional[str] = None,
@@ -66,13 +85,19 @@ async def list_orders(
     search: Optional[str] = None,
     page: int = 1,
     page_size: int = 50,
+    after_created_at: Optional[datetime] = None,
+    after_id: Optional[UUID] = None,
     current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
 ):
-    """List delivery orders with filters."""
+    """List delivery orders with filters.
+
+    Pass after_created_at/after_id (from the X-Next-Cursor header of the
+    previous page) to page by keyset instead of offset.
+    """
     supabase = get_supabase()
     role = current_user.get("role")
 
-    query = supabase.table("delivery_orders").select("*")
+    query = supabase.table("delivery_orders").select(ORDER_LIST_COLUMNS)
 
     # Hub filtering
     if role == "hub_manager":
@@ -96,13 +121,34 @@ async def list_orders(
     if route_id:
         query = query.eq("route_id", route_id)
     if search:
-        query = query.or_(
-            f"order_number.ilike.%{search}%,customer_name.ilike.%{search}%,customer_phone.ilike.%{search}%"
-        )
+        # Order number, customer name or phone, via the trigram-indexed
+        # search_text column (see migrations/022_delivery_orders_search.sql)
+        query = query.ilike("search_text", f"%{search.lower()}%")
 
     # Pagination
-    offset = (page - 1) * page_size
-    result = query.order("created_at", desc=True).range(offset, offset + page_size - 1).execute()
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if after_created_at:
+        # Keyset: rows strictly after the cursor, so deep pages cost the
+        # same as the first one. Both parts are parsed by FastAPI, so only
+        # well-formed values reach the filter string
+        cursor = after_created_at.isoformat()
+        if after_id:
+            query = query.or_(
+                f'created_at.lt."{cursor}",'
+                f'and(created_at.eq."{cursor}",id.lt.{after_id})'
+            )
+        else:
+            query = query.lt("created_at", cursor)
+        result = query.limit(page_size).execute()
+    else:
+        offset = (page - 1) * page_size
+        result = query.range(offset, offset + page_size - 1).execute()
+
+    if len(result.data) == page_size:
+        last = result.data[-1]
+        response.headers["X-Next-Cursor"] = urlencode(
+            {"after_created_at": last["created_at"], "after_id": last["id"]}
+        )
 
     return [DeliveryOrderResponse(**o) for o in result.data]
 
@@ -113,22 +159,29 @@ async def list_imports(
     current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
 ):
     """List order import batches."""
-    supabase = get_supabase()
     role = current_user.get("role")
 
-    query = supabase.table("order_imports").select("*")
-
     if role == "hub_manager":
-        user_hub_id = get_user_hub_id(current_user)
-        if user_hub_id:
-            query = query.eq("hub_id", user_hub_id)
-        else:
+        hub_id = get_user_hub_id(current_user)
+        if not hub_id:
             return []
-    elif hub_id:
+
+    version = await cache_version(IMPORTS_CACHE)
+    cache_key = f"{IMPORTS_CACHE}:v{version}:list:{hub_id or ''}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
+    supabase = get_supabase()
+
+    query = supabase.table("order_imports").select(IMPORT_LIST_COLUMNS)
+    if hub_id:
         query = query.eq("hub_id", hub_id)
 
     result = query.order("created_at", desc=True).limit(50).execute()
-    return [OrderImportResponse(**i) for i in result.data]
+    body = _import_list.dump_json(_import_list.validate_python(result.data))
+    await cache_set(cache_key, body, IMPORT_LIST_CACHE_TTL)
+    return Response(body, media_type="application/json")
 
 
 @router.get("/imports/{import_id}", response_model=OrderImportResponse)
@@ -155,42 +208,30 @@ async def get_order_detail(
     """Get order detail with attempt history."""
     supabase = get_supabase()
 
-    result = supabase.table("delivery_orders").select("*").eq("id", order_id).single().execute()
+    # Order, its attempts, route name and driver's name in one request. The
+    # !column hints pick the direct foreign keys over the many-to-many paths
+    # through route_stops/delivery_attempts.
+    result = supabase.table("delivery_orders").select(
+        "*, attempts:delivery_attempts(*), route:delivery_routes!route_id(route_name),"
+        " driver:drivers!driver_id(user:users!user_id(first_name, last_name))"
+    ).eq("id", order_id).order(
+        "attempt_number", foreign_table="attempts"
+    ).single().execute()
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    # Get delivery attempts
-    attempts = supabase.table("delivery_attempts").select("*").eq(
-        "order_id", order_id
-    ).order("attempt_number").execute()
-
-    # Get route name if assigned
-    route_name = None
-    driver_name = None
-    if result.data.get("route_id"):
-        route = supabase.table("delivery_routes").select("route_name").eq(
-            "id", result.data["route_id"]
-        ).single().execute()
-        if route.data:
-            route_name = route.data.get("route_name")
-
-    if result.data.get("driver_id"):
-        driver = supabase.table("drivers").select("user_id").eq(
-            "id", result.data["driver_id"]
-        ).single().execute()
-        if driver.data:
-            user = supabase.table("users").select("first_name, last_name").eq(
-                "id", driver.data["user_id"]
-            ).single().execute()
-            if user.data:
-                driver_name = f"{user.data['first_name']} {user.data['last_name']}"
+    order = result.data
+    attempts = order.pop("attempts", None) or []
+    route = order.pop("route", None)
+    driver = order.pop("driver", None)
+    user = driver.get("user") if driver else None
 
     return DeliveryOrderDetailResponse(
-        **result.data,
-        attempts=[DeliveryAttemptResponse(**a) for a in (attempts.data or [])],
-        route_name=route_name,
-        driver_name=driver_name,
+        **order,
+        attempts=[DeliveryAttemptResponse(**a) for a in attempts],
+        route_name=route.get("route_name") if route else None,
+        driver_name=f"{user['first_name']} {user['last_name']}" if user else None,
     )
 
 
@@ -242,10 +283,244 @@ async def cancel_order(
     return {"message": "Order cancelled", "order_id": order_id}
 
 
+# Required fields mapping (case-insensitive; aliases are kept lowercase so
+# they can be matched against lowercased headers as-is)
+CSV_FIELD_MAP = {
+    "customer_name": ["customer_name", "customer name", "name", "recipient_name", "recipient name"],
+    "customer_phone": ["customer_phone", "customer phone", "phone", "mobile", "contact"],
+    "delivery_address": ["delivery_address", "delivery address", "address", "drop_address", "drop address"],
+    "product_description": ["product_description", "product description", "product", "item", "items", "description"],
+}
+
+CSV_OPTIONAL_MAP = {
+    "customer_email": ["customer_email", "customer email", "email"],
+    "customer_alt_phone": ["customer_alt_phone", "alt_phone", "alternate phone"],
+    "delivery_city": ["delivery_city", "city"],
+    "delivery_state": ["delivery_state", "state"],
+    "delivery_postal_code": ["delivery_postal_code", "postal_code", "pincode", "zip"],
+    "seller_name": ["seller_name", "seller", "vendor"],
+    "seller_order_ref": ["seller_order_ref", "order_ref", "awb", "reference", "order_id"],
+    "marketplace": ["marketplace", "channel", "source_marketplace"],
+    "product_sku": ["product_sku", "sku"],
+    "product_category": ["product_category", "category"],
+    "package_count": ["package_count", "packages", "qty", "quantity"],
+    "total_weight_kg": ["total_weight_kg", "weight", "weight_kg"],
+    "total_volume_cft": ["total_volume_cft", "volume", "volume_cft"],
+    "is_cod": ["is_cod", "cod", "payment_mode"],
+    "cod_amount": ["cod_amount", "cod_value"],
+    "declared_value": ["declared_value", "value", "order_value"],
+    "priority": ["priority"],
+    "scheduled_date": ["scheduled_date", "delivery_date", "date"],
+    "delivery_slot": ["delivery_slot", "slot", "time_slot"],
+}
+
+
+def _csv_columns(fieldnames: Optional[List[str]]) -> Dict[str, str]:
+    """Map each known field to the CSV header that supplies it.
+
+    Headers match aliases case-insensitively; the first alias present wins.
+    Worked out once per file so rows are read with plain key lookups.
+    """
+    headers = {h.lower().strip(): h for h in (fieldnames or []) if h is not None}
+    columns = {}
+    for field_name, aliases in {**CSV_FIELD_MAP, **CSV_OPTIONAL_MAP}.items():
+        header = next((headers[alias] for alias in aliases if alias in headers), None)
+        if header is not None:
+            columns[field_name] = header
+    return columns
+
+
+def _order_numbers() -> Iterator[str]:
+    """Yield "DH-XXXXXXXX" order numbers (same format as single creates),
+    drawing randomness from os.urandom one batch at a time."""
+    while True:
+        raw = os.urandom(4 * CSV_INSERT_BATCH_SIZE).hex().upper()
+        for i in range(0, len(raw), 8):
+            yield f"DH-{raw[i:i + 8]}"
+
+
+_csv_rows = TypeAdapter(List[OrderCsvRow])
+
+
+def _csv_cells(row: dict, columns: Dict[str, str]) -> dict:
+    """Pick the known, non-blank cells of one CSV row, keyed by field name."""
+    cells = {}
+    for field_name, header in columns.items():
+        value = row.get(header)
+        if value and value.strip():
+            cells[field_name] = value.strip()
+    return cells
+
+
+def _csv_error(error: dict) -> str:
+    field_name = error["loc"][-1]
+    if error["type"] == "missing":
+        return f"Missing {field_name}"
+    return f"{field_name}: {error['msg']}"
+
+
+def _validate_csv_rows(rows: List[Tuple[int, dict]]) -> Tuple[List[Tuple[int, OrderCsvRow]], List[Dict]]:
+    """Validate a batch of (row number, cells) in one pass.
+
+    Returns the valid rows and an error per invalid one. A batch with bad
+    rows is re-validated row by row to keep the good ones.
+    """
+    try:
+        return list(zip((i for i, _ in rows), _csv_rows.validate_python([cells for _, cells in rows]))), []
+    except ValidationError as e:
+        bad = {}
+        for error in e.errors():
+            bad.setdefault(error["loc"][0], _csv_error({**error, "loc": error["loc"][1:]}))
+
+    valid = []
+    errors = []
+    for index, (i, cells) in enumerate(rows):
+        if index in bad:
+            errors.append({"row": i, "error": bad[index]})
+        else:
+            valid.append((i, OrderCsvRow.model_validate(cells)))
+    return valid, errors
+
+
+def _import_csv(supabase, stream: IO[bytes], hub_id: str, import_id: str) -> Dict:
+    """Parse a CSV upload row by row and insert valid orders in batches.
+
+    Blocking (file and network I/O); run it in a worker thread. Memory stays
+    bounded by CSV_INSERT_BATCH_SIZE rather than the file size.
+    """
+    total_records = 0
+    processed = 0
+    failed = 0
+    errors = []
+    parsed = []  # (row number, cells) awaiting validation
+    pending = []  # (row number, order_data) ready to insert
+    order_numbers = _order_numbers()
+
+    def validate():
+        nonlocal failed
+        valid, row_errors = _validate_csv_rows(parsed)
+        failed += len(row_errors)
+        errors.extend(row_errors)
+        pending.extend(
+            (i, {
+                "hub_id": hub_id,
+                "order_number": next(order_numbers),
+                "source": "csv",
+                "import_batch_id": import_id,
+                **order.model_dump(exclude_unset=True),
+            })
+            for i, order in valid
+        )
+        parsed.clear()
+
+    def flush():
+        # One RPC per batch; rows that fail are isolated server-side and
+        # reported back by position (see migrations/023_bulk_import_orders.sql)
+        nonlocal processed, failed
+        try:
+            row_errors = supabase.rpc("bulk_import_orders", {
+                "p_rows": [order_data for _, order_data in pending],
+            }).execute().data or []
+        except Exception as e:
+            failed += len(pending)
+            errors.extend({"row": i, "error": str(e)} for i, _ in pending)
+        else:
+            failed += len(row_errors)
+            processed += len(pending) - len(row_errors)
+            errors.extend({"row": pending[e["index"]][0], "error": e["error"]} for e in row_errors)
+        pending.clear()
+
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        reader = csv.DictReader(text)
+        columns = _csv_columns(reader.fieldnames)
+        for i, row in enumerate(reader, 1):
+            total_records = i
+            parsed.append((i, _csv_cells(row, columns)))
+
+            if len(parsed) >= CSV_INSERT_BATCH_SIZE:
+                validate()
+                if pending:
+                    flush()
+
+        if parsed:
+            validate()
+        if pending:
+            flush()
+    finally:
+        # Leave the upload's file open for Starlette to clean up
+        text.detach()
+
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "total_records": total_records,
+        "processed": processed,
+        "failed": failed,
+        "errors": errors,
+    }
+
+
+async def _fail_import(supabase, import_id: str, error: str) -> None:
+    """Mark an import failed with a file-level error."""
+    await run_query(supabase.table("order_imports").update({
+        "status": "failed",
+        "error_log": [{"row": None, "error": error}],
+        "completed_at": datetime.utcnow().isoformat(),
+    }).eq("id", import_id))
+    await cache_invalidate(IMPORTS_CACHE)
+
+
+async def _run_csv_import(supabase, stream: IO[bytes], hub_id: str, import_id: str) -> Dict:
+    """Import a CSV stream and record the outcome on its order_imports row.
+
+    Returns the import result. Any failure marks the import failed before
+    propagating, so it never stays "processing"; a file that isn't valid
+    UTF-8 CSV raises a 400.
+    """
+    try:
+        result = await anyio.to_thread.run_sync(_import_csv, supabase, stream, hub_id, import_id)
+
+        processed = result["processed"]
+        failed = result["failed"]
+        errors = result["errors"]
+
+        await run_query(supabase.table("order_imports").update({
+            "total_records": result["total_records"],
+            "processed": processed,
+            "failed": failed,
+            "error_log": errors if errors else None,
+            "status": "completed" if failed == 0 else ("completed" if processed > 0 else "failed"),
+            "completed_at": datetime.utcnow().isoformat(),
+        }).eq("id", import_id))
+        await cache_invalidate(IMPORTS_CACHE)
+    except UnicodeDecodeError:
+        await _fail_import(supabase, import_id, "File is not valid UTF-8")
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    except csv.Error as e:
+        await _fail_import(supabase, import_id, f"Malformed CSV: {e}")
+        raise HTTPException(status_code=400, detail=f"Malformed CSV: {e}")
+    except Exception as e:
+        await _fail_import(supabase, import_id, f"Import failed: {e}")
+        raise
+    return result
+
+
+async def _run_csv_import_in_background(supabase, stream: IO[bytes], hub_id: str, import_id: str) -> None:
+    try:
+        await _run_csv_import(supabase, stream, hub_id, import_id)
+    except Exception:
+        # Already recorded on the import row; nobody is waiting on a response
+        logger.exception(f"CSV import {import_id} failed")
+    finally:
+        stream.close()
+
+
 @router.post("/upload-csv")
 async def upload_csv(
+    background_tasks: BackgroundTasks,
     hub_id: str = Query(...),
     file: UploadFile = File(...),
+    background: bool = Query(False, description="Return immediately and import in the background; poll /imports/{import_id}"),
     current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
 ):
     """Upload CSV to bulk create delivery orders."""
@@ -254,10 +529,6 @@ async def upload_csv(
     if not file.filename or not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="File must be a CSV")
 
-    # Read file content
-    content = await file.read()
-    text = content.decode("utf-8")
-
     # Create import record
     import_record = supabase.table("order_imports").insert({
         "hub_id": hub_id,
@@ -268,116 +539,27 @@ async def upload_csv(
     }).execute()
 
     import_id = import_record.data[0]["id"]
+    await cache_invalidate(IMPORTS_CACHE)
+
+    if background:
+        # The upload is closed once the response is sent, so hand the task
+        # its own copy
+        stream = tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_MAX_SIZE)
+        await anyio.to_thread.run_sync(shutil.copyfileobj, file.file, stream)
+        stream.seek(0)
+        background_tasks.add_task(_run_csv_import_in_background, supabase, stream, hub_id, import_id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"import_id": import_id, "status": "processing"},
+        )
 
-    # Parse CSV
-    reader = csv.DictReader(io.StringIO(text))
-    rows = list(reader)
-    total_records = len(rows)
-    processed = 0
-    failed = 0
-    errors = []
-
-    # Required fields mapping (case-insensitive)
-    field_map = {
-        "customer_name": ["customer_name", "customer name", "name", "recipient_name", "recipient name"],
-        "customer_phone": ["customer_phone", "customer phone", "phone", "mobile", "contact"],
-        "delivery_address": ["delivery_address", "delivery address", "address", "drop_address", "drop address"],
-        "product_description": ["product_description", "product description", "product", "item", "items", "description"],
-    }
-
-    optional_map = {
-        "customer_email": ["customer_email", "customer email", "email"],
-        "customer_alt_phone": ["customer_alt_phone", "alt_phone", "alternate phone"],
-        "delivery_city": ["delivery_city", "city"],
-        "delivery_state": ["delivery_state", "state"],
-        "delivery_postal_code": ["delivery_postal_code", "postal_code", "pincode", "zip"],
-        "seller_name": ["seller_name", "seller", "vendor"],
-        "seller_order_ref": ["seller_order_ref", "order_ref", "awb", "reference", "order_id"],
-        "marketplace": ["marketplace", "channel", "source_marketplace"],
-        "product_sku": ["product_sku", "sku"],
-        "product_category": ["product_category", "category"],
-        "package_count": ["package_count", "packages", "qty", "quantity"],
-        "total_weight_kg": ["total_weight_kg", "weight", "weight_kg"],
-        "total_volume_cft": ["total_volume_cft", "volume", "volume_cft"],
-        "is_cod": ["is_cod", "cod", "payment_mode"],
-        "cod_amount": ["cod_amount", "cod_value"],
-        "declared_value": ["declared_value", "value", "order_value"],
-        "priority": ["priority"],
-        "scheduled_date": ["scheduled_date", "delivery_date", "date"],
-        "delivery_slot": ["delivery_slot", "slot", "time_slot"],
-    }
-
-    def find_field(row: dict, aliases: list) -> Optional[str]:
-        """Find a field value from row using multiple possible column names."""
-        row_lower = {k.lower().strip(): v for k, v in row.items()}
-        for alias in aliases:
-            if alias.lower() in row_lower:
-                return row_lower[alias.lower()]
-        return None
-
-    for i, row in enumerate(rows, 1):
-        try:
-            # Extract required fields
-            customer_name = find_field(row, field_map["customer_name"])
-            customer_phone = find_field(row, field_map["customer_phone"])
-            delivery_address = find_field(row, field_map["delivery_address"])
-            product_description = find_field(row, field_map["product_description"])
-
-            if not customer_name:
-                raise ValueError("Missing customer_name")
-            if not customer_phone:
-                raise ValueError("Missing customer_phone")
-            if not delivery_address:
-                raise ValueError("Missing delivery_address")
-            if not product_description:
-                raise ValueError("Missing product_description")
-
-            order_data = {
-                "hub_id": hub_id,
-                "order_number": f"DH-{uuid.uuid4().hex[:8].upper()}",
-                "source": "csv",
-                "import_batch_id": import_id,
-                "customer_name": customer_name.strip(),
-                "customer_phone": customer_phone.strip(),
-                "delivery_address": delivery_address.strip(),
-                "product_description": product_description.strip(),
-            }
-
-            # Extract optional fields
-            for field_name, aliases in optional_map.items():
-                value = find_field(row, aliases)
-                if value and value.strip():
-                    value = value.strip()
-                    if field_name == "is_cod":
-                        order_data[field_name] = value.lower() in ("true", "yes", "1", "cod")
-                    elif field_name in ("package_count",):
-                        order_data[field_name] = int(value)
-                    elif field_name in ("total_weight_kg", "total_volume_cft", "cod_amount", "declared_value"):
-                        order_data[field_name] = float(value)
-                    else:
-                        order_data[field_name] = value
-
-            supabase.table("delivery_orders").insert(order_data).execute()
-            processed += 1
-
-        except Exception as e:
-            failed += 1
-            errors.append({"row": i, "error": str(e)})
-
-    # Update import record
-    supabase.table("order_imports").update({
-        "total_records": total_records,
-        "processed": processed,
-        "failed": failed,
-        "error_log": errors if errors else None,
-        "status": "completed" if failed == 0 else ("completed" if processed > 0 else "failed"),
-        "completed_at": datetime.utcnow().isoformat(),
-    }).eq("id", import_id).execute()
+    # Parse and insert straight from the spooled upload, off the event loop
+    result = await _run_csv_import(supabase, file.file, hub_id, import_id)
 
     return {
         "import_id": import_id,
-        "total_records": total_records,
-        "processed": processed,
-        "failed": failed,
-        "errors": errors[:20],  # Return first 20 errors
+        "total_records": result["total_records"],
+        "processed": result["processed"],
+        "failed": result["failed"],
+        "errors": result["errors"][:20],  # Return first 20 errors
     }
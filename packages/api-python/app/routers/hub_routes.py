@@ -1,10 +1,15 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import List, Optional, Dict
 from datetime import datetime, date
+import asyncio
 import uuid
 import math
+from fastapi.responses import Response
+from postgrest import ReturnMethod
+from pydantic import TypeAdapter
 
-from app.core.supabase import get_supabase
+from app.core.cache import cache_get, cache_set, cache_version, cache_invalidate
+from app.core.supabase import get_supabase, run_query
 from app.core.security import get_current_user, require_role
 from app.services.notifications import notify_route_assigned, notify_route_dispatched
 from app.services import cjdquick as cjdquick_svc
@@ -15,7 +20,6 @@ from app.models.hub import (
     RouteResponse,
     RouteDetailResponse,
     RouteStopResponse,
-    DeliveryOrderBrief,
     AutoPlanRequest,
     AutoPlanResponse,
     VehicleResponse,
@@ -23,6 +27,17 @@ from app.models.hub import (
 
 router = APIRouter(prefix="/routes", tags=["Routes"])
 
+# Columns for the route list: just what RouteResponse exposes
+ROUTE_LIST_COLUMNS = ", ".join(RouteResponse.model_fields)
+
+# Route lists are cached briefly; every route write below invalidates them.
+# Results depend only on the query filters (access is by role), so those
+# make up the key.
+ROUTES_CACHE = "routes"
+ROUTE_LIST_CACHE_TTL = 30
+
+_route_list = TypeAdapter(List[RouteResponse])
+
 
 @router.post("", response_model=RouteResponse, status_code=status.HTTP_201_CREATED)
 async def create_route(
@@ -54,13 +69,12 @@ async def create_route(
 
     route_id = result.data[0]["id"]
 
-    # Create route stops
-    for seq, order_id in enumerate(route_data.order_ids, 1):
-        supabase.table("route_stops").insert({
-            "route_id": route_id,
-            "order_id": order_id,
-            "sequence": seq,
-        }).execute()
+    if route_data.order_ids:
+        # Create route stops
+        supabase.table("route_stops").insert([
+            {"route_id": route_id, "order_id": order_id, "sequence": seq}
+            for seq, order_id in enumerate(route_data.order_ids, 1)
+        ], returning=ReturnMethod.minimal).execute()
 
         # Update order assignment
         supabase.table("delivery_orders").update({
@@ -68,8 +82,9 @@ async def create_route(
             "driver_id": route_data.driver_id,
             "status": "assigned" if route_data.driver_id else "pending",
             "assigned_at": datetime.utcnow().isoformat() if route_data.driver_id else None,
-        }).eq("id", order_id).execute()
+        }).in_("id", route_data.order_ids).execute()
 
+    await cache_invalidate(ROUTES_CACHE)
     return RouteResponse(**result.data[0])
 
 
@@ -81,9 +96,15 @@ async def list_routes(
     current_user: Dict = Depends(require_role(["admin", "super_admin", "hub_manager"]))
 ):
     """List routes with filters."""
+    version = await cache_version(ROUTES_CACHE)
+    cache_key = f"{ROUTES_CACHE}:v{version}:list:{hub_id or ''}:{route_date or ''}:{status_filter or ''}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
     supabase = get_supabase()
 
-    query = supabase.table("delivery_routes").select("*")
+    query = supabase.table("delivery_routes").select(ROUTE_LIST_COLUMNS)
 
     if hub_id:
         query = query.eq("hub_id", hub_id)
@@ -93,7 +114,9 @@ async def list_routes(
         query = query.eq("status", status_filter)
 
     result = query.order("created_at", desc=True).execute()
-    return [RouteResponse(**r) for r in result.data]
+    body = _route_list.dump_json(_route_list.validate_python(result.data))
+    await cache_set(cache_key, body, ROUTE_LIST_CACHE_TTL)
+    return Response(body, media_type="application/json")
 
 
 @router.get("/{route_id}", response_model=RouteDetailResponse)
@@ -104,50 +127,33 @@ async def get_route_detail(
     """Get route detail with stops."""
     supabase = get_supabase()
 
-    result = supabase.table("delivery_routes").select("*").eq("id", route_id).single().execute()
+    # The route (with its vehicle and driver's name embedded) and its stops
+    # (with their orders embedded) are independent, so fetch them
+    # concurrently. The !column hints pick the direct foreign keys over the
+    # many-to-many paths through delivery_orders.
+    result, stops_result = await asyncio.gather(
+        run_query(supabase.table("delivery_routes").select(
+            "*, vehicle:hub_vehicles!vehicle_id(*),"
+            " driver:drivers!driver_id(user:users!user_id(first_name, last_name))"
+        ).eq("id", route_id).limit(1)),
+        run_query(supabase.table("route_stops").select(
+            "*, order:delivery_orders(id, order_number, customer_name, customer_phone,"
+            " delivery_address, product_description, status, is_cod, cod_amount)"
+        ).eq("route_id", route_id).order("sequence")),
+    )
     if not result.data:
         raise HTTPException(status_code=404, detail="Route not found")
 
-    # Get stops with order details
-    stops_result = supabase.table("route_stops").select("*").eq(
-        "route_id", route_id
-    ).order("sequence").execute()
-
-    stops = []
-    for stop in (stops_result.data or []):
-        order = supabase.table("delivery_orders").select(
-            "id, order_number, customer_name, customer_phone, delivery_address, product_description, status, is_cod, cod_amount"
-        ).eq("id", stop["order_id"]).single().execute()
-
-        stop_data = RouteStopResponse(
-            **stop,
-            order=DeliveryOrderBrief(**order.data) if order.data else None,
-        )
-        stops.append(stop_data)
-
-    # Get vehicle info
-    vehicle = None
-    if result.data.get("vehicle_id"):
-        v = supabase.table("hub_vehicles").select("*").eq("id", result.data["vehicle_id"]).single().execute()
-        if v.data:
-            vehicle = VehicleResponse(**v.data)
-
-    # Get driver name
-    driver_name = None
-    if result.data.get("driver_id"):
-        driver = supabase.table("drivers").select("user_id").eq("id", result.data["driver_id"]).single().execute()
-        if driver.data:
-            user = supabase.table("users").select("first_name, last_name").eq(
-                "id", driver.data["user_id"]
-            ).single().execute()
-            if user.data:
-                driver_name = f"{user.data['first_name']} {user.data['last_name']}"
+    route = result.data[0]
+    vehicle = route.pop("vehicle", None)
+    driver = route.pop("driver", None)
+    user = driver.get("user") if driver else None
 
     return RouteDetailResponse(
-        **result.data,
-        stops=stops,
-        vehicle=vehicle,
-        driver_name=driver_name,
+        **route,
+        stops=[RouteStopResponse(**stop) for stop in (stops_result.data or [])],
+        vehicle=VehicleResponse(**vehicle) if vehicle else None,
+        driver_name=f"{user['first_name']} {user['last_name']}" if user else None,
     )
 
 
@@ -171,6 +177,7 @@ async def update_route(
     if not result.data:
         raise HTTPException(status_code=404, detail="Route not found")
 
+    await cache_invalidate(ROUTES_CACHE)
     return RouteResponse(**result.data[0])
 
 
@@ -182,17 +189,13 @@ async def delete_route(
     """Delete a route and unassign orders."""
     supabase = get_supabase()
 
-    # Get orders assigned to this route
-    orders = supabase.table("delivery_orders").select("id").eq("route_id", route_id).execute()
-
     # Unassign orders
-    for order in (orders.data or []):
-        supabase.table("delivery_orders").update({
-            "route_id": None,
-            "driver_id": None,
-            "status": "pending",
-            "assigned_at": None,
-        }).eq("id", order["id"]).execute()
+    supabase.table("delivery_orders").update({
+        "route_id": None,
+        "driver_id": None,
+        "status": "pending",
+        "assigned_at": None,
+    }, returning=ReturnMethod.minimal).eq("route_id", route_id).execute()
 
     # Delete stops (cascade)
     supabase.table("route_stops").delete().eq("route_id", route_id).execute()
@@ -200,6 +203,7 @@ async def delete_route(
     # Delete route
     supabase.table("delivery_routes").delete().eq("id", route_id).execute()
 
+    await cache_invalidate(ROUTES_CACHE)
     return {"message": "Route deleted", "route_id": route_id}
 
 
@@ -222,13 +226,11 @@ async def assign_route(
         raise HTTPException(status_code=404, detail="Route not found")
 
     # Update all orders on this route
-    orders = supabase.table("delivery_orders").select("id").eq("route_id", route_id).execute()
-    for order in (orders.data or []):
-        supabase.table("delivery_orders").update({
-            "driver_id": assign_data.driver_id,
-            "status": "assigned",
-            "assigned_at": datetime.utcnow().isoformat(),
-        }).eq("id", order["id"]).execute()
+    supabase.table("delivery_orders").update({
+        "driver_id": assign_data.driver_id,
+        "status": "assigned",
+        "assigned_at": datetime.utcnow().isoformat(),
+    }, returning=ReturnMethod.minimal).eq("route_id", route_id).execute()
 
     # Update vehicle status
     supabase.table("hub_vehicles").update({
@@ -247,6 +249,7 @@ async def assign_route(
     except Exception:
         pass  # Don't fail route assignment if notification fails
 
+    await cache_invalidate(ROUTES_CACHE)
     return RouteResponse(**result.data[0])
 
 
@@ -270,17 +273,16 @@ async def dispatch_route(
         "start_time": datetime.utcnow().isoformat(),
     }).eq("id", route_id).execute()
 
-    # Update all orders to out_for_delivery
-    orders = supabase.table("delivery_orders").select(
+    # Update all orders to out_for_delivery, returning what the CJDQuick
+    # sync needs
+    orders = supabase.table("delivery_orders").update({
+        "status": "out_for_delivery",
+        "out_for_delivery_at": datetime.utcnow().isoformat(),
+    }).eq("route_id", route_id).select(
         "id, external_order_id, external_source"
-    ).eq("route_id", route_id).execute()
+    ).execute()
     route_name = result.data[0].get("route_name") or "LMA-Route"
     for order in (orders.data or []):
-        supabase.table("delivery_orders").update({
-            "status": "out_for_delivery",
-            "out_for_delivery_at": datetime.utcnow().isoformat(),
-        }).eq("id", order["id"]).execute()
-
         # Notify CJDQuick that order is shipped
         try:
             if order.get("external_source") == "cjdquick" and order.get("external_order_id"):
@@ -305,6 +307,7 @@ async def dispatch_route(
     except Exception:
         pass  # Don't fail dispatch if notification fails
 
+    await cache_invalidate(ROUTES_CACHE)
     return RouteResponse(**result.data[0])
 
 
@@ -316,10 +319,10 @@ async def auto_plan_routes(
     """Auto-generate routes grouping orders by area and vehicle capacity."""
     supabase = get_supabase()
 
-    # Get unassigned orders for the date
-    orders_query = supabase.table("delivery_orders").select("*").eq(
-        "hub_id", plan_data.hub_id
-    ).eq("status", "pending").is_("route_id", "null")
+    # Get unassigned orders for the date; planning only needs weight and area
+    orders_query = supabase.table("delivery_orders").select(
+        "id, total_weight_kg, delivery_postal_code, delivery_city"
+    ).eq("hub_id", plan_data.hub_id).eq("status", "pending").is_("route_id", "null")
 
     if plan_data.route_date:
         orders_query = orders_query.eq("scheduled_date", plan_data.route_date.isoformat())
@@ -345,19 +348,21 @@ async def auto_plan_routes(
     if not vehicles:
         raise HTTPException(status_code=400, detail="No available vehicles at this hub")
 
-    # Get hub location for reference
-    hub = supabase.table("hubs").select("code, latitude, longitude").eq(
+    # Get hub code for route names
+    hub = supabase.table("hubs").select("code").eq(
         "id", plan_data.hub_id
     ).single().execute()
     hub_code = hub.data["code"] if hub.data else "HUB"
+    route_date = plan_data.route_date.isoformat()
+    date_str = plan_data.route_date.strftime("%Y%m%d")
 
     # Simple route planning: distribute orders across vehicles by capacity
     routes_created = []
     assigned_count = 0
-    remaining_orders = list(orders)
 
-    # Sort orders by postal code for geographic grouping
-    remaining_orders.sort(key=lambda o: (o.get("delivery_postal_code") or "", o.get("delivery_city") or ""))
+    # Sort orders by postal code for geographic grouping, weighing each once
+    orders.sort(key=lambda o: (o.get("delivery_postal_code") or "", o.get("delivery_city") or ""))
+    remaining_orders = [(order, order.get("total_weight_kg") or 0) for order in orders]
 
     for vehicle in vehicles:
         if not remaining_orders:
@@ -367,15 +372,18 @@ async def auto_plan_routes(
         current_weight = 0.0
         route_orders = []
 
-        # Fill vehicle up to capacity
+        # Fill vehicle up to capacity; once it has 30 stops the rest carry
+        # over untouched
         still_remaining = []
-        for order in remaining_orders:
-            order_weight = order.get("total_weight_kg") or 0
-            if current_weight + order_weight <= capacity_kg and len(route_orders) < 30:
+        for i, (order, order_weight) in enumerate(remaining_orders):
+            if len(route_orders) == 30:
+                still_remaining.extend(remaining_orders[i:])
+                break
+            if current_weight + order_weight <= capacity_kg:
                 route_orders.append(order)
                 current_weight += order_weight
             else:
-                still_remaining.append(order)
+                still_remaining.append((order, order_weight))
 
         remaining_orders = still_remaining
 
@@ -383,12 +391,12 @@ async def auto_plan_routes(
             continue
 
         # Create route
-        route_name = f"{hub_code}-R{len(routes_created)+1}-{plan_data.route_date.strftime('%Y%m%d')}"
+        route_name = f"{hub_code}-R{len(routes_created)+1}-{date_str}"
         route_result = supabase.table("delivery_routes").insert({
             "hub_id": plan_data.hub_id,
             "route_name": route_name,
             "vehicle_id": vehicle["id"],
-            "route_date": plan_data.route_date.isoformat(),
+            "route_date": route_date,
             "status": "planned",
             "total_stops": len(route_orders),
             "total_weight_kg": current_weight,
@@ -398,20 +406,19 @@ async def auto_plan_routes(
         route_id = route_result.data[0]["id"]
 
         # Create stops
-        for seq, order in enumerate(route_orders, 1):
-            supabase.table("route_stops").insert({
-                "route_id": route_id,
-                "order_id": order["id"],
-                "sequence": seq,
-            }).execute()
+        supabase.table("route_stops").insert([
+            {"route_id": route_id, "order_id": order["id"], "sequence": seq}
+            for seq, order in enumerate(route_orders, 1)
+        ], returning=ReturnMethod.minimal).execute()
 
-            supabase.table("delivery_orders").update({
-                "route_id": route_id,
-            }).eq("id", order["id"]).execute()
+        supabase.table("delivery_orders").update({
+            "route_id": route_id,
+        }).in_("id", [order["id"] for order in route_orders]).execute()
 
         assigned_count += len(route_orders)
         routes_created.append(RouteResponse(**route_result.data[0]))
 
+    await cache_invalidate(ROUTES_CACHE)
     return AutoPlanResponse(
         routes_created=len(routes_created),
         total_orders_assigned=assigned_count,
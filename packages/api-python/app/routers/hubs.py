@@ -1,8 +1,11 @@
 from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import Response
 from typing import List, Optional, Dict
 from datetime import datetime, date
+import asyncio
+from pydantic import TypeAdapter
 
-from app.core.supabase import get_supabase
+from app.core.supabase import get_supabase, run_query
 from app.core.security import get_current_user, require_role
 from app.models.hub import (
     HubCreate,
@@ -13,6 +16,8 @@ from app.models.hub import (
 
 router = APIRouter(prefix="/hubs", tags=["Hubs"])
 
+_hub_list = TypeAdapter(List[HubResponse])
+
 
 @router.post("", response_model=HubResponse, status_code=status.HTTP_201_CREATED)
 async def create_hub(
@@ -23,12 +28,12 @@ async def create_hub(
     supabase = get_supabase()
 
     # Check for duplicate code
-    existing = supabase.table("hubs").select("id").eq("code", hub_data.code).execute()
-    if existing.data:
+    existing = await run_query(supabase.table("hubs").select("id", count="exact", head=True).eq("code", hub_data.code))
+    if existing.count:
         raise HTTPException(status_code=400, detail="Hub code already exists")
 
     hub = hub_data.model_dump()
-    result = supabase.table("hubs").insert(hub).execute()
+    result = await run_query(supabase.table("hubs").insert(hub))
 
     if not result.data:
         raise HTTPException(status_code=500, detail="Failed to create hub")
@@ -56,8 +61,8 @@ async def list_hubs(
     if is_active is not None:
         query = query.eq("is_active", is_active)
 
-    result = query.order("created_at", desc=True).execute()
-    return [HubResponse(**h) for h in result.data]
+    result = await run_query(query.order("created_at", desc=True))
+    return Response(_hub_list.dump_json(_hub_list.validate_python(result.data)), media_type="application/json")
 
 
 @router.get("/{hub_id}", response_model=HubResponse)
@@ -69,19 +74,20 @@ async def get_hub(
     supabase = get_supabase()
     role = current_user.get("role", "customer")
 
-    result = supabase.table("hubs").select("*").eq("id", hub_id).single().execute()
+    result = await run_query(supabase.table("hubs").select("*").eq("id", hub_id).limit(1))
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Hub not found")
+    hub = result.data[0]
 
     # Hub managers can only see their own hub
-    if role == "hub_manager" and result.data.get("manager_id") != current_user["id"]:
+    if role == "hub_manager" and hub.get("manager_id") != current_user["id"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
     if role not in ("hub_manager", "admin", "super_admin", "driver"):
         raise HTTPException(status_code=403, detail="Insufficient permissions")
 
-    return HubResponse(**result.data)
+    return HubResponse(**hub)
 
 
 @router.patch("/{hub_id}", response_model=HubResponse)
@@ -96,15 +102,15 @@ async def update_hub(
 
     # Hub managers can only update their own hub
     if role == "hub_manager":
-        existing = supabase.table("hubs").select("manager_id").eq("id", hub_id).single().execute()
-        if not existing.data or existing.data.get("manager_id") != current_user["id"]:
+        existing = await run_query(supabase.table("hubs").select("manager_id").eq("id", hub_id).limit(1))
+        if not existing.data or existing.data[0].get("manager_id") != current_user["id"]:
             raise HTTPException(status_code=403, detail="Access denied")
 
     update_data = hub_data.model_dump(exclude_unset=True)
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    result = supabase.table("hubs").update(update_data).eq("id", hub_id).execute()
+    result = await run_query(supabase.table("hubs").update(update_data).eq("id", hub_id))
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Hub not found")
@@ -121,36 +127,35 @@ async def get_hub_stats(
     supabase = get_supabase()
     today = date.today().isoformat()
 
-    # Total orders today
-    all_orders = supabase.table("delivery_orders").select("status").eq(
-        "hub_id", hub_id
-    ).gte("created_at", today + "T00:00:00").execute()
+    # Per-status counts are grouped in Postgres
+    # (see migrations/016_hub_dashboard_stats.sql); drivers and routes are
+    # count-only queries
+    buckets, active_drivers, active_routes = await asyncio.gather(
+        run_query(supabase.rpc("hub_dashboard_stats", {
+            "p_hub_id": hub_id,
+            "p_since": today + "T00:00:00",
+        })),
+        run_query(supabase.table("drivers").select("id", count="exact", head=True).eq(
+            "hub_id", hub_id
+        ).in_("status", ["online", "on_delivery"])),
+        run_query(supabase.table("delivery_routes").select("id", count="exact", head=True).eq(
+            "hub_id", hub_id
+        ).eq("route_date", today).in_("status", ["assigned", "in_progress"])),
+    )
 
-    total = len(all_orders.data) if all_orders.data else 0
-    pending = sum(1 for o in (all_orders.data or []) if o["status"] == "pending")
-    out_for_delivery = sum(1 for o in (all_orders.data or []) if o["status"] == "out_for_delivery")
-    delivered = sum(1 for o in (all_orders.data or []) if o["status"] == "delivered")
-    failed = sum(1 for o in (all_orders.data or []) if o["status"] == "failed")
+    counts = {row["status"]: row["cnt"] for row in buckets.data or []}
+    total = sum(counts.values())
+    delivered = counts.get("delivered", 0)
 
     completion_rate = (delivered / total * 100) if total > 0 else 0
 
-    # Active drivers
-    active_drivers = supabase.table("drivers").select("id").eq(
-        "hub_id", hub_id
-    ).in_("status", ["online", "on_delivery"]).execute()
-
-    # Active routes
-    active_routes = supabase.table("delivery_routes").select("id").eq(
-        "hub_id", hub_id
-    ).eq("route_date", today).in_("status", ["assigned", "in_progress"]).execute()
-
     return HubStats(
         total_orders_today=total,
-        pending_orders=pending,
-        out_for_delivery=out_for_delivery,
+        pending_orders=counts.get("pending", 0),
+        out_for_delivery=counts.get("out_for_delivery", 0),
         delivered_today=delivered,
-        failed_today=failed,
+        failed_today=counts.get("failed", 0),
         completion_rate=round(completion_rate, 1),
-        active_drivers=len(active_drivers.data) if active_drivers.data else 0,
-        active_routes=len(active_routes.data) if active_routes.data else 0,
+        active_drivers=active_drivers.count or 0,
+        active_routes=active_routes.count or 0,
     )
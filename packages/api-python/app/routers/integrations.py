@@ -291,12 +291,12 @@ async def manual_sync(
         # Duplicate check
         existing = (
             supabase.table("delivery_orders")
-            .select("id")
+            .select("id", count="exact", head=True)
             .eq("external_order_id", external_id)
             .eq("external_source", "cjdquick")
             .execute()
         )
-        if existing.data:
+        if existing.count:
             skipped += 1
             continue
 
@@ -1,8 +1,17 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import Response
 from typing import List, Optional, Dict
+from datetime import datetime
+from uuid import UUID
+from cachetools import TTLCache
+from postgrest.exceptions import APIError
+from pydantic import TypeAdapter
+import asyncio
 import re
+from urllib.parse import urlencode
 
-from app.core.supabase import get_supabase
+from app.core.cache import cache_get, cache_set, cache_version, cache_invalidate
+from app.core.supabase import get_supabase, run_query
 from app.core.security import get_current_user, require_role
 from app.models.merchant import (
     MerchantCreate,
@@ -17,14 +26,44 @@ from app.models.merchant import (
 
 router = APIRouter(prefix="/merchants", tags=["Merchants"])
 
+# merchants.id -> owning users.id, for ownership checks on merchant writes
+_merchant_owner_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# Public merchant reads are cached briefly; merchant writes invalidate them
+MERCHANTS_CACHE = "merchants"
+MERCHANT_CACHE_TTL = 60
+
+_merchant_list = TypeAdapter(List[MerchantResponse])
+_product_list = TypeAdapter(List[ProductResponse])
+_category_list = TypeAdapter(List[ProductCategoryResponse])
+
+
+_SLUG_INVALID = re.compile(r'[^a-z0-9\s-]')
+_SLUG_SEPARATORS = re.compile(r'[\s-]+')
+
 
 def generate_slug(name: str) -> str:
     """Generate a URL-friendly slug from a name."""
-    slug = name.lower()
-    slug = re.sub(r'[^a-z0-9\s-]', '', slug)
-    slug = re.sub(r'[\s_]+', '-', slug)
-    slug = re.sub(r'-+', '-', slug)
-    return slug.strip('-')
+    slug = _SLUG_INVALID.sub('', name.lower())
+    return _SLUG_SEPARATORS.sub('-', slug).strip('-')
+
+
+async def verify_merchant_owner(
+    merchant_id: str,
+    current_user: Dict = Depends(get_current_user)
+) -> Dict:
+    """Require the current user to own the merchant (or be an admin)."""
+    owner_id = _merchant_owner_cache.get(merchant_id)
+    if owner_id is None:
+        supabase = get_supabase()
+        merchant = await run_query(supabase.table("merchants").select("user_id").eq("id", merchant_id).limit(1))
+        if not merchant.data:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Merchant not found")
+        owner_id = _merchant_owner_cache[merchant_id] = merchant.data[0]["user_id"]
+
+    if owner_id != current_user["id"] and current_user.get("role") not in ["admin", "super_admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return current_user
 
 
 @router.get("/", response_model=List[MerchantResponse])
@@ -35,8 +74,25 @@ async def list_merchants(
     search: Optional[str] = None,
     limit: int = Query(default=20, le=100),
     offset: int = 0,
+    after_created_at: Optional[datetime] = None,
+    after_id: Optional[UUID] = None,
 ):
-    """List all active merchants with optional filters."""
+    """List all active merchants with optional filters.
+
+    Pass after_created_at/after_id (from the X-Next-Cursor header of the
+    previous page) to page by keyset instead of offset.
+    """
+    version = await cache_version(MERCHANTS_CACHE)
+    cache_key = (
+        f"{MERCHANTS_CACHE}:v{version}:list:{city or ''}:{merchant_type or ''}:"
+        f"{'' if is_featured is None else is_featured}:{search or ''}:{limit}:{offset}:"
+        f"{after_created_at.isoformat() if after_created_at else ''}:{after_id or ''}"
+    )
+    cached, next_cursor = await asyncio.gather(cache_get(cache_key), cache_get(f"{cache_key}:next"))
+    if cached is not None:
+        headers = {"X-Next-Cursor": next_cursor.decode()} if next_cursor else None
+        return Response(cached, media_type="application/json", headers=headers)
+
     supabase = get_supabase()
 
     query = supabase.table("merchants").select("*").eq("status", "active")
@@ -50,10 +106,34 @@ async def list_merchants(
     if search:
         query = query.ilike("business_name", f"%{search}%")
 
-    query = query.range(offset, offset + limit - 1).order("created_at", desc=True)
-
-    result = query.execute()
-    return [MerchantResponse(**m) for m in result.data]
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if after_created_at:
+        # Keyset: rows strictly after the cursor, so deep pages cost the
+        # same as the first one. Both parts are parsed by FastAPI, so only
+        # well-formed values reach the filter string
+        cursor = after_created_at.isoformat()
+        if after_id:
+            query = query.or_(
+                f'created_at.lt."{cursor}",'
+                f'and(created_at.eq."{cursor}",id.lt.{after_id})'
+            )
+        else:
+            query = query.lt("created_at", cursor)
+        query = query.limit(limit)
+    else:
+        query = query.range(offset, offset + limit - 1)
+
+    result = await run_query(query)
+    body = _merchant_list.dump_json(_merchant_list.validate_python(result.data))
+    await cache_set(cache_key, body, MERCHANT_CACHE_TTL)
+
+    headers = None
+    if len(result.data) == limit:
+        last = result.data[-1]
+        next_cursor = urlencode({"after_created_at": last["created_at"], "after_id": last["id"]})
+        await cache_set(f"{cache_key}:next", next_cursor.encode(), MERCHANT_CACHE_TTL)
+        headers = {"X-Next-Cursor": next_cursor}
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/{merchant_id}", response_model=MerchantResponse)
@@ -61,7 +141,7 @@ async def get_merchant(merchant_id: str):
     """Get a specific merchant by ID."""
     supabase = get_supabase()
 
-    result = supabase.table("merchants").select("*").eq("id", merchant_id).single().execute()
+    result = await run_query(supabase.table("merchants").select("*").eq("id", merchant_id).limit(1))
 
     if not result.data:
         raise HTTPException(
@@ -69,15 +149,21 @@ async def get_merchant(merchant_id: str):
             detail="Merchant not found"
         )
 
-    return MerchantResponse(**result.data)
+    return MerchantResponse(**result.data[0])
 
 
 @router.get("/slug/{slug}", response_model=MerchantResponse)
 async def get_merchant_by_slug(slug: str):
     """Get a merchant by slug."""
+    version = await cache_version(MERCHANTS_CACHE)
+    cache_key = f"{MERCHANTS_CACHE}:v{version}:slug:{slug}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
     supabase = get_supabase()
 
-    result = supabase.table("merchants").select("*").eq("slug", slug).single().execute()
+    result = await run_query(supabase.table("merchants").select("*").eq("slug", slug).limit(1))
 
     if not result.data:
         raise HTTPException(
@@ -85,7 +171,9 @@ async def get_merchant_by_slug(slug: str):
             detail="Merchant not found"
         )
 
-    return MerchantResponse(**result.data)
+    body = MerchantResponse.model_validate(result.data[0]).model_dump_json().encode()
+    await cache_set(cache_key, body, MERCHANT_CACHE_TTL)
+    return Response(body, media_type="application/json")
 
 
 @router.post("/", response_model=MerchantResponse, status_code=status.HTTP_201_CREATED)
@@ -96,14 +184,8 @@ async def create_merchant(
     """Create a new merchant profile."""
     supabase = get_supabase()
 
-    # Generate slug
     slug = generate_slug(merchant_data.business_name)
 
-    # Check if slug exists
-    existing = supabase.table("merchants").select("id").eq("slug", slug).execute()
-    if existing.data:
-        slug = f"{slug}-{current_user['id'][:8]}"
-
     merchant = {
         **merchant_data.model_dump(),
         "user_id": current_user["id"],
@@ -111,7 +193,15 @@ async def create_merchant(
         "status": "pending",
     }
 
-    result = supabase.table("merchants").insert(merchant).execute()
+    # Let the unique constraint on slug detect a taken slug, so the common
+    # case is a single insert and concurrent creates can't both claim it
+    try:
+        result = await run_query(supabase.table("merchants").insert(merchant))
+    except APIError as e:
+        if e.code != "23505" or "slug" not in (e.message or ""):
+            raise
+        merchant["slug"] = f"{slug}-{current_user['id'][:8]}"
+        result = await run_query(supabase.table("merchants").insert(merchant))
 
     if not result.data:
         raise HTTPException(
@@ -119,6 +209,7 @@ async def create_merchant(
             detail="Failed to create merchant"
         )
 
+    await cache_invalidate(MERCHANTS_CACHE)
     return MerchantResponse(**result.data[0])
 
 
@@ -126,23 +217,16 @@ async def create_merchant(
 async def update_merchant(
     merchant_id: str,
     merchant_data: MerchantUpdate,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(verify_merchant_owner)
 ):
     """Update a merchant profile."""
     supabase = get_supabase()
 
-    # Verify ownership or admin
-    merchant = supabase.table("merchants").select("user_id").eq("id", merchant_id).single().execute()
-
-    if not merchant.data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Merchant not found")
-
-    if merchant.data["user_id"] != current_user["id"] and current_user.get("role") not in ["admin", "super_admin"]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-
     update_data = merchant_data.model_dump(exclude_unset=True)
 
-    result = supabase.table("merchants").update(update_data).eq("id", merchant_id).execute()
+    result = await run_query(supabase.table("merchants").update(update_data).eq("id", merchant_id))
+    _merchant_owner_cache.pop(merchant_id, None)
+    await cache_invalidate(MERCHANTS_CACHE)
 
     return MerchantResponse(**result.data[0])
 
@@ -169,34 +253,25 @@ async def list_merchant_products(
 
     query = query.order("display_order").order("name")
 
-    result = query.execute()
-    return [ProductResponse(**p) for p in result.data]
+    result = await run_query(query)
+    return Response(_product_list.dump_json(_product_list.validate_python(result.data)), media_type="application/json")
 
 
 @router.post("/{merchant_id}/products", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
     merchant_id: str,
     product_data: ProductCreate,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(verify_merchant_owner)
 ):
     """Create a new product for a merchant."""
     supabase = get_supabase()
 
-    # Verify ownership
-    merchant = supabase.table("merchants").select("user_id").eq("id", merchant_id).single().execute()
-
-    if not merchant.data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Merchant not found")
-
-    if merchant.data["user_id"] != current_user["id"] and current_user.get("role") not in ["admin", "super_admin"]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-
     product = {
         **product_data.model_dump(),
         "merchant_id": merchant_id,
     }
 
-    result = supabase.table("products").insert(product).execute()
+    result = await run_query(supabase.table("products").insert(product))
 
     return ProductResponse(**result.data[0])
 
@@ -206,20 +281,14 @@ async def update_product(
     merchant_id: str,
     product_id: str,
     product_data: ProductUpdate,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(verify_merchant_owner)
 ):
     """Update a product."""
     supabase = get_supabase()
 
-    # Verify ownership
-    merchant = supabase.table("merchants").select("user_id").eq("id", merchant_id).single().execute()
-
-    if not merchant.data or (merchant.data["user_id"] != current_user["id"] and current_user.get("role") not in ["admin", "super_admin"]):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-
     update_data = product_data.model_dump(exclude_unset=True)
 
-    result = supabase.table("products").update(update_data).eq("id", product_id).eq("merchant_id", merchant_id).execute()
+    result = await run_query(supabase.table("products").update(update_data).eq("id", product_id).eq("merchant_id", merchant_id))
 
     if not result.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
@@ -231,18 +300,12 @@ async def update_product(
 async def delete_product(
     merchant_id: str,
     product_id: str,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(verify_merchant_owner)
 ):
     """Delete a product."""
     supabase = get_supabase()
 
-    # Verify ownership
-    merchant = supabase.table("merchants").select("user_id").eq("id", merchant_id).single().execute()
-
-    if not merchant.data or (merchant.data["user_id"] != current_user["id"] and current_user.get("role") not in ["admin", "super_admin"]):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-
-    supabase.table("products").delete().eq("id", product_id).eq("merchant_id", merchant_id).execute()
+    await run_query(supabase.table("products").delete().eq("id", product_id).eq("merchant_id", merchant_id))
 
 
 # Product Categories
@@ -251,33 +314,27 @@ async def list_product_categories(merchant_id: str):
     """List product categories for a merchant."""
     supabase = get_supabase()
 
-    result = supabase.table("product_categories").select("*").eq(
+    result = await run_query(supabase.table("product_categories").select("*").eq(
         "merchant_id", merchant_id
-    ).eq("is_active", True).order("display_order").execute()
+    ).eq("is_active", True).order("display_order"))
 
-    return [ProductCategoryResponse(**c) for c in result.data]
+    return Response(_category_list.dump_json(_category_list.validate_python(result.data)), media_type="application/json")
 
 
 @router.post("/{merchant_id}/categories", response_model=ProductCategoryResponse, status_code=status.HTTP_201_CREATED)
 async def create_product_category(
     merchant_id: str,
     category_data: ProductCategoryBase,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(verify_merchant_owner)
 ):
     """Create a product category."""
     supabase = get_supabase()
 
-    # Verify ownership
-    merchant = supabase.table("merchants").select("user_id").eq("id", merchant_id).single().execute()
-
-    if not merchant.data or (merchant.data["user_id"] != current_user["id"] and current_user.get("role") not in ["admin", "super_admin"]):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-
     category = {
         **category_data.model_dump(),
         "merchant_id": merchant_id,
     }
 
-    result = supabase.table("product_categories").insert(category).execute()
+    result = await run_query(supabase.table("product_categories").insert(category))
 
     return ProductCategoryResponse(**result.data[0])
@@ -1,12 +1,18 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import Response
 from typing import List, Optional, Dict
 from datetime import datetime
+import asyncio
+from postgrest import ReturnMethod
+from postgrest.exceptions import APIError
+from pydantic import TypeAdapter
 
-from app.core.supabase import get_supabase
-from app.core.security import get_current_user, require_role
+from app.core.supabase import get_supabase, run_query
+from app.core.security import ADMIN_ROLES, DRIVER_ROLES, get_current_user, require_role
 from app.models.order import (
     OrderCreate,
     OrderResponse,
+    OrderItemResponse,
     OrderStatusUpdate,
     OrderCancellation,
     OrderStatus,
@@ -15,6 +21,28 @@ from app.models.order import (
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
+# Orders with their line items embedded, fetched in one request; only the
+# columns OrderResponse/OrderItemResponse expose
+ORDER_COLUMNS = ", ".join(f for f in OrderResponse.model_fields if f != "items")
+ORDER_WITH_ITEMS = f"{ORDER_COLUMNS}, items:order_items({', '.join(OrderItemResponse.model_fields)})"
+
+# Merchant and coupon columns create_order prices and snapshots from
+MERCHANT_PICKUP_COLUMNS = "address_line_1, city, state, postal_code, latitude, longitude, estimated_prep_time"
+COUPON_COLUMNS = "is_active, discount_type, discount_value, max_discount_amount"
+
+# Statuses each non-admin role may set (admins may set any)
+STATUS_TRANSITIONS_BY_ROLE = {
+    "merchant": frozenset({"confirmed", "preparing", "ready_for_pickup"}),
+    "driver": frozenset({"picked_up", "in_transit", "arrived", "delivered"}),
+}
+
+# Most recent status changes returned by track_order
+STATUS_HISTORY_LIMIT = 20
+
+NON_CANCELLABLE_STATUSES = frozenset({"picked_up", "in_transit", "arrived", "delivered", "cancelled", "refunded"})
+
+_order_list = TypeAdapter(List[OrderResponse])
+
 
 @router.get("/", response_model=List[OrderResponse])
 async def list_orders(
@@ -30,40 +58,33 @@ async def list_orders(
 
     # Build query based on role
     if user_role == "customer":
-        query = supabase.table("orders").select("*").eq("customer_id", current_user["id"])
+        query = supabase.table("orders").select(ORDER_WITH_ITEMS).eq("customer_id", current_user["id"])
     elif user_role == "driver":
         # Get driver ID
-        driver = supabase.table("drivers").select("id").eq("user_id", current_user["id"]).single().execute()
+        driver = await run_query(supabase.table("drivers").select("id").eq("user_id", current_user["id"]).limit(1))
         if driver.data:
-            query = supabase.table("orders").select("*").eq("driver_id", driver.data["id"])
+            query = supabase.table("orders").select(ORDER_WITH_ITEMS).eq("driver_id", driver.data[0]["id"])
         else:
             return []
     elif user_role == "merchant":
         # Get merchant ID
-        merchant = supabase.table("merchants").select("id").eq("user_id", current_user["id"]).single().execute()
+        merchant = await run_query(supabase.table("merchants").select("id").eq("user_id", current_user["id"]).limit(1))
         if merchant.data:
-            query = supabase.table("orders").select("*").eq("merchant_id", merchant.data["id"])
+            query = supabase.table("orders").select(ORDER_WITH_ITEMS).eq("merchant_id", merchant.data[0]["id"])
         else:
             return []
     else:
         # Admin - see all orders
-        query = supabase.table("orders").select("*")
+        query = supabase.table("orders").select(ORDER_WITH_ITEMS)
 
     if status_filter:
         query = query.eq("status", status_filter.value)
 
     query = query.range(offset, offset + limit - 1).order("created_at", desc=True)
 
-    result = query.execute()
-
-    # Get order items for each order
-    orders = []
-    for order_data in result.data:
-        items = supabase.table("order_items").select("*").eq("order_id", order_data["id"]).execute()
-        order_data["items"] = items.data or []
-        orders.append(OrderResponse(**order_data))
+    result = await run_query(query)
 
-    return orders
+    return Response(_order_list.dump_json(_order_list.validate_python(result.data)), media_type="application/json")
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
@@ -74,23 +95,18 @@ async def get_order(
     """Get a specific order."""
     supabase = get_supabase()
 
-    result = supabase.table("orders").select("*").eq("id", order_id).single().execute()
-
-    if not result.data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    query = supabase.table("orders").select(ORDER_WITH_ITEMS).eq("id", order_id)
 
-    # Verify access
-    order = result.data
-    user_role = current_user.get("role", "customer")
+    # Customers only see their own orders
+    if current_user.get("role", "customer") == "customer":
+        query = query.eq("customer_id", current_user["id"])
 
-    if user_role == "customer" and order["customer_id"] != current_user["id"]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    result = await run_query(query.limit(1))
 
-    # Get order items
-    items = supabase.table("order_items").select("*").eq("order_id", order_id).execute()
-    order["items"] = items.data or []
+    if not result.data:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
 
-    return OrderResponse(**order)
+    return OrderResponse(**result.data[0])
 
 
 @router.post("/", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
@@ -101,33 +117,45 @@ async def create_order(
     """Create a new order."""
     supabase = get_supabase()
 
-    # Get merchant details
-    merchant = supabase.table("merchants").select("*").eq("id", order_data.merchant_id).single().execute()
+    # Merchant, delivery address, products and coupon are independent lookups
+    product_ids = list({item.product_id for item in order_data.items})
+    lookups = [
+        supabase.table("merchants").select(MERCHANT_PICKUP_COLUMNS).eq("id", order_data.merchant_id).limit(1),
+        supabase.table("addresses").select("*").eq("id", order_data.delivery_address_id).limit(1),
+        supabase.table("products").select("id, name, price").in_("id", product_ids),
+    ]
+    if order_data.coupon_code:
+        lookups.append(supabase.table("coupons").select(COUPON_COLUMNS).eq("code", order_data.coupon_code).limit(1))
+    merchant, address, products, *coupon = await asyncio.gather(*(run_query(q) for q in lookups))
+
     if not merchant.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Merchant not found")
+    merchant = merchant.data[0]
 
-    # Get delivery address
-    address = supabase.table("addresses").select("*").eq("id", order_data.delivery_address_id).single().execute()
     if not address.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Delivery address not found")
+    address = address.data[0]
+
+    coupon = coupon[0].data[0] if coupon and coupon[0].data else None
 
     # Calculate order totals
     subtotal = 0
     order_items = []
+    products_by_id = {p["id"]: p for p in products.data or []}
 
     for item in order_data.items:
-        product = supabase.table("products").select("*").eq("id", item.product_id).single().execute()
-        if not product.data:
+        product = products_by_id.get(item.product_id)
+        if not product:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Product {item.product_id} not found")
 
-        item_total = product.data["price"] * item.quantity
+        item_total = product["price"] * item.quantity
         subtotal += item_total
 
         order_items.append({
             "product_id": item.product_id,
-            "product_name": product.data["name"],
+            "product_name": product["name"],
             "variant_id": item.variant_id,
-            "unit_price": product.data["price"],
+            "unit_price": product["price"],
             "quantity": item.quantity,
             "total_price": item_total,
             "special_instructions": item.special_instructions,
@@ -140,15 +168,13 @@ async def create_order(
     discount_amount = 0
 
     # Apply coupon if provided
-    if order_data.coupon_code:
-        coupon = supabase.table("coupons").select("*").eq("code", order_data.coupon_code).single().execute()
-        if coupon.data and coupon.data["is_active"]:
-            if coupon.data["discount_type"] == "percentage":
-                discount_amount = round(subtotal * (coupon.data["discount_value"] / 100), 2)
-                if coupon.data.get("max_discount_amount"):
-                    discount_amount = min(discount_amount, coupon.data["max_discount_amount"])
-            else:
-                discount_amount = coupon.data["discount_value"]
+    if coupon and coupon["is_active"]:
+        if coupon["discount_type"] == "percentage":
+            discount_amount = round(subtotal * (coupon["discount_value"] / 100), 2)
+            if coupon.get("max_discount_amount"):
+                discount_amount = min(discount_amount, coupon["max_discount_amount"])
+        else:
+            discount_amount = coupon["discount_value"]
 
     total_amount = subtotal + delivery_fee + service_fee + tax_amount - discount_amount + order_data.tip_amount
 
@@ -158,18 +184,18 @@ async def create_order(
         "merchant_id": order_data.merchant_id,
         "status": "pending",
         "delivery_address_id": order_data.delivery_address_id,
-        "delivery_address_snapshot": address.data,
-        "delivery_latitude": address.data.get("latitude"),
-        "delivery_longitude": address.data.get("longitude"),
+        "delivery_address_snapshot": address,
+        "delivery_latitude": address.get("latitude"),
+        "delivery_longitude": address.get("longitude"),
         "delivery_instructions": order_data.delivery_instructions,
         "pickup_address_snapshot": {
-            "address_line_1": merchant.data["address_line_1"],
-            "city": merchant.data["city"],
-            "state": merchant.data["state"],
-            "postal_code": merchant.data["postal_code"],
+            "address_line_1": merchant["address_line_1"],
+            "city": merchant["city"],
+            "state": merchant["state"],
+            "postal_code": merchant["postal_code"],
         },
-        "pickup_latitude": merchant.data.get("latitude"),
-        "pickup_longitude": merchant.data.get("longitude"),
+        "pickup_latitude": merchant.get("latitude"),
+        "pickup_longitude": merchant.get("longitude"),
         "subtotal": subtotal,
         "delivery_fee": delivery_fee,
         "service_fee": service_fee,
@@ -178,51 +204,46 @@ async def create_order(
         "tip_amount": order_data.tip_amount,
         "total_amount": total_amount,
         "coupon_code": order_data.coupon_code,
-        "estimated_prep_time": merchant.data.get("estimated_prep_time", 30),
+        "estimated_prep_time": merchant.get("estimated_prep_time", 30),
         "scheduled_for": order_data.scheduled_for.isoformat() if order_data.scheduled_for else None,
         "customer_notes": order_data.delivery_instructions,
     }
 
-    result = supabase.table("orders").insert(order).execute()
+    result = await run_query(supabase.table("orders").insert(order))
 
     if not result.data:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to create order")
 
     order_id = result.data[0]["id"]
 
-    # Create order items
     for item in order_items:
         item["order_id"] = order_id
-        supabase.table("order_items").insert(item).execute()
 
-    # Create payment record
     payment_method_val = order_data.payment_method.value if isinstance(order_data.payment_method, PaymentMethod) else order_data.payment_method
     gateway_provider = None if payment_method_val == "cash" else "stripe"
     payment_status = "pending"
 
-    supabase.table("payments").insert({
-        "order_id": order_id,
-        "user_id": current_user["id"],
-        "amount": total_amount,
-        "currency": "INR",
-        "payment_method": payment_method_val,
-        "status": payment_status,
-        "gateway_provider": gateway_provider,
-    }).execute()
-
-    # Create order status history
-    supabase.table("order_status_history").insert({
-        "order_id": order_id,
-        "status": "pending",
-        "changed_by": current_user["id"],
-    }).execute()
-
-    # Get complete order
-    final_order = supabase.table("orders").select("*").eq("id", order_id).single().execute()
-    items = supabase.table("order_items").select("*").eq("order_id", order_id).execute()
-    final_order.data["items"] = items.data or []
-
-    return OrderResponse(**final_order.data)
+    # Order items, payment record and status history only depend on the order
+    items, _, _ = await asyncio.gather(
+        run_query(supabase.table("order_items").insert(order_items)),
+        run_query(supabase.table("payments").insert({
+            "order_id": order_id,
+            "user_id": current_user["id"],
+            "amount": total_amount,
+            "currency": "INR",
+            "payment_method": payment_method_val,
+            "status": payment_status,
+            "gateway_provider": gateway_provider,
+        }, returning=ReturnMethod.minimal)),
+        run_query(supabase.table("order_status_history").insert({
+            "order_id": order_id,
+            "status": "pending",
+            "changed_by": current_user["id"],
+        }, returning=ReturnMethod.minimal)),
+    )
+
+    # The inserts already returned the order and its items
+    return OrderResponse(**result.data[0], items=items.data or [])
 
 
 @router.patch("/{order_id}/status", response_model=OrderResponse)
@@ -234,60 +255,28 @@ async def update_order_status(
     """Update order status."""
     supabase = get_supabase()
 
-    # Get order
-    order = supabase.table("orders").select("*").eq("id", order_id).single().execute()
-    if not order.data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-
     # Verify authorization based on role and status transition
     user_role = current_user.get("role", "customer")
-    current_status = order.data["status"]
     new_status = status_update.status.value
 
-    # Define allowed transitions
-    allowed_transitions = {
-        "merchant": ["confirmed", "preparing", "ready_for_pickup"],
-        "driver": ["picked_up", "in_transit", "arrived", "delivered"],
-        "admin": list(OrderStatus),
-        "super_admin": list(OrderStatus),
-    }
-
-    if user_role not in ["admin", "super_admin"]:
-        if new_status not in allowed_transitions.get(user_role, []):
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized for this status change")
-
-    # Update status
-    update_data = {"status": new_status}
-
-    # Set timestamps based on status
-    timestamp_map = {
-        "confirmed": "confirmed_at",
-        "preparing": "preparing_at",
-        "ready_for_pickup": "ready_at",
-        "picked_up": "picked_up_at",
-        "delivered": "delivered_at",
-        "cancelled": "cancelled_at",
-    }
-
-    if new_status in timestamp_map:
-        update_data[timestamp_map[new_status]] = datetime.utcnow().isoformat()
+    if user_role not in ADMIN_ROLES and new_status not in STATUS_TRANSITIONS_BY_ROLE.get(user_role, ()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized for this status change")
 
-    result = supabase.table("orders").update(update_data).eq("id", order_id).execute()
+    # Update the status, stamp its timestamp and log the change in one
+    # transaction (see migrations/027_transition_order_status_rpc.sql)
+    try:
+        result = await run_query(supabase.rpc("transition_order_status", {
+            "p_order_id": order_id,
+            "p_status": new_status,
+            "p_changed_by": current_user["id"],
+            "p_notes": status_update.notes,
+        }).select(ORDER_WITH_ITEMS))
+    except APIError as e:
+        if e.code == "P0002":
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        raise
 
-    # Log status change
-    supabase.table("order_status_history").insert({
-        "order_id": order_id,
-        "status": new_status,
-        "changed_by": current_user["id"],
-        "notes": status_update.notes,
-    }).execute()
-
-    # Get updated order with items
-    updated_order = supabase.table("orders").select("*").eq("id", order_id).single().execute()
-    items = supabase.table("order_items").select("*").eq("order_id", order_id).execute()
-    updated_order.data["items"] = items.data or []
-
-    return OrderResponse(**updated_order.data)
+    return OrderResponse(**result.data[0])
 
 
 @router.post("/{order_id}/cancel", response_model=OrderResponse)
@@ -299,34 +288,29 @@ async def cancel_order(
     """Cancel an order."""
     supabase = get_supabase()
 
-    # Get order
-    order = supabase.table("orders").select("*").eq("id", order_id).single().execute()
+    # Get order; only admins may cancel someone else's
+    query = supabase.table("orders").select("status").eq("id", order_id)
+    if current_user.get("role") not in ADMIN_ROLES:
+        query = query.eq("customer_id", current_user["id"])
+
+    order = await run_query(query.limit(1))
     if not order.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-
-    # Verify authorization
-    if order.data["customer_id"] != current_user["id"] and current_user.get("role") not in ["admin", "super_admin"]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    order = order.data[0]
 
     # Check if order can be cancelled
-    non_cancellable = ["picked_up", "in_transit", "arrived", "delivered", "cancelled", "refunded"]
-    if order.data["status"] in non_cancellable:
+    if order["status"] in NON_CANCELLABLE_STATUSES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order cannot be cancelled at this stage")
 
     # Cancel order
-    result = supabase.table("orders").update({
+    result = await run_query(supabase.table("orders").update({
         "status": "cancelled",
         "cancelled_at": datetime.utcnow().isoformat(),
         "cancellation_reason": cancellation.reason,
         "cancelled_by": current_user["id"],
-    }).eq("id", order_id).execute()
+    }).eq("id", order_id).select(ORDER_WITH_ITEMS))
 
-    # Get updated order with items
-    updated_order = supabase.table("orders").select("*").eq("id", order_id).single().execute()
-    items = supabase.table("order_items").select("*").eq("order_id", order_id).execute()
-    updated_order.data["items"] = items.data or []
-
-    return OrderResponse(**updated_order.data)
+    return OrderResponse(**result.data[0])
 
 
 @router.get("/{order_id}/tracking")
@@ -337,41 +321,41 @@ async def track_order(
     """Get real-time tracking info for an order."""
     supabase = get_supabase()
 
-    # Get order
-    order = supabase.table("orders").select("*").eq("id", order_id).single().execute()
+    # Order with its driver's location and latest status changes embedded
+    query = supabase.table("orders").select(
+        "order_number, status, estimated_delivery_time, driver_id, "
+        "driver:drivers!driver_id(current_latitude, current_longitude, last_location_update), "
+        "history:order_status_history(status, changed_by, notes, created_at)"
+    ).eq("id", order_id).order(
+        "created_at", desc=True, foreign_table="history"
+    ).limit(STATUS_HISTORY_LIMIT, foreign_table="history")
+
+    # Admins and drivers can track any order, everyone else only their own
+    if current_user.get("role") not in ADMIN_ROLES | DRIVER_ROLES:
+        query = query.eq("customer_id", current_user["id"])
+
+    order = await run_query(query.limit(1))
     if not order.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-
-    # Verify access
-    if order.data["customer_id"] != current_user["id"] and current_user.get("role") not in ["admin", "super_admin", "driver"]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    order = order.data[0]
 
     tracking_info = {
         "order_id": order_id,
-        "order_number": order.data["order_number"],
-        "status": order.data["status"],
-        "estimated_delivery_time": order.data.get("estimated_delivery_time"),
+        "order_number": order["order_number"],
+        "status": order["status"],
+        "estimated_delivery_time": order.get("estimated_delivery_time"),
         "driver_location": None,
     }
 
-    # Get driver location if assigned
-    if order.data.get("driver_id"):
-        driver = supabase.table("drivers").select(
-            "current_latitude", "current_longitude", "last_location_update"
-        ).eq("id", order.data["driver_id"]).single().execute()
+    # Driver location if assigned
+    driver = order.get("driver")
+    if driver:
+        tracking_info["driver_location"] = {
+            "latitude": driver.get("current_latitude"),
+            "longitude": driver.get("current_longitude"),
+            "updated_at": driver.get("last_location_update"),
+        }
 
-        if driver.data:
-            tracking_info["driver_location"] = {
-                "latitude": driver.data.get("current_latitude"),
-                "longitude": driver.data.get("current_longitude"),
-                "updated_at": driver.data.get("last_location_update"),
-            }
-
-    # Get status history
-    history = supabase.table("order_status_history").select("*").eq(
-        "order_id", order_id
-    ).order("created_at", desc=True).execute()
-
-    tracking_info["status_history"] = history.data or []
+    tracking_info["status_history"] = order.get("history") or []
 
     return tracking_info
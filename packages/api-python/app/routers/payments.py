@@ -1,85 +1,114 @@
 import stripe
-from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Request
+from postgrest.exceptions import APIError
 from typing import Dict
+from datetime import datetime, timezone
+import logging
+import orjson
 
+from app.core.cache import cache_get, cache_set, cache_delete
 from app.core.config import settings
-from app.core.supabase import get_supabase
+from app.core.supabase import get_supabase, run_query
+from app.core.rate_limit import limiter, user_or_ip
+from app.core.webhooks import verify_stripe_signature
 from app.core.security import get_current_user, require_role
 from app.models.order import (
     CreatePaymentIntentRequest,
     PaymentIntentResponse,
+    PaymentMethod,
     PaymentStatusResponse,
     RefundRequest,
     RefundResponse,
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
 # Configure Stripe
 stripe.api_key = settings.STRIPE_SECRET_KEY
+_STRIPE_WEBHOOK_SECRET = settings.STRIPE_WEBHOOK_SECRET.encode()
+# Stripe events are a few KB; anything near this is not from Stripe
+MAX_WEBHOOK_BODY_BYTES = 1_048_576
+# httpx backs both the sync and *_async calls, so Stripe round-trips
+# made from request handlers don't block the event loop
+stripe.default_http_client = stripe.HTTPXClient()
+
+PAYMENT_STATUS_COLUMNS = ", ".join(PaymentStatusResponse.model_fields)
+# Payment columns refund_payment checks before calling Stripe
+REFUND_PAYMENT_COLUMNS = "order_id, amount, amount_paise, status, gateway_payment_id"
+
+# Latest payment per order, cached for status polling. Terminal statuses
+# don't change so they're kept longer; every payment write drops the entry
+PAYMENT_STATUS_CACHE = "payment_status"
+TERMINAL_PAYMENT_STATUSES = frozenset({"completed", "failed", "refunded"})
+PAYMENT_STATUS_TTL = 300
+PENDING_PAYMENT_STATUS_TTL = 2
+
+
+def _payment_status_key(order_id: str) -> str:
+    return f"{PAYMENT_STATUS_CACHE}:{order_id}"
 
 
 @router.post("/create-intent", response_model=PaymentIntentResponse)
+@limiter.limit("10/minute", key_func=user_or_ip)
 async def create_payment_intent(
+    request: Request,
     payload: CreatePaymentIntentRequest,
     current_user: Dict = Depends(get_current_user),
 ):
     """Create a Stripe PaymentIntent for an order."""
-    supabase = get_supabase()
-
-    # Verify order exists and belongs to user
-    order = supabase.table("orders").select("*").eq("id", payload.order_id).single().execute()
-    if not order.data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-
-    if order.data["customer_id"] != current_user["id"]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-
-    # Reject cash payments
-    if payload.payment_method.value == "cash":
+    # Reject cash payments before touching the database
+    if payload.payment_method == PaymentMethod.CASH:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cash payments do not require a payment intent",
         )
 
-    # Fetch pending payment record for this order
-    payment = (
-        supabase.table("payments")
-        .select("*")
-        .eq("order_id", payload.order_id)
-        .in_("status", ["pending", "processing"])
-        .single()
-        .execute()
+    supabase = get_supabase()
+
+    # The caller's order and its pending payment record in one request;
+    # someone else's order reads as not found
+    order = await run_query(
+        supabase.table("orders")
+        .select("total_amount_paise, pending_payments:payments(id, gateway_payment_id)")
+        .eq("id", payload.order_id)
+        .eq("customer_id", current_user["id"])
+        .in_("pending_payments.status", ["pending", "processing"])
+        .limit(1)
     )
-    if not payment.data:
+    if not order.data:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    order = order.data[0]
+
+    if not order["pending_payments"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No pending payment found for this order",
         )
+    payment = order["pending_payments"][0]
 
     # If a PaymentIntent already exists (idempotent retry), retrieve it
-    if payment.data.get("gateway_payment_id"):
+    if payment.get("gateway_payment_id"):
         try:
-            existing_intent = stripe.PaymentIntent.retrieve(payment.data["gateway_payment_id"])
+            existing_intent = await stripe.PaymentIntent.retrieve_async(payment["gateway_payment_id"])
             return PaymentIntentResponse(
                 client_secret=existing_intent.client_secret,
                 payment_intent_id=existing_intent.id,
-                payment_id=payment.data["id"],
+                payment_id=payment["id"],
             )
         except stripe.error.StripeError:
             pass  # Fall through to create a new intent
 
     # Create Stripe PaymentIntent (amount in paise)
-    amount_paise = int(round(order.data["total_amount"] * 100))
-
     try:
-        intent = stripe.PaymentIntent.create(
-            amount=amount_paise,
+        intent = await stripe.PaymentIntent.create_async(
+            amount=order["total_amount_paise"],
             currency="inr",
             payment_method_types=["card"],
             metadata={
                 "order_id": payload.order_id,
-                "payment_id": payment.data["id"],
+                "payment_id": payment["id"],
                 "customer_id": current_user["id"],
             },
         )
@@ -90,34 +119,41 @@ async def create_payment_intent(
         )
 
     # Update payment record with intent info
-    supabase.table("payments").update({
+    await run_query(supabase.table("payments").update({
         "gateway_payment_id": intent.id,
         "gateway_provider": "stripe",
         "status": "processing",
-    }).eq("id", payment.data["id"]).execute()
+    }).eq("id", payment["id"]))
+    await cache_delete(_payment_status_key(payload.order_id))
 
     return PaymentIntentResponse(
         client_secret=intent.client_secret,
         payment_intent_id=intent.id,
-        payment_id=payment.data["id"],
+        payment_id=payment["id"],
     )
 
 
-@router.post("/webhook")
-async def stripe_webhook(request: Request):
-    """Handle Stripe webhook events. No auth — Stripe calls this directly."""
-    payload = await request.body()
-    sig_header = request.headers.get("stripe-signature", "")
+async def _process_stripe_event(event) -> None:
+    """Background task: apply an acknowledged Stripe event.
 
+    Stripe already has its 200 and won't retry, so on failure the event's
+    claim in processed_stripe_events is released; a resend from the Stripe
+    dashboard is then processed instead of rejected as a duplicate.
+    """
     try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
-        )
-    except ValueError:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid payload")
-    except stripe.error.SignatureVerificationError:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid signature")
+        await _apply_stripe_event(event)
+    except Exception:
+        logger.exception(f"Failed to process Stripe event {event['id']}")
+        try:
+            await run_query(
+                get_supabase().table("processed_stripe_events").delete().eq("event_id", event["id"])
+            )
+        except Exception:
+            logger.exception(f"Failed to release Stripe event {event['id']} for replay")
+
 
+async def _apply_stripe_event(event) -> None:
+    """Apply a verified Stripe webhook event to payments and orders."""
     supabase = get_supabase()
 
     if event["type"] == "payment_intent.succeeded":
@@ -126,7 +162,7 @@ async def stripe_webhook(request: Request):
         order_id = intent["metadata"].get("order_id")
 
         if not payment_id or not order_id:
-            return {"status": "ignored", "reason": "missing metadata"}
+            return
 
         # Extract card details if available
         card_brand = None
@@ -138,68 +174,101 @@ async def stripe_webhook(request: Request):
             card_brand = card_info.get("brand")
             card_last4 = card_info.get("last4")
 
-        # Update payment to completed
-        from datetime import datetime, timezone
-        now = datetime.now(timezone.utc).isoformat()
-
-        supabase.table("payments").update({
-            "status": "completed",
-            "paid_at": now,
-            "card_brand": card_brand,
-            "card_last_four": card_last4,
-        }).eq("id", payment_id).execute()
-
-        # Update order to confirmed
-        supabase.table("orders").update({
-            "status": "confirmed",
-            "confirmed_at": now,
-        }).eq("id", order_id).execute()
-
-        # Log status history
-        supabase.table("order_status_history").insert({
-            "order_id": order_id,
-            "status": "confirmed",
-            "notes": f"Payment confirmed via Stripe ({intent['id']})",
-        }).execute()
+        # Complete the payment, confirm the order and log it in one
+        # transaction (see migrations/028_payment_rpcs.sql)
+        await run_query(supabase.rpc("confirm_payment", {
+            "p_payment_id": payment_id,
+            "p_order_id": order_id,
+            "p_card_brand": card_brand,
+            "p_card_last4": card_last4,
+            "p_note": f"Payment confirmed via Stripe ({intent['id']})",
+        }))
+        await cache_delete(_payment_status_key(order_id))
 
     elif event["type"] == "payment_intent.payment_failed":
         intent = event["data"]["object"]
         payment_id = intent["metadata"].get("payment_id")
+        order_id = intent["metadata"].get("order_id")
 
         if payment_id:
-            from datetime import datetime, timezone
             now = datetime.now(timezone.utc).isoformat()
 
-            supabase.table("payments").update({
+            await run_query(supabase.table("payments").update({
                 "status": "failed",
                 "failed_at": now,
-            }).eq("id", payment_id).execute()
+            }).eq("id", payment_id))
+            if order_id:
+                await cache_delete(_payment_status_key(order_id))
+
 
+@router.post("/webhook")
+async def stripe_webhook(request: Request, background_tasks: BackgroundTasks):
+    """Handle Stripe webhook events. No auth — Stripe calls this directly."""
+    # Refuse oversized bodies before buffering them, whether or not the
+    # sender declared a length
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_WEBHOOK_BODY_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Payload too large")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_WEBHOOK_BODY_BYTES:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Payload too large")
+    payload = bytes(body)
+    sig_header = request.headers.get("stripe-signature", "")
+
+    event = verify_stripe_signature(payload, sig_header, _STRIPE_WEBHOOK_SECRET)
+
+    # Claim the event id first; a redelivered event hits the primary key
+    # and is acknowledged without touching payments again
+    try:
+        await run_query(
+            get_supabase().table("processed_stripe_events").insert({"event_id": event["id"]})
+        )
+    except APIError as e:
+        if e.code != "23505":
+            raise
+        return {"status": "duplicate"}
+
+    # Acknowledge as soon as the event is verified; Stripe retries slow
+    # responses, so the database work runs after the response is sent
+    background_tasks.add_task(_process_stripe_event, event)
     return {"status": "ok"}
 
 
 @router.get("/{order_id}", response_model=PaymentStatusResponse)
+@limiter.limit("60/minute", key_func=user_or_ip)
 async def get_payment_status(
+    request: Request,
     order_id: str,
     current_user: Dict = Depends(get_current_user),
 ):
     """Get payment status for an order."""
-    supabase = get_supabase()
-
-    # Fetch payment
-    payment = (
-        supabase.table("payments")
-        .select("*")
-        .eq("order_id", order_id)
-        .order("created_at", desc=True)
-        .limit(1)
-        .execute()
-    )
+    cache_key = _payment_status_key(order_id)
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        pay = orjson.loads(cached)
+    else:
+        supabase = get_supabase()
+
+        # Fetch payment
+        payment = await run_query(
+            supabase.table("payments")
+            .select(PAYMENT_STATUS_COLUMNS)
+            .eq("order_id", order_id)
+            .order("created_at", desc=True)
+            .limit(1)
+        )
 
-    if not payment.data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found")
+        if not payment.data:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found")
 
-    pay = payment.data[0]
+        pay = payment.data[0]
+        ttl = (
+            PAYMENT_STATUS_TTL if pay["status"] in TERMINAL_PAYMENT_STATUSES
+            else PENDING_PAYMENT_STATUS_TTL
+        )
+        await cache_set(cache_key, orjson.dumps(pay), ttl)
 
     # Access control: customer can only see their own, admin/super_admin can see all
     user_role = current_user.get("role", "customer")
@@ -210,7 +279,9 @@ async def get_payment_status(
 
 
 @router.post("/{payment_id}/refund", response_model=RefundResponse)
+@limiter.limit("30/minute", key_func=user_or_ip)
 async def refund_payment(
+    request: Request,
     payment_id: str,
     payload: RefundRequest,
     current_user: Dict = Depends(require_role(["admin", "super_admin"])),
@@ -219,11 +290,16 @@ async def refund_payment(
     supabase = get_supabase()
 
     # Fetch payment
-    payment = supabase.table("payments").select("*").eq("id", payment_id).single().execute()
+    payment = await run_query(
+        supabase.table("payments")
+        .select(REFUND_PAYMENT_COLUMNS)
+        .eq("id", payment_id)
+        .limit(1)
+    )
     if not payment.data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found")
 
-    pay = payment.data
+    pay = payment.data[0]
     if pay["status"] != "completed":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -237,8 +313,12 @@ async def refund_payment(
         )
 
     # Determine refund amount (paise)
-    refund_amount = payload.amount if payload.amount else pay["amount"]
-    amount_paise = int(round(refund_amount * 100))
+    if payload.amount:
+        refund_amount = payload.amount
+        amount_paise = int(round(refund_amount * 100))
+    else:
+        refund_amount = pay["amount"]
+        amount_paise = pay["amount_paise"]
 
     try:
         refund_params = {
@@ -249,31 +329,23 @@ async def refund_payment(
             refund_params["reason"] = "requested_by_customer"
             refund_params["metadata"] = {"reason": payload.reason}
 
-        refund = stripe.Refund.create(**refund_params)
+        refund = await stripe.Refund.create_async(**refund_params)
     except stripe.error.StripeError as e:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Stripe refund error: {str(e)}",
         )
 
-    # Update payment status
-    new_status = "refunded" if refund_amount >= pay["amount"] else "completed"
-    supabase.table("payments").update({
-        "status": new_status,
-    }).eq("id", payment_id).execute()
-
-    # Update order status if full refund
-    if refund_amount >= pay["amount"]:
-        supabase.table("orders").update({
-            "status": "refunded",
-        }).eq("id", pay["order_id"]).execute()
-
-        supabase.table("order_status_history").insert({
-            "order_id": pay["order_id"],
-            "status": "refunded",
-            "changed_by": current_user["id"],
-            "notes": f"Refund {refund.id} — {payload.reason or 'No reason provided'}",
-        }).execute()
+    # A full refund marks the payment and order refunded and logs it in one
+    # transaction (see migrations/028_payment_rpcs.sql); a partial refund
+    # leaves the payment completed
+    if amount_paise >= pay["amount_paise"]:
+        await run_query(supabase.rpc("refund_payment", {
+            "p_payment_id": payment_id,
+            "p_changed_by": current_user["id"],
+            "p_note": f"Refund {refund.id} — {payload.reason or 'No reason provided'}",
+        }))
+        await cache_delete(_payment_status_key(pay["order_id"]))
 
     return RefundResponse(
         refund_id=refund.id,
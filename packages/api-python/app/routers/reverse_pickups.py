@@ -4,7 +4,7 @@ from datetime import datetime
 import uuid
 
 from app.core.supabase import get_supabase
-from app.core.security import get_current_user, require_role
+from app.core.security import get_current_user, require_role, get_user_hub_id
 from app.models.reverse_pickup import (
     ReversePickupCreate,
     ReversePickupUpdate,
@@ -16,19 +16,6 @@ from app.models.reverse_pickup import (
 router = APIRouter(prefix="/reverse-pickups", tags=["Reverse Pickups"])
 
 
-def get_user_hub_id(current_user: Dict) -> Optional[str]:
-    """Get the hub_id the user has access to."""
-    role = current_user.get("role")
-    if role in ("admin", "super_admin"):
-        return None  # Admin can access all hubs
-    if role == "hub_manager":
-        supabase = get_supabase()
-        hub = supabase.table("hubs").select("id").eq("manager_id", current_user["id"]).limit(1).execute()
-        if hub.data:
-            return hub.data[0]["id"]
-    return None
-
-
 @router.post("", response_model=ReversePickupResponse, status_code=status.HTTP_201_CREATED)
 async def create_pickup(
     pickup_data: ReversePickupCreate,
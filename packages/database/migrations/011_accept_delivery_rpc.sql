@@ -0,0 +1,64 @@
+-- =====================================================
+-- 011: accept_delivery RPC
+-- =====================================================
+-- Assigns a ready order to the calling driver in a single
+-- transaction: claims the order (only if still unassigned),
+-- marks the driver on_delivery, logs the status change and
+-- returns the order with its items as JSON.
+--
+-- Errors are raised with ERRCODE P0002 (not found),
+-- P0001 (invalid state) or PT409 (order already claimed by
+-- another driver); the API maps them to 404, 400 and 409.
+
+CREATE OR REPLACE FUNCTION accept_delivery(p_order_id UUID, p_user_id UUID)
+RETURNS JSONB AS $$
+DECLARE
+  v_driver drivers%ROWTYPE;
+  v_first_name TEXT;
+  v_order orders%ROWTYPE;
+BEGIN
+  SELECT * INTO v_driver FROM drivers WHERE user_id = p_user_id;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Driver profile not found' USING ERRCODE = 'P0002';
+  END IF;
+
+  IF v_driver.status <> 'online' THEN
+    RAISE EXCEPTION 'Driver must be online to accept deliveries' USING ERRCODE = 'P0001';
+  END IF;
+
+  UPDATE orders
+  SET driver_id = v_driver.id,
+      status = 'driver_assigned'
+  WHERE id = p_order_id
+    AND status = 'ready_for_pickup'
+    AND driver_id IS NULL
+  RETURNING * INTO v_order;
+
+  IF NOT FOUND THEN
+    SELECT * INTO v_order FROM orders WHERE id = p_order_id;
+    IF NOT FOUND THEN
+      RAISE EXCEPTION 'Order not found' USING ERRCODE = 'P0002';
+    ELSIF v_order.status <> 'ready_for_pickup' THEN
+      RAISE EXCEPTION 'Order is not available for pickup' USING ERRCODE = 'P0001';
+    END IF;
+    RAISE EXCEPTION 'Order already assigned to another driver' USING ERRCODE = 'PT409';
+  END IF;
+
+  UPDATE drivers SET status = 'on_delivery' WHERE id = v_driver.id;
+
+  SELECT first_name INTO v_first_name FROM users WHERE id = p_user_id;
+
+  INSERT INTO order_status_history (order_id, status, changed_by, notes)
+  VALUES (p_order_id, 'driver_assigned', p_user_id,
+          'Driver ' || COALESCE(v_first_name, '') || ' assigned');
+
+  RETURN to_jsonb(v_order) || jsonb_build_object(
+    'items',
+    COALESCE(
+      (SELECT jsonb_agg(to_jsonb(oi) ORDER BY oi.created_at)
+       FROM order_items oi WHERE oi.order_id = p_order_id),
+      '[]'::jsonb
+    )
+  );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,49 @@
+-- =====================================================
+-- 012: driver_earnings_summary RPC
+-- =====================================================
+-- Aggregates a driver's earnings in Postgres instead of
+-- shipping every row to the API to be summed in Python.
+-- p_period is one of 'today', 'week', 'month' or 'all'.
+
+CREATE INDEX IF NOT EXISTS idx_driver_earnings_driver_created
+  ON driver_earnings(driver_id, created_at DESC);
+
+CREATE OR REPLACE FUNCTION driver_earnings_summary(p_driver_id UUID, p_period TEXT DEFAULT 'all')
+RETURNS JSONB AS $$
+DECLARE
+  v_since TIMESTAMPTZ;
+  v_result JSONB;
+BEGIN
+  v_since := CASE p_period
+    WHEN 'today' THEN date_trunc('day', NOW())
+    WHEN 'week' THEN date_trunc('week', NOW())
+    WHEN 'month' THEN date_trunc('month', NOW())
+    ELSE NULL
+  END;
+
+  SELECT jsonb_build_object(
+    'total_earnings', COALESCE(SUM(e.total_earnings), 0),
+    'total_tips', COALESCE(SUM(e.tip_amount), 0),
+    'total_deliveries', COUNT(*)
+  )
+  INTO v_result
+  FROM driver_earnings e
+  WHERE e.driver_id = p_driver_id
+    AND (v_since IS NULL OR e.created_at >= v_since);
+
+  RETURN v_result || jsonb_build_object(
+    'recent_earnings',
+    COALESCE(
+      (SELECT jsonb_agg(to_jsonb(r))
+       FROM (
+         SELECT * FROM driver_earnings e
+         WHERE e.driver_id = p_driver_id
+           AND (v_since IS NULL OR e.created_at >= v_since)
+         ORDER BY e.created_at DESC
+         LIMIT 10
+       ) r),
+      '[]'::jsonb
+    )
+  );
+END;
+$$ LANGUAGE plpgsql STABLE;
@@ -0,0 +1,55 @@
+-- =====================================================
+-- 013: Nearby available orders
+-- =====================================================
+-- Adds a generated PostGIS pickup point on orders with a
+-- GIST index, and an RPC that returns ready, unassigned
+-- orders within a radius of the driver, nearest first.
+
+ALTER TABLE orders
+  ADD COLUMN IF NOT EXISTS pickup_location GEOGRAPHY(POINT, 4326)
+  GENERATED ALWAYS AS (
+    CASE
+      WHEN pickup_latitude IS NOT NULL AND pickup_longitude IS NOT NULL
+      THEN ST_SetSRID(ST_MakePoint(pickup_longitude, pickup_latitude), 4326)::geography
+    END
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_orders_pickup_location
+  ON orders USING GIST(pickup_location);
+
+-- Returns a JSON array of orders, each with its order_items
+-- embedded under "order_items" (same shape as a PostgREST
+-- select("*, order_items(*)")).
+CREATE OR REPLACE FUNCTION available_orders_near(
+  p_latitude DOUBLE PRECISION,
+  p_longitude DOUBLE PRECISION,
+  p_radius_m DOUBLE PRECISION,
+  p_limit INTEGER DEFAULT 20
+)
+RETURNS JSONB AS $$
+  WITH origin AS (
+    SELECT ST_SetSRID(ST_MakePoint(p_longitude, p_latitude), 4326)::geography AS point
+  ),
+  nearby AS (
+    SELECT o.*
+    FROM orders o, origin
+    WHERE o.status = 'ready_for_pickup'
+      AND o.driver_id IS NULL
+      AND ST_DWithin(o.pickup_location, origin.point, p_radius_m)
+    ORDER BY ST_Distance(o.pickup_location, origin.point)
+    LIMIT p_limit
+  )
+  SELECT COALESCE(
+    jsonb_agg(
+      (to_jsonb(n) - 'pickup_location') || jsonb_build_object(
+        'order_items',
+        COALESCE(
+          (SELECT jsonb_agg(to_jsonb(oi)) FROM order_items oi WHERE oi.order_id = n.id),
+          '[]'::jsonb
+        )
+      )
+    ),
+    '[]'::jsonb
+  )
+  FROM nearby n;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,20 @@
+-- =====================================================
+-- 014: drivers_with_user view
+-- =====================================================
+-- Drivers with their user's name and contact details as
+-- flat columns, so the fleet driver list needs no
+-- embedded users(...) object reshaped per row in the API.
+-- security_invoker makes reads go through the RLS policies
+-- on drivers and users, so the view exposes nothing the
+-- caller couldn't already select from those tables.
+
+CREATE OR REPLACE VIEW drivers_with_user
+WITH (security_invoker = true) AS
+SELECT
+  d.*,
+  COALESCE(u.first_name, '') AS first_name,
+  COALESCE(u.last_name, '') AS last_name,
+  COALESCE(u.email, '') AS email,
+  COALESCE(u.phone, '') AS user_phone
+FROM drivers d
+LEFT JOIN users u ON u.id = d.user_id;
@@ -0,0 +1,46 @@
+-- =====================================================
+-- 015: hub_overview RPC
+-- =====================================================
+-- Per-hub order and driver counts for the admin overview,
+-- aggregated in one query instead of two queries per hub.
+
+CREATE INDEX IF NOT EXISTS idx_delivery_orders_hub_created
+  ON delivery_orders(hub_id, created_at);
+
+CREATE OR REPLACE FUNCTION hub_overview(p_since TIMESTAMPTZ)
+RETURNS TABLE (
+  hub_id UUID,
+  hub_name VARCHAR,
+  hub_code VARCHAR,
+  total_orders BIGINT,
+  delivered BIGINT,
+  failed BIGINT,
+  drivers_online BIGINT
+) AS $$
+  SELECT
+    h.id,
+    h.name,
+    h.code,
+    COALESCE(o.total, 0),
+    COALESCE(o.delivered, 0),
+    COALESCE(o.failed, 0),
+    COALESCE(d.online, 0)
+  FROM hubs h
+  LEFT JOIN (
+    SELECT
+      hub_id,
+      COUNT(*) AS total,
+      COUNT(*) FILTER (WHERE status = 'delivered') AS delivered,
+      COUNT(*) FILTER (WHERE status = 'failed') AS failed
+    FROM delivery_orders
+    WHERE created_at >= p_since
+    GROUP BY hub_id
+  ) o ON o.hub_id = h.id
+  LEFT JOIN (
+    SELECT hub_id, COUNT(*) AS online
+    FROM drivers
+    WHERE is_active AND status IN ('online', 'on_delivery')
+    GROUP BY hub_id
+  ) d ON d.hub_id = h.id
+  WHERE h.is_active;
+$$ LANGUAGE sql STABLE;
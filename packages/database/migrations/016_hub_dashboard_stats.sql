@@ -0,0 +1,43 @@
+-- =====================================================
+-- 016: Hub dashboard / daily report aggregates
+-- =====================================================
+-- Status counts and delivered COD totals for a hub's
+-- delivery orders, grouped in Postgres so the API gets a
+-- handful of buckets instead of every order row.
+
+-- Counts per status since p_since
+CREATE OR REPLACE FUNCTION hub_dashboard_stats(p_hub_id UUID, p_since TIMESTAMPTZ)
+RETURNS TABLE (
+  status VARCHAR,
+  cnt BIGINT,
+  cod_sum NUMERIC
+) AS $$
+  SELECT
+    o.status,
+    COUNT(*),
+    COALESCE(SUM(o.cod_amount) FILTER (WHERE o.is_cod AND o.status = 'delivered'), 0)
+  FROM delivery_orders o
+  WHERE o.hub_id = p_hub_id
+    AND o.created_at >= p_since
+  GROUP BY o.status;
+$$ LANGUAGE sql STABLE;
+
+-- Counts per (day, status) for p_start..p_end inclusive
+CREATE OR REPLACE FUNCTION hub_daily_stats(p_hub_id UUID, p_start DATE, p_end DATE)
+RETURNS TABLE (
+  day DATE,
+  status VARCHAR,
+  cnt BIGINT,
+  cod_sum NUMERIC
+) AS $$
+  SELECT
+    o.created_at::DATE,
+    o.status,
+    COUNT(*),
+    COALESCE(SUM(o.cod_amount) FILTER (WHERE o.is_cod AND o.status = 'delivered'), 0)
+  FROM delivery_orders o
+  WHERE o.hub_id = p_hub_id
+    AND o.created_at >= p_start
+    AND o.created_at < p_end + 1
+  GROUP BY 1, 2;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,70 @@
+-- =====================================================
+-- 017: record_delivery_attempt RPC
+-- =====================================================
+-- Records a delivery attempt in one transaction: resolves
+-- the calling driver, numbers the attempt (serialised per
+-- order with a row lock so concurrent retries can't reuse
+-- a number), inserts it, and moves the order and route
+-- stop to the attempt's status.
+--
+-- Returns {"attempt": <delivery_attempts row>,
+--          "external_order_id": ..., "external_source": ...}
+-- so the API can sync external orders without re-reading.
+-- Missing driver/order raise ERRCODE P0002.
+
+CREATE OR REPLACE FUNCTION record_delivery_attempt(p_user_id UUID, p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+  v_driver_id UUID;
+  v_order delivery_orders%ROWTYPE;
+  v_attempt_number INTEGER;
+  v_attempt delivery_attempts%ROWTYPE;
+BEGIN
+  SELECT id INTO v_driver_id FROM drivers WHERE user_id = p_user_id;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Driver profile not found' USING ERRCODE = 'P0002';
+  END IF;
+
+  SELECT * INTO v_order
+  FROM delivery_orders
+  WHERE id = (p_payload->>'order_id')::UUID
+  FOR UPDATE;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Order not found' USING ERRCODE = 'P0002';
+  END IF;
+
+  SELECT COALESCE(MAX(attempt_number), 0) + 1 INTO v_attempt_number
+  FROM delivery_attempts
+  WHERE order_id = v_order.id;
+
+  INSERT INTO delivery_attempts (
+    order_id, route_stop_id, driver_id, attempt_number, status,
+    failure_reason, failure_notes, photo_urls, signature_url, recipient_name,
+    cod_collected, cod_amount, latitude, longitude
+  )
+  SELECT
+    v_order.id, r.route_stop_id, v_driver_id, v_attempt_number, r.status,
+    r.failure_reason, r.failure_notes, r.photo_urls, r.signature_url, r.recipient_name,
+    COALESCE(r.cod_collected, false), r.cod_amount, r.latitude, r.longitude
+  FROM jsonb_populate_record(NULL::delivery_attempts, p_payload) r
+  RETURNING * INTO v_attempt;
+
+  IF v_attempt.status = 'delivered' THEN
+    UPDATE delivery_orders SET status = 'delivered', delivered_at = NOW() WHERE id = v_order.id;
+  ELSIF v_attempt.status = 'failed' THEN
+    UPDATE delivery_orders SET status = 'failed', failed_at = NOW() WHERE id = v_order.id;
+  END IF;
+
+  IF v_attempt.route_stop_id IS NOT NULL THEN
+    UPDATE route_stops
+    SET status = v_attempt.status, actual_departure = NOW()
+    WHERE id = v_attempt.route_stop_id;
+  END IF;
+
+  RETURN jsonb_build_object(
+    'attempt', to_jsonb(v_attempt),
+    'external_order_id', v_order.external_order_id,
+    'external_source', v_order.external_source
+  );
+END;
+$$ LANGUAGE plpgsql;
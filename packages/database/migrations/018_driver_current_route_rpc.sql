@@ -0,0 +1,81 @@
+-- =====================================================
+-- 018: driver_current_route RPC
+-- =====================================================
+-- The calling driver's active route for today (UTC) with
+-- its vehicle and ordered stops, each stop carrying a
+-- brief view of its delivery order, in one query.
+--
+-- Returns NULL when there is no assigned/in-progress route
+-- today; raises ERRCODE P0002 if the user has no driver
+-- profile.
+
+CREATE OR REPLACE FUNCTION driver_current_route(p_user_id UUID)
+RETURNS JSONB AS $$
+DECLARE
+  v_driver_id UUID;
+  v_route delivery_routes%ROWTYPE;
+BEGIN
+  SELECT id INTO v_driver_id FROM drivers WHERE user_id = p_user_id;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Driver profile not found' USING ERRCODE = 'P0002';
+  END IF;
+
+  SELECT * INTO v_route
+  FROM delivery_routes
+  WHERE driver_id = v_driver_id
+    AND route_date = (NOW() AT TIME ZONE 'UTC')::DATE
+    AND status IN ('assigned', 'in_progress')
+  ORDER BY created_at DESC
+  LIMIT 1;
+
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  RETURN to_jsonb(v_route) || jsonb_build_object(
+    'stops',
+    COALESCE(
+      (SELECT jsonb_agg(
+         jsonb_build_object(
+           'id', s.id,
+           'order_id', s.order_id,
+           'sequence', s.sequence,
+           'status', s.status,
+           'planned_eta', s.planned_eta,
+           'actual_arrival', s.actual_arrival,
+           'actual_departure', s.actual_departure,
+           'distance_from_prev_km', s.distance_from_prev_km,
+           'duration_from_prev_mins', s.duration_from_prev_mins,
+           'notes', s.notes,
+           'order',
+           CASE WHEN o.id IS NULL THEN NULL ELSE jsonb_build_object(
+             'id', o.id,
+             'order_number', o.order_number,
+             'customer_name', o.customer_name,
+             'customer_phone', o.customer_phone,
+             'delivery_address', o.delivery_address,
+             'product_description', o.product_description,
+             'status', o.status,
+             'is_cod', o.is_cod,
+             'cod_amount', o.cod_amount
+           ) END
+         )
+         ORDER BY s.sequence
+       )
+       FROM route_stops s
+       LEFT JOIN delivery_orders o ON o.id = s.order_id
+       WHERE s.route_id = v_route.id),
+      '[]'::jsonb
+    ),
+    'vehicle',
+    (SELECT jsonb_build_object(
+       'id', v.id,
+       'vehicle_type', v.vehicle_type,
+       'plate_number', v.plate_number,
+       'make_model', v.make_model,
+       'capacity_kg', v.capacity_kg
+     )
+     FROM hub_vehicles v WHERE v.id = v_route.vehicle_id)
+  );
+END;
+$$ LANGUAGE plpgsql STABLE;
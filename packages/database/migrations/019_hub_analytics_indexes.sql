@@ -0,0 +1,23 @@
+-- =====================================================
+-- 019: Composite indexes for hub analytics predicates
+-- =====================================================
+-- Dashboard, daily report and overview queries filter by
+-- hub plus a date or status; (hub_id, created_at) on
+-- delivery_orders was added in 015.
+
+-- Hub order listings/stats filtered by status, newest first
+CREATE INDEX IF NOT EXISTS idx_delivery_orders_hub_status_created
+  ON delivery_orders(hub_id, status, created_at DESC);
+
+-- Open orders per hub (small, hot subset)
+CREATE INDEX IF NOT EXISTS idx_delivery_orders_hub_open
+  ON delivery_orders(hub_id)
+  WHERE status IN ('pending', 'assigned', 'out_for_delivery');
+
+-- Routes per hub by date (and status)
+CREATE INDEX IF NOT EXISTS idx_delivery_routes_hub_date_status
+  ON delivery_routes(hub_id, route_date, status);
+
+-- Today's routes per driver (driver_current_route)
+CREATE INDEX IF NOT EXISTS idx_delivery_routes_driver_date
+  ON delivery_routes(driver_id, route_date);
@@ -0,0 +1,39 @@
+-- =====================================================
+-- 020: issue_otp RPC
+-- =====================================================
+-- Issues a delivery OTP in one transaction: looks up the
+-- customer's phone, invalidates any pending OTPs of the
+-- same type for the order, and stores the new code.
+--
+-- Returns the phone number the code should be sent to.
+-- A missing order raises ERRCODE P0002.
+
+CREATE OR REPLACE FUNCTION issue_otp(
+  p_order_id UUID,
+  p_otp_type TEXT,
+  p_otp_code TEXT,
+  p_expires_at TIMESTAMPTZ
+)
+RETURNS TEXT AS $$
+DECLARE
+  v_phone TEXT;
+BEGIN
+  SELECT customer_phone INTO v_phone
+  FROM delivery_orders
+  WHERE id = p_order_id;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Order not found' USING ERRCODE = 'P0002';
+  END IF;
+
+  UPDATE otp_tokens
+  SET is_verified = true
+  WHERE order_id = p_order_id
+    AND otp_type = p_otp_type
+    AND is_verified = false;
+
+  INSERT INTO otp_tokens (order_id, otp_code, otp_type, sent_to, expires_at)
+  VALUES (p_order_id, p_otp_code, p_otp_type, v_phone, p_expires_at);
+
+  RETURN v_phone;
+END;
+$$ LANGUAGE plpgsql;
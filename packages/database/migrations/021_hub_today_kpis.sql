@@ -0,0 +1,38 @@
+-- =====================================================
+-- 021: hub_today_kpis materialized view
+-- =====================================================
+-- Today's delivery order counts and delivered COD totals
+-- per (hub, status), refreshed every minute by pg_cron so
+-- each hub dashboard hit reads a few pre-computed rows
+-- instead of scanning the day's orders.
+--
+-- `day` is the date the snapshot was taken for; the API
+-- filters on it so a snapshot from before midnight is
+-- never served as today's.
+
+CREATE EXTENSION IF NOT EXISTS pg_cron;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS hub_today_kpis AS
+SELECT
+  CURRENT_DATE AS day,
+  o.hub_id,
+  o.status,
+  COUNT(*) AS cnt,
+  COALESCE(SUM(o.cod_amount) FILTER (WHERE o.is_cod AND o.status = 'delivered'), 0) AS cod_sum
+FROM delivery_orders o
+WHERE o.created_at >= CURRENT_DATE
+GROUP BY o.hub_id, o.status;
+
+-- Materialized views can't apply RLS; only the API (service
+-- role) reads this, so keep it out of PostgREST's public roles
+REVOKE ALL ON hub_today_kpis FROM anon, authenticated;
+
+-- Required for REFRESH ... CONCURRENTLY (readers are never blocked)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_hub_today_kpis_hub_status
+  ON hub_today_kpis(hub_id, status);
+
+SELECT cron.schedule(
+  'refresh-hub-today-kpis',
+  '* * * * *',
+  'REFRESH MATERIALIZED VIEW CONCURRENTLY hub_today_kpis'
+);
@@ -0,0 +1,23 @@
+-- =====================================================
+-- 022: Delivery order search
+-- =====================================================
+-- The hub order list searches order number, customer name
+-- and phone with a substring match. A generated, lowercased
+-- search_text column with a trigram GIN index lets that be
+-- a single indexed ILIKE instead of three leading-wildcard
+-- scans.
+
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+
+ALTER TABLE delivery_orders
+  ADD COLUMN IF NOT EXISTS search_text TEXT
+  GENERATED ALWAYS AS (
+    lower(
+      COALESCE(order_number, '') || ' ' ||
+      COALESCE(customer_name, '') || ' ' ||
+      COALESCE(customer_phone, '')
+    )
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_delivery_orders_search_trgm
+  ON delivery_orders USING GIN(search_text gin_trgm_ops);
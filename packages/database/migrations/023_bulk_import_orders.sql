@@ -0,0 +1,76 @@
+-- =====================================================
+-- 023: bulk_import_orders RPC
+-- =====================================================
+-- Inserts a batch of CSV-imported delivery orders (a JSON
+-- array of objects keyed by column name) server-side.
+--
+-- The whole batch goes in as one INSERT ... SELECT from
+-- jsonb_to_recordset. If that fails, each row is retried in
+-- its own subtransaction so good rows still land and bad
+-- ones are reported, without a round-trip per row.
+--
+-- Returns a JSON array of {"index": <0-based position in
+-- p_rows>, "error": <message>} for rows that failed; empty
+-- when the whole batch was inserted.
+
+CREATE OR REPLACE FUNCTION _insert_import_orders(p_rows JSONB)
+RETURNS VOID AS $$
+  INSERT INTO delivery_orders (
+    hub_id, order_number, source, import_batch_id,
+    seller_name, seller_order_ref, marketplace,
+    customer_name, customer_phone, customer_alt_phone, customer_email,
+    delivery_address, delivery_city, delivery_state, delivery_postal_code,
+    product_description, product_sku, product_category,
+    package_count, total_weight_kg, total_volume_cft,
+    is_cod, cod_amount, declared_value,
+    priority, scheduled_date, delivery_slot
+  )
+  SELECT
+    r.hub_id, r.order_number, r.source, r.import_batch_id,
+    r.seller_name, r.seller_order_ref, r.marketplace,
+    r.customer_name, r.customer_phone, r.customer_alt_phone, r.customer_email,
+    r.delivery_address, r.delivery_city, r.delivery_state, r.delivery_postal_code,
+    r.product_description, r.product_sku, r.product_category,
+    COALESCE(r.package_count, 1), r.total_weight_kg, r.total_volume_cft,
+    COALESCE(r.is_cod, false), COALESCE(r.cod_amount, 0), r.declared_value,
+    COALESCE(r.priority, 'normal'), r.scheduled_date, r.delivery_slot
+  FROM jsonb_to_recordset(p_rows) AS r(
+    hub_id UUID, order_number VARCHAR, source VARCHAR, import_batch_id UUID,
+    seller_name VARCHAR, seller_order_ref VARCHAR, marketplace VARCHAR,
+    customer_name VARCHAR, customer_phone VARCHAR, customer_alt_phone VARCHAR, customer_email VARCHAR,
+    delivery_address TEXT, delivery_city VARCHAR, delivery_state VARCHAR, delivery_postal_code VARCHAR,
+    product_description TEXT, product_sku VARCHAR, product_category VARCHAR,
+    package_count INTEGER, total_weight_kg DECIMAL, total_volume_cft DECIMAL,
+    is_cod BOOLEAN, cod_amount DECIMAL, declared_value DECIMAL,
+    priority VARCHAR, scheduled_date DATE, delivery_slot VARCHAR
+  );
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION bulk_import_orders(p_rows JSONB)
+RETURNS JSONB AS $$
+DECLARE
+  v_errors JSONB := '[]'::jsonb;
+  v_row JSONB;
+  v_index INTEGER;
+BEGIN
+  BEGIN
+    PERFORM _insert_import_orders(p_rows);
+    RETURN v_errors;
+  EXCEPTION WHEN OTHERS THEN
+    -- Fall through to row-by-row
+  END;
+
+  FOR v_row, v_index IN
+    SELECT e.value, e.ordinality - 1
+    FROM jsonb_array_elements(p_rows) WITH ORDINALITY AS e
+  LOOP
+    BEGIN
+      PERFORM _insert_import_orders(jsonb_build_array(v_row));
+    EXCEPTION WHEN OTHERS THEN
+      v_errors := v_errors || jsonb_build_object('index', v_index, 'error', SQLERRM);
+    END;
+  END LOOP;
+
+  RETURN v_errors;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,18 @@
+-- =====================================================
+-- 024: Order listing indexes
+-- =====================================================
+-- list_orders filters by hub plus status/date/route and
+-- sorts by created_at DESC; the (hub_id, status, created_at)
+-- and (hub_id, route_date, status) composites it and
+-- list_routes use come from 019. The route_id index is
+-- replaced by a partial one.
+
+-- Hub orders scheduled for a date
+CREATE INDEX IF NOT EXISTS idx_delivery_orders_hub_date
+  ON delivery_orders(hub_id, scheduled_date);
+
+-- Orders on a route; most orders are unrouted, so index only routed ones
+CREATE INDEX IF NOT EXISTS idx_delivery_orders_routed
+  ON delivery_orders(route_id)
+  WHERE route_id IS NOT NULL;
+DROP INDEX IF EXISTS idx_delivery_orders_route;
@@ -0,0 +1,8 @@
+-- =====================================================
+-- 025: order_status_history lookup index
+-- =====================================================
+-- track_order reads an order's latest status changes;
+-- without this the history table is scanned per request.
+
+CREATE INDEX IF NOT EXISTS idx_order_status_history_order_created
+  ON order_status_history(order_id, created_at DESC);
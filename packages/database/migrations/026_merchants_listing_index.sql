@@ -0,0 +1,8 @@
+-- =====================================================
+-- 026: Active merchant listing index
+-- =====================================================
+-- list_merchants filters on status and pages newest
+-- first by (created_at, id), by offset or keyset cursor.
+
+CREATE INDEX IF NOT EXISTS idx_merchants_status_created
+  ON merchants(status, created_at DESC, id DESC);
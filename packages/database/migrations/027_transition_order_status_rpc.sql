@@ -0,0 +1,39 @@
+-- =====================================================
+-- 027: transition_order_status RPC
+-- =====================================================
+-- Sets an order's status, stamps the matching timestamp
+-- column and logs the change to order_status_history in a
+-- single transaction. Returns the updated order row, so
+-- callers can embed its items with select=.
+--
+-- Raises ERRCODE P0002 when the order does not exist; the
+-- API maps it to 404.
+
+CREATE OR REPLACE FUNCTION transition_order_status(
+  p_order_id UUID,
+  p_status order_status,
+  p_changed_by UUID,
+  p_notes TEXT DEFAULT NULL
+)
+RETURNS SETOF orders AS $$
+BEGIN
+  RETURN QUERY
+  UPDATE orders
+  SET status = p_status,
+      confirmed_at = CASE WHEN p_status = 'confirmed' THEN NOW() ELSE confirmed_at END,
+      preparing_at = CASE WHEN p_status = 'preparing' THEN NOW() ELSE preparing_at END,
+      ready_at = CASE WHEN p_status = 'ready_for_pickup' THEN NOW() ELSE ready_at END,
+      picked_up_at = CASE WHEN p_status = 'picked_up' THEN NOW() ELSE picked_up_at END,
+      delivered_at = CASE WHEN p_status = 'delivered' THEN NOW() ELSE delivered_at END,
+      cancelled_at = CASE WHEN p_status = 'cancelled' THEN NOW() ELSE cancelled_at END
+  WHERE id = p_order_id
+  RETURNING *;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Order not found' USING ERRCODE = 'P0002';
+  END IF;
+
+  INSERT INTO order_status_history (order_id, status, changed_by, notes)
+  VALUES (p_order_id, p_status, p_changed_by, p_notes);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,59 @@
+-- =====================================================
+-- 028: Payment confirmation / refund RPCs
+-- =====================================================
+-- Each applies a payment outcome to the payment, its order
+-- and the order's status history in one transaction, so a
+-- webhook or refund can't leave them out of step.
+
+-- Stripe payment_intent.succeeded
+CREATE OR REPLACE FUNCTION confirm_payment(
+  p_payment_id UUID,
+  p_order_id UUID,
+  p_card_brand TEXT,
+  p_card_last4 TEXT,
+  p_note TEXT
+)
+RETURNS VOID AS $$
+BEGIN
+  UPDATE payments
+  SET status = 'completed',
+      paid_at = NOW(),
+      card_brand = p_card_brand,
+      card_last_four = p_card_last4
+  WHERE id = p_payment_id;
+
+  UPDATE orders
+  SET status = 'confirmed',
+      confirmed_at = NOW()
+  WHERE id = p_order_id;
+
+  INSERT INTO order_status_history (order_id, status, notes)
+  VALUES (p_order_id, 'confirmed', p_note);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Full refund of a completed payment
+CREATE OR REPLACE FUNCTION refund_payment(
+  p_payment_id UUID,
+  p_changed_by UUID,
+  p_note TEXT
+)
+RETURNS VOID AS $$
+DECLARE
+  v_order_id UUID;
+BEGIN
+  UPDATE payments
+  SET status = 'refunded'
+  WHERE id = p_payment_id
+  RETURNING order_id INTO v_order_id;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Payment not found' USING ERRCODE = 'P0002';
+  END IF;
+
+  UPDATE orders SET status = 'refunded' WHERE id = v_order_id;
+
+  INSERT INTO order_status_history (order_id, status, changed_by, notes)
+  VALUES (v_order_id, 'refunded', p_changed_by, p_note);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,48 @@
+-- =====================================================
+-- 029: Stripe webhook event deduplication
+-- =====================================================
+-- Stripe delivers events at least once. The webhook inserts
+-- each event id here before processing; a duplicate delivery
+-- hits the primary key and is acknowledged without redoing
+-- the payment updates.
+
+CREATE TABLE IF NOT EXISTS processed_stripe_events (
+  event_id TEXT PRIMARY KEY,
+  processed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE processed_stripe_events ENABLE ROW LEVEL SECURITY;
+
+-- Make confirm_payment a no-op unless the payment can still
+-- move to completed, so a replayed event can't log the
+-- confirmation twice or revive a refunded payment
+CREATE OR REPLACE FUNCTION confirm_payment(
+  p_payment_id UUID,
+  p_order_id UUID,
+  p_card_brand TEXT,
+  p_card_last4 TEXT,
+  p_note TEXT
+)
+RETURNS VOID AS $$
+BEGIN
+  UPDATE payments
+  SET status = 'completed',
+      paid_at = NOW(),
+      card_brand = p_card_brand,
+      card_last_four = p_card_last4
+  WHERE id = p_payment_id
+    AND status IN ('pending', 'processing', 'failed');
+
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  UPDATE orders
+  SET status = 'confirmed',
+      confirmed_at = NOW()
+  WHERE id = p_order_id;
+
+  INSERT INTO order_status_history (order_id, status, notes)
+  VALUES (p_order_id, 'confirmed', p_note);
+END;
+$$ LANGUAGE plpgsql;
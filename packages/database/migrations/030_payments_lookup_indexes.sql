@@ -0,0 +1,17 @@
+-- =====================================================
+-- 030: payments lookup indexes
+-- =====================================================
+-- create_payment_intent looks up an order's pending or
+-- processing payment; get_payment_status reads an order's
+-- latest payment. (order_id, created_at DESC) also covers
+-- plain order_id lookups, so the old single-column index
+-- is dropped.
+
+CREATE INDEX IF NOT EXISTS idx_payments_order_open
+  ON payments(order_id, status)
+  WHERE status IN ('pending', 'processing');
+
+CREATE INDEX IF NOT EXISTS idx_payments_order_created
+  ON payments(order_id, created_at DESC);
+
+DROP INDEX IF EXISTS idx_payments_order_id;
@@ -0,0 +1,14 @@
+-- =====================================================
+-- 031: Integer paise amounts for Stripe
+-- =====================================================
+-- Stripe takes amounts in the smallest currency unit.
+-- DECIMAL(10, 2) * 100 is exact, so storing the paise value
+-- alongside saves the API converting through floats.
+
+ALTER TABLE orders
+  ADD COLUMN IF NOT EXISTS total_amount_paise BIGINT
+  GENERATED ALWAYS AS ((total_amount * 100)::BIGINT) STORED;
+
+ALTER TABLE payments
+  ADD COLUMN IF NOT EXISTS amount_paise BIGINT
+  GENERATED ALWAYS AS ((amount * 100)::BIGINT) STORED;